@@ -1,51 +1,58 @@
-from typing import Any, Text, Dict, List
+from typing import Any, Text, Dict, List, Optional
 
 from rasa_sdk import Action, Tracker, FormValidationAction
 from rasa_sdk.executor import CollectingDispatcher
 from rasa_sdk.types import DomainDict
-from rasa_sdk.events import SlotSet, FollowupAction
-import requests
+from rasa_sdk.events import SlotSet
+from http import HTTPStatus
+import json
 import random
 import re
-from dotenv import dotenv_values
-
-config = dotenv_values(".env")
-
-ALLOWED_COUNTRIES = [
-    "Switzerland",
-    "Japan",
-    "Thailand",
-    "South Korea",
-    "Czech Republic",
-    "France",
-    "Italy",
-    "Spain",
-]
-
-ALLOWED_DESTINATIONS = [
-    "Praha",
-    "Kalovy Vary",
-    "Fuengirola",
-    "Madrid",
-    "Versailles Palace",
-    "Mont Saint-Michel",
-    "Venice",
-    "Pompeii",
-    "Chiangmai",
-    "Bangkok",
-    "Seoul",
-    "Busan",
-    "Lucerne",
-    "Zurich",
-    "Hokkaido",
-    "Kobe",
-]
 
+from .backend import FALLBACK_MESSAGE, BackendError, backend, backend_fallback
+from .candidates import CandidateIterator
+from .cards import PACKAGE_CAROUSEL, cards
+from .catalog import catalog, catalog_loader
+from .matching import FuzzyMatcher, intent_payload
+from .metrics import instrument
+from .outbox import DONE, FAILED, PENDING, REJECTED, WRITE_BEHIND, idempotency_key, outbox
+from .routing import post_auth_router
+from .sessions import requires_session, sessions
+from .usernames import usernames
+
+POPULAR_PAGE_SIZE = 4
+USERNAME_PATTERN = re.compile("^[a-zA-Z][a-zA-Z0-9]*$")
+PASSWORD_PATTERN = re.compile("^[^\s-]+$")
+
+QUEUED_WRITE_LABELS = {
+    "create_order": "Order to {destination}",
+    "cancel_order": "Cancellation of the trip to {destination}",
+    "change_flight": "Flight change for {destination}",
+    "change_hotel": "Room change for {destination}",
+    "change_guide": "Guide change for {destination}",
+}
+QUEUED_WRITE_STATUS = {
+    PENDING: "in progress",
+    DONE: "done",
+    REJECTED: "declined by our booking system",
+    FAILED: "could not be completed, please contact Trippy",
+}
+
+hotel_offers = CandidateIterator('/hotel/available', 'new_hotel', "undesired_hotel_ids",
+                                 candidate_slot="offered_hotel_id", excluded_slot="rejected_hotel_ids")
+# By default all package is assigned with flight id 1. This is just for demostation,
+# should not happen in real production. Since user said flight unavailable
+# hence id 1 is not desired.
+flight_offers = CandidateIterator('/flight/available', 'new_flight', "undesired_flight_ids",
+                                  candidate_slot="offered_flight_id", excluded_slot="rejected_flight_ids",
+                                  initial_excluded=[1])
+
+@instrument
 class ValidateRegisterForm(FormValidationAction):
     def name(self) -> Text:
         return "validate_register_form"
     
-    def validate_username(
+    async def validate_username(
         self,
         slot_value: Any,
         dispatcher: CollectingDispatcher,
@@ -53,22 +60,29 @@ class ValidateRegisterForm(FormValidationAction):
         domain: DomainDict,
     ) -> Dict[Text, Any]:
         username = slot_value
-        pattern = re.compile("^[a-zA-Z][a-zA-Z0-9]*$")
-        if pattern.match(username):
-            r = requests.get(f'{config["DB_API_ADDRESS"]}/user/checkname', 
-                            params={"username": username})
-            res = r.json()['result']
+        if USERNAME_PATTERN.match(username):
+            if usernames.maybe_taken(username):
+                try:
+                    r = await backend.get('/user/checkname', 
+                                    params={"username": username})
+                except BackendError:
+                    dispatcher.utter_message(FALLBACK_MESSAGE)
+                    return {"username": None}
+                res = r.json()['result']
+            else:
+                res = True
             if res:
                 dispatcher.utter_message(f"ok, so your username is {username}")
                 return {"username": username}
             else:
+                usernames.add(username)
                 dispatcher.utter_message(f"The username '{username}' is used by others, please choose another one.")
                 return {"username": None}
         else:
             dispatcher.utter_message(f"Sorry, username '{username}' is not acceptable.")
             return {"username": None}
 
-    def validate_password(
+    async def validate_password(
         self,
         slot_value: Any,
         dispatcher: CollectingDispatcher,
@@ -76,19 +90,18 @@ class ValidateRegisterForm(FormValidationAction):
         domain: DomainDict,
     ) -> Dict[Text, Any]:
         password = slot_value
-        pattern = re.compile("^[^\s-]+$")
-        if pattern.match(password):
-            dispatcher.utter_message(f"ok, so your password is {password}")
+        if PASSWORD_PATTERN.match(password):
             return {"password": password}
         else:
-            dispatcher.utter_message(f"Sorry, password '{password}' is not acceptable.")
+            dispatcher.utter_message("Sorry, that password is not acceptable.")
             return {"password": None}
 
+@instrument
 class ValidateTargetDestinationForm(FormValidationAction):
     def name(self) -> Text:
         return "validate_target_destination_form"
     
-    def validate_target_destination(
+    async def validate_target_destination(
         self,
         slot_value: Any,
         dispatcher: CollectingDispatcher,
@@ -97,24 +110,26 @@ class ValidateTargetDestinationForm(FormValidationAction):
     ) -> Dict[Text, Any]:
         destination = slot_value
         destinations = tracker.get_slot("orders")
-        if destination.title() not in destinations:
+        canonical = FuzzyMatcher(destinations, catalog.aliases).resolve(destination)
+        if canonical is None:
             allowed_destinations = ", ".join(destinations)
             dispatcher.utter_message(text=
                 f"Sorry, you only have package(s) to {allowed_destinations}. Please choose one.", 
                 buttons =[
-                    {"payload": f"/inform\{destination: {destination}\}", "title": destination} \
+                    {"payload": intent_payload("inform", destination=destination), "title": destination} \
                     for destination in destinations
                 ])
             return {"target_destination": None}
         
-        dispatcher.utter_message(text=f"ok, you want to choose the {destination} package.")
-        return {"target_destination": destination.title()}
+        dispatcher.utter_message(text=f"ok, you want to choose the {canonical} package.")
+        return {"target_destination": canonical}
 
+@instrument
 class ValidateBookPackageForm(FormValidationAction):
     def name(self) -> Text:
         return "validate_book_package_form"
     
-    def validate_destination(
+    async def validate_destination(
         self,
         slot_value: Any,
         dispatcher: CollectingDispatcher,
@@ -122,43 +137,53 @@ class ValidateBookPackageForm(FormValidationAction):
         domain: DomainDict,
     ) -> Dict[Text, Any]:
         destination = slot_value
-        if destination.title() not in ALLOWED_DESTINATIONS:
-            allowed_destinations = ", ".join(ALLOWED_DESTINATIONS)
-            dispatcher.utter_message(text=
-                f"Sorry, I don't recognize {destination}, we only have packages in {allowed_destinations}.", 
+        await catalog_loader.ensure_loaded()
+        canonical = catalog.canonical_destination(destination)
+        if canonical is None:
+            suggestions = catalog.suggest_destinations(destination)
+            if suggestions:
+                message = f"Sorry, I don't recognize {destination}, did you mean {' or '.join(suggestions)}?"
+            else:
+                suggestions = catalog.destinations
+                allowed_destinations = ", ".join(suggestions)
+                message = f"Sorry, I don't recognize {destination}, we only have packages in {allowed_destinations}."
+            dispatcher.utter_message(text=message, 
                 buttons =[
-                    {"payload": f"/inform\{destination: {destination}\}", "title": destination} \
-                    for destination in ALLOWED_DESTINATIONS
+                    {"payload": intent_payload("inform", destination=destination), "title": destination} \
+                    for destination in suggestions
                 ])
             return {"destination": None}
         
-        dispatcher.utter_message(text=f"ok, you want the {destination} package.")
-        return {"destination": slot_value}
+        dispatcher.utter_message(text=f"ok, you want the {canonical} package.")
+        return {"destination": canonical}
 
+@instrument
 class LoginOrRegister(Action):
 
     def name(self) -> Text:
         return "action_login_or_register"
 
-    def run(self, dispatcher: CollectingDispatcher,
+    async def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         dispatcher.utter_message(
             text="I need to know your user account to proceed, do you want to login with existing account or register a new one?",
             buttons= [
-                {"payload": f"/login", "title": "Login"},
-                {"payload": f"/register", "title": "Register"},
+                {"payload": intent_payload("login"), "title": "Login"},
+                {"payload": intent_payload("register"), "title": "Register"},
             ]
         )
         last_intent = tracker.get_intent_of_latest_message()
         return [SlotSet("last_intent", last_intent)]
 
+@instrument
 class CreateUserOrder(Action):
 
     def name(self) -> Text:
         return "action_create_user_order"
 
-    def run(self, dispatcher: CollectingDispatcher,
+    @backend_fallback
+    async def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
@@ -166,25 +191,24 @@ class CreateUserOrder(Action):
 
         username = tracker.get_slot("username")
 
-        r = requests.get(f'{config["DB_API_ADDRESS"]}/package/destination', 
-                        params={"destination": destination})
-        package = r.json()['package'][0]
-        r = requests.post(f'{config["DB_API_ADDRESS"]}/order', 
-                    json = {
-                        "username": username,
-                        "package_id": package['id']
-                    })
-        if r.status_code == requests.codes.created:
+        await catalog_loader.ensure_loaded()
+        package = catalog.package_for(destination)
+        if package is None:
+            r = await backend.get_cached('/package/destination', 
+                            params={"destination": destination})
+            package = r.json()['package'][0]
+        order = {"username": username, "package_id": package['id']}
+        if WRITE_BEHIND:
+            queue_write(tracker, "create_order", 'POST', '/order', username, destination, body=order)
+            dispatcher.utter_message(f"Your order to {destination} is received! You can check its status with your orders.")
+            utter_order_details(dispatcher, package)
+            return [SlotSet("destination", None), SlotSet("has_orders", True)]
+
+        r = await backend.post('/order', json = order)
+        if r.status_code == HTTPStatus.CREATED:
             dispatcher.utter_message(f"Your order to {destination} is created!")
-            guide = package['guide']
-            dispatcher.utter_message(
-                f"Your guide of the tour is {guide['name']}, his/her phone number is {guide['phone_number']} and his/her email is {guide['email']}, the guide will give you guided tours of major landmarks and venues. This is included in the package so it's free.")
-            hotel = package['hotel']
-            dispatcher.utter_message(f"We have also secure a hotel room for you at {hotel['name']} with our special discount, you only need to pay anthor ${hotel['price']} to book the room.")
-            car_rental = package['car_rental']
-            dispatcher.utter_message(f"We also help you find a good car rental company which is provided by {car_rental['name']} at a cost of only ${car_rental['price']}. It is also much cheaper than their normal price.")
-            dispatcher.utter_message(f"Have a fantastic trip!")
-        elif r.status_code == requests.codes.bad_request:
+            utter_order_details(dispatcher, package)
+        elif r.status_code == HTTPStatus.BAD_REQUEST:
             dispatcher.utter_message(
                 f"You have already booked a trip to {destination}. Have a fantastic trip!")
         else:
@@ -194,43 +218,47 @@ class CreateUserOrder(Action):
         
 
 
+@instrument
 class ActionQueryCompanyInfo(Action):
 
     def name(self) -> Text:
         return "action_query_company_info"
 
-    def run(self, dispatcher: CollectingDispatcher,
+    @backend_fallback
+    async def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
-        r = requests.get(
-            f'{config["DB_API_ADDRESS"]}/info/company').json()
+        r = (await backend.get_cached('/info/company')).json()
 
         dispatcher.utter_message(text=r['info'])
 
         return []
 
+@instrument
 class ActionQueryCompanyContact(Action):
 
     def name(self) -> Text:
         return "action_query_company_contact"
 
-    def run(self, dispatcher: CollectingDispatcher,
+    @backend_fallback
+    async def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
-        r = requests.get(
-            f'{config["DB_API_ADDRESS"]}/info/contact').json()
+        r = (await backend.get_cached('/info/contact')).json()
         dispatcher.utter_message("Here is Trippy's contact information")
         dispatcher.utter_message(text=r['contact'])
 
         return []
 
 
+@instrument
 class LoginUser(Action):
     def name(self) -> Text:
         return "action_login_user"
 
+    @backend_fallback
     async def run(
         self,
         dispatcher: CollectingDispatcher,
@@ -240,53 +268,33 @@ class LoginUser(Action):
         username = tracker.get_slot("username")
         password = tracker.get_slot("password")
 
-        r = requests.post(f'{config["DB_API_ADDRESS"]}/user/login', 
-                    json = {
-                        "username": username,
-                        "password": password
-                    })
-        if r.status_code == requests.codes.ok:
-            dispatcher.utter_message(f"Hi {username}")
-            last_intent = tracker.get_slot("last_intent")
-            destination = tracker.get_slot("destination")
-            evts = [SlotSet("is_authenticated", True)]
-            if last_intent == "book_package":
-                if destination:
-                    evts.append(FollowupAction(name="utter_confirm_book_package"))
-                else:
-                    evts.append(FollowupAction(name="utter_ask_where"))
-
-            elif last_intent == "guide_unavailable_or_delayed":
-                evts.append(FollowupAction(name="utter_offer_change_guide"))
-
-            elif last_intent == "flight_delays_or_cancellation":
-                evts.append(FollowupAction(name="utter_offer_next_available_or_cancel"))
-
-            elif last_intent == "hotel_unavailable":
-                evts.append(FollowupAction(name="utter_ask_if_want_new_room"))
-
-            elif last_intent == "ask_user_orders":
-                evts.append(FollowupAction(name="action_query_user_orders"))
-            
-            elif last_intent == "inform":
-                if destination:
-                    evts.append(FollowupAction(name="utter_confirm_book_package"))
-            
-            return evts
-            
-        else:
-            dispatcher.utter_message(f"Sorry, it seems that the username or the password is not vaild.")
-            dispatcher.utter_message(response="login_form")
-            return [
-                SlotSet("is_authenticated", False),
-                SlotSet("username", None), 
-                SlotSet("password", None)
-            ]
-
+        # A password the user just typed is always checked; only a repeated
+        # login without one relies on the live session.
+        if password is not None or sessions.get(tracker.sender_id, username) is None:
+            r = await backend.post('/user/login', 
+                        json = {
+                            "username": username,
+                            "password": password
+                        })
+            if r.status_code != HTTPStatus.OK:
+                dispatcher.utter_message(f"Sorry, it seems that the username or the password is not vaild.")
+                dispatcher.utter_message(response="login_form")
+                return [
+                    SlotSet("is_authenticated", False),
+                    SlotSet("username", None), 
+                    SlotSet("password", None)
+                ]
+            sessions.open(tracker.sender_id, username, session_token(r))
+
+        dispatcher.utter_message(f"Hi {username}")
+        return post_auth_router.authenticated(tracker) + [SlotSet("password", None)]
+
+@instrument
 class RegisterUser(Action):
     def name(self) -> Text:
         return "action_register_user"
 
+    @backend_fallback
     async def run(
         self,
         dispatcher: CollectingDispatcher,
@@ -295,40 +303,16 @@ class RegisterUser(Action):
     ) -> List[Dict[Text, Any]]:
         username = tracker.get_slot("username")
         password = tracker.get_slot("password")
-        r = requests.post(f'{config["DB_API_ADDRESS"]}/user/register', 
+        r = await backend.post('/user/register', 
                             json = {
                                 "username": username,
                                 "password": password
                             })
-        if r.status_code == requests.codes.created:
+        if r.status_code == HTTPStatus.CREATED:
+            usernames.add(username)
+            sessions.open(tracker.sender_id, username, session_token(r))
             dispatcher.utter_message(f"Hi {username}")
-            last_intent = tracker.get_slot("last_intent")
-            destination = tracker.get_slot("destination")
-
-            evts = [SlotSet("is_authenticated", True)]
-            if last_intent == "book_package":
-                if destination:
-                    evts.append(FollowupAction(name="utter_confirm_book_package"))
-                else:
-                    evts.append(FollowupAction(name="utter_ask_where"))
-
-            elif last_intent == "guide_unavailable_or_delayed":
-                evts.append(FollowupAction(name="utter_offer_change_guide"))
-
-            elif last_intent == "flight_delays_or_cancellation":
-                evts.append(FollowupAction(name="utter_offer_next_available_or_cancel"))
-
-            elif last_intent == "hotel_unavailable":
-                evts.append(FollowupAction(name="utter_ask_if_want_new_room"))
-
-            elif last_intent == "ask_user_orders":
-                evts.append(FollowupAction(name="action_query_user_orders"))
-            
-            elif last_intent == "inform":
-                if destination:
-                    evts.append(FollowupAction(name="utter_confirm_book_package"))
-
-            return evts
+            return post_auth_router.authenticated(tracker) + [SlotSet("password", None)]
 
         else:
             dispatcher.utter_message(f"There is something wrong during the process please contact Trippy if you need more information")
@@ -338,10 +322,13 @@ class RegisterUser(Action):
                 SlotSet("password", None),
             ]
 
+@instrument
 class CancelUserTrip(Action):
     def name(self) -> Text:
         return "action_cancel_user_trip"
 
+    @backend_fallback
+    @requires_session
     async def run(
         self,
         dispatcher: CollectingDispatcher,
@@ -350,24 +337,28 @@ class CancelUserTrip(Action):
     ) -> List[Dict[Text, Any]]:
         destination = tracker.get_slot("target_destination")
         username = tracker.get_slot("username")
-        r = requests.delete(f'{config["DB_API_ADDRESS"]}/order/cancel', 
-                            params= {
-                                "username": username,
-                                "destination": destination
-                            })
-        if r.status_code == requests.codes.ok:
+        params = {"username": username, "destination": destination}
+        if WRITE_BEHIND:
+            queue_write(tracker, "cancel_order", 'DELETE', '/order/cancel', username, destination, params=params)
+            dispatcher.utter_message(f"Your cancellation of the trip to {destination} is received. You can check its status with your orders.")
+            return [SlotSet("target_destination", None)]
+
+        r = await backend.delete('/order/cancel', params = params)
+        if r.status_code == HTTPStatus.OK:
             dispatcher.utter_message(f"Your trip to {destination} is canceled, have a good day!")
-        elif r.status_code == requests.codes.not_found:
+        elif r.status_code == HTTPStatus.NOT_FOUND:
             dispatcher.utter_message("Can not find your package order. Please contact trippy directly.")
         else:
             dispatcher.utter_message(
                 "Sorry, something wrong happened during cancelation")
         return [SlotSet("target_destination", None)]
 
+@instrument
 class QueryAvailableFlight(Action):
     def name(self) -> Text:
         return "action_get_next_available_flight"
 
+    @backend_fallback
     async def run(
         self,
         dispatcher: CollectingDispatcher,
@@ -375,62 +366,58 @@ class QueryAvailableFlight(Action):
         domain: Dict[Text, Any],
     ) -> List[Dict[Text, Any]]:
 
-        undesired_flight_ids = tracker.get_slot("undesired_flight_ids")
-        # By default all package is assigned with flight id 1. This is just for demostation, 
-        # should not happen in real production. Since user said flight unavailable 
-        # hence id 1 is not desired.
-        undesired_flight_ids = undesired_flight_ids if undesired_flight_ids is not None else [1] 
-        r = requests.get(f'{config["DB_API_ADDRESS"]}/flight/available', 
-                            params={"undesired_flight_ids": undesired_flight_ids})
-        flight = r.json()['new_flight']
+        flight, events = await flight_offers.next(tracker)
         if flight:
             dispatcher.utter_message(
                 f"I've found the next availble flight offered by {flight['airline']} which will take off in {flight['departure_time']} hours at departure port No.{flight['departure_port']}")
-            undesired_flight_ids.append(flight['id'])
-            return [SlotSet("undesired_flight_ids", undesired_flight_ids)]
+            return events
         else:
             dispatcher.utter_message("I'm sorry, there is currently no available flight.")
-            return [SlotSet("no_available_flight", True)]
+            return events + [SlotSet("no_available_flight", True)]
 
+@instrument
 class ChangeFlight(Action):
     def name(self) -> Text:
         return "action_change_flight"
 
+    @backend_fallback
+    @requires_session
     async def run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
         domain: Dict[Text, Any],
     ) -> List[Dict[Text, Any]]:
-         # remove the room from the undesired list
-        undesired_flight_ids = tracker.get_slot("undesired_flight_ids")
-        flight_id = undesired_flight_ids.pop()
+        flight_id, events = flight_offers.accept(tracker)
         destination = tracker.get_slot("target_destination")
         username = tracker.get_slot("username")
 
-        r = requests.put(f'{config["DB_API_ADDRESS"]}/user/order/flight', 
-                params={
-                    'destination': destination, 
-                    'username': username,
-                    'flight_id': flight_id
-                })
-        if r.status_code == requests.codes.ok:
+        params = {'destination': destination, 'username': username, 'flight_id': flight_id}
+        if WRITE_BEHIND:
+            queue_write(tracker, "change_flight", 'PUT', '/user/order/flight', username, destination, params=params)
+            dispatcher.utter_message("Your flight change is received. You can check its status with your orders. Have a safe flight.")
+            return events + [SlotSet("no_available_flight", False), SlotSet("target_destination", None)]
+
+        r = await backend.put('/user/order/flight', params = params)
+        if r.status_code == HTTPStatus.OK:
             dispatcher.utter_message(
                 "Flight changed! Your boarding pass can be print at the airport lounge. Have a safe flight.")
-        elif r.status_code == requests.codes.not_found:
+        elif r.status_code == HTTPStatus.NOT_FOUND:
             dispatcher.utter_message(f"Sorry, you haven't ordered package to {destination}.")
         else:
             dispatcher.utter_message("Sorry, something when wrong during the process.")
-        return [
-            SlotSet("undesired_flight_ids", undesired_flight_ids),
+        return events + [
             SlotSet("no_available_flight", False),
             SlotSet("target_destination", None),
         ]
 
+@instrument
 class QueryUserOrders(Action):
     def name(self) -> Text:
         return "action_query_user_orders"
 
+    @backend_fallback
+    @requires_session
     async def run(
         self,
         dispatcher: CollectingDispatcher,
@@ -438,8 +425,7 @@ class QueryUserOrders(Action):
         domain: Dict[Text, Any],
     ) -> List[Dict[Text, Any]]:
         username = tracker.get_slot("username")
-        r = requests.get(f'{config["DB_API_ADDRESS"]}/user/orders', 
-                        params={"username": username})
+        r = await backend.get('/user/orders', params={"username": username})
         packages = r.json()['packages']
         if len(packages) > 0:
             dispatcher.utter_message("you've ordered the following:")
@@ -448,16 +434,21 @@ class QueryUserOrders(Action):
                     f"{i} {package['title']} [Country: {package['country']}, Destination: {package['destination']}]")
             orders = [package['destination'] for package in packages]
             evts = [SlotSet("has_orders", True), SlotSet("orders", orders)]
-            return evts
         else:
             dispatcher.utter_message(
                 f"Sorry {username}, it seems that you haven't ordered anything trip yet.")
-            return [SlotSet("has_orders", False)]
+            evts = [SlotSet("has_orders", False)]
+        if WRITE_BEHIND:
+            utter_queued_writes(dispatcher, outbox.recent(username))
+        return evts
 
+@instrument
 class ChangeGuide(Action):
     def name(self) -> Text:
         return "action_change_guide"
 
+    @backend_fallback
+    @requires_session
     async def run(
         self,
         dispatcher: CollectingDispatcher,
@@ -468,18 +459,30 @@ class ChangeGuide(Action):
         destination = tracker.get_slot("target_destination")
         username = tracker.get_slot("username")
 
-        r = requests.put(f'{config["DB_API_ADDRESS"]}/user/order/guide', 
-                params={'destination': destination, 'username': username})
-        new_guide = r.json()['new_guide']
-
-        dispatcher.utter_message(f"Ok, I have rearrange your guide, the new guide is {new_guide['name']} Phone: {new_guide['phone_number']} Email: {new_guide['email']}. Have a great trip!")
+        params = {'destination': destination, 'username': username}
+        if WRITE_BEHIND:
+            queue_write(tracker, "change_guide", 'PUT', '/user/order/guide', username, destination, params=params)
+            dispatcher.utter_message(f"Ok, I've asked for a new guide for your trip to {destination}. The guide's contact details will show up with your orders.")
+            return [SlotSet("target_destination", None)]
+
+        r = await backend.put('/user/order/guide', params = params)
+        if r.status_code == HTTPStatus.OK:
+            catalog_loader.forget_package(destination)
+            new_guide = r.json()['new_guide']
+            dispatcher.utter_message(f"Ok, I have rearrange your guide, the new guide is {new_guide['name']} Phone: {new_guide['phone_number']} Email: {new_guide['email']}. Have a great trip!")
+        elif r.status_code == HTTPStatus.NOT_FOUND:
+            dispatcher.utter_message(f"Sorry, you haven't ordered package to {destination}.")
+        else:
+            dispatcher.utter_message("Sorry, something went wrong during the process.")
 
         return [SlotSet("target_destination", None)]
 
+@instrument
 class OfferCoupon(Action):
     def name(self) -> Text:
         return "action_offer_coupon"
 
+    @backend_fallback
     async def run(
         self,
         dispatcher: CollectingDispatcher,
@@ -487,7 +490,7 @@ class OfferCoupon(Action):
         domain: Dict[Text, Any],
     ) -> List[Dict[Text, Any]]:
         destination = next(tracker.get_latest_entity_values("destination"), "Praha")
-        r = requests.get(f'{config["DB_API_ADDRESS"]}/restaurant/available', 
+        r = await backend.get('/restaurant/available', 
                             params={
                                 "destination": destination,
                                 "old_restaurant_name": "Unknown"
@@ -498,10 +501,12 @@ class OfferCoupon(Action):
         dispatcher.utter_message("Have a great trip!")
         return []
 
+@instrument
 class FindNewRoom(Action):
     def name(self) -> Text:
         return "action_find_new_room"
 
+    @backend_fallback
     async def run(
         self,
         dispatcher: CollectingDispatcher,
@@ -509,71 +514,111 @@ class FindNewRoom(Action):
         domain: Dict[Text, Any],
     ) -> List[Dict[Text, Any]]:
         destination = next(tracker.get_latest_entity_values("destination"), "Praha")
-        undesired_hotel_ids = tracker.get_slot("undesired_hotel_ids")
-        undesired_hotel_ids = undesired_hotel_ids if undesired_hotel_ids is not None else []
-        r = requests.get(f'{config["DB_API_ADDRESS"]}/hotel/available', 
-                            params={
-                                "destination": destination,
-                                "undesired_hotel_ids": undesired_hotel_ids
-                            })
-        hotel = r.json()['new_hotel']
+        hotel, events = await hotel_offers.next(tracker, params={"destination": destination})
         if hotel:
             dispatcher.utter_message(f"I've found a new hotel room at {hotel['name']}. Here are their contact information:")
             dispatcher.utter_message(f"Address: {hotel['address']}, Telephone: {hotel['telephone']}")
             dispatcher.utter_message(f"The room price is ${hotel['price']}")
-            undesired_hotel_ids.append(hotel['id'])
-            return [SlotSet("undesired_hotel_ids", undesired_hotel_ids)]
+            return events
         else:
             dispatcher.utter_message("I'm sorry, there is currently no available room.")
-            return [SlotSet("no_available_room", True)]
+            return events + [SlotSet("no_available_room", True)]
 
+@instrument
 class ChangeNewRoom(Action):
     def name(self) -> Text:
         return "action_change_new_room"
 
+    @backend_fallback
+    @requires_session
     async def run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
         domain: Dict[Text, Any],
     ) -> List[Dict[Text, Any]]:
-        # remove the room from the undesired list
-        undesired_hotel_ids = tracker.get_slot("undesired_hotel_ids")
-        hotel_id = undesired_hotel_ids.pop()
+        hotel_id, events = hotel_offers.accept(tracker)
         destination = tracker.get_slot("target_destination")
         username = tracker.get_slot("username")
 
-        r = requests.put(f'{config["DB_API_ADDRESS"]}/user/order/hotel', 
-                params={
-                    'destination': destination, 
-                    'username': username,
-                    'hotel_id': hotel_id
-                })
-        if r.status_code == requests.codes.ok:
+        params = {'destination': destination, 'username': username, 'hotel_id': hotel_id}
+        if WRITE_BEHIND:
+            queue_write(tracker, "change_hotel", 'PUT', '/user/order/hotel', username, destination, params=params)
+            dispatcher.utter_message("Your room change is received. You can check its status with your orders.")
+            return events + [SlotSet("no_available_room", False), SlotSet("target_destination", None)]
+
+        r = await backend.put('/user/order/hotel', params = params)
+        if r.status_code == HTTPStatus.OK:
+            catalog_loader.forget_package(destination)
             dispatcher.utter_message("Okay, your room has been rearranged! Have a good one!")
-        elif r.status_code == requests.codes.not_found:
+        elif r.status_code == HTTPStatus.NOT_FOUND:
             dispatcher.utter_message(f"Sorry, you haven't ordered package to {destination}.")
         else:
             dispatcher.utter_message("Sorry, something went wrong during the process.")
-        return [
-            SlotSet("undesired_hotel_ids", undesired_hotel_ids),
+        return events + [
             SlotSet("no_available_room", False),
             SlotSet("target_destination", None)
         ]
 
+def utter_order_details(dispatcher: CollectingDispatcher, package: Dict) -> None:
+    dispatcher.utter_message(cards.order_details(package))
+
+
+def queue_write(tracker: Tracker, kind: Text, method: Text, route: Text, username: Text, destination: Text,
+                params: Optional[Dict[Text, Any]] = None, body: Any = None) -> None:
+    key = idempotency_key(tracker, kind, params=params, body=body)
+    outbox.enqueue(key, kind, method, route, username, destination, params=params, body=body)
+
+
+def utter_queued_writes(dispatcher: CollectingDispatcher, writes: List) -> None:
+    if not writes:
+        return
+    dispatcher.utter_message("Your latest requests:")
+    for write in writes:
+        label = QUEUED_WRITE_LABELS[write['kind']].format(destination=write['destination'])
+        dispatcher.utter_message(f"{label}: {QUEUED_WRITE_STATUS[write['status']]}")
+        result = json.loads(write['result']) if write['result'] else None
+        if write['kind'] == "change_guide" and write['status'] == DONE and result and result.get('new_guide'):
+            guide = result['new_guide']
+            dispatcher.utter_message(f"Your new guide is {guide['name']} Phone: {guide['phone_number']} Email: {guide['email']}.")
+
+
+def session_token(r) -> Optional[Text]:
+    """The token the DB API issued with a login or registration, if it issues any."""
+    try:
+        body = r.json()
+    except ValueError:
+        return None
+    return body.get("token") if isinstance(body, dict) else None
+
+
+def encode_cursor(offset: int) -> Text:
+    return f"p{offset:x}"
+
+
+def decode_cursor(cursor: Optional[Text]) -> int:
+    """Offset into the popularity ranking; unknown or missing cursors start over."""
+    try:
+        return max(0, int(cursor[1:], 16)) if cursor and cursor[0] == "p" else 0
+    except ValueError:
+        return 0
+
+
 def utter_packages(dispatcher: CollectingDispatcher, packages: List[Dict]) -> None:
+    if PACKAGE_CAROUSEL:
+        dispatcher.utter_message(text="You can book a package by telling me the package destination.",
+                                 elements=[cards.element(package) for package in packages])
+        return
     for i, package in enumerate(packages, 1):
-        dispatcher.utter_message(
-            text=f"#{i} {package['title']} | Country: {package['country']} | Destination: {package['destination']}",
-            image=package['pic_url'])
-        dispatcher.utter_message(f"Description: {package['description']}")
-        dispatcher.utter_message(f"The trip is {package['duration']} days long and the price is \${package['price']}")
+        dispatcher.utter_message(text=f"#{i} {cards.text(package)}", image=package['pic_url'])
     dispatcher.utter_message("You can book a package by telling me the package destination.")
 
+@instrument
 class QueryCountrySpecificPackages(Action):
     def name(self) -> Text:
         return "action_query_country_specific_packages"
 
+    @backend_fallback
     async def run(
         self,
         dispatcher: CollectingDispatcher,
@@ -581,44 +626,52 @@ class QueryCountrySpecificPackages(Action):
         domain: Dict[Text, Any],
     ) -> List[Dict[Text, Any]]:
         country = next(tracker.get_latest_entity_values("country"), None)
-        if country.title() not in ALLOWED_COUNTRIES:
-            allowed_countries = ", ".join(ALLOWED_COUNTRIES)
-            dispatcher.utter_message(f"We don't have travel package to {country}, but we do have packages to {allowed_countries}.")
+        await catalog_loader.ensure_loaded()
+        canonical = catalog.canonical_country(country)
+        if canonical is None:
+            suggestions = catalog.suggest_countries(country)
+            if suggestions:
+                dispatcher.utter_message(f"We don't have travel package to {country}, did you mean {' or '.join(suggestions)}?")
+            else:
+                allowed_countries = ", ".join(catalog.countries)
+                dispatcher.utter_message(f"We don't have travel package to {country}, but we do have packages to {allowed_countries}.")
             return []
         
-        r = requests.get(f'{config["DB_API_ADDRESS"]}/package/country', 
-                params={"country": country.title()})
+        packages = catalog.packages_in(canonical)
+        if packages is None:
+            r = await backend.get_cached('/package/country', 
+                    params={"country": canonical})
+            packages = r.json()['packages']
  
-        dispatcher.utter_message(f"Here are some packages in {country.title()}.")
-        packages = r.json()['packages']
+        dispatcher.utter_message(f"Here are some packages in {canonical}.")
 
         utter_packages(dispatcher, packages)
         return []
 
 
+@instrument
 class QueryPopularPackages(Action):
     def name(self) -> Text:
         return "action_query_popular_packages"
 
+    @backend_fallback
     async def run(
         self,
         dispatcher: CollectingDispatcher,
         tracker: Tracker,
         domain: Dict[Text, Any],
     ) -> List[Dict[Text, Any]]:
-        showed_packages_ids = tracker.get_slot("showed_packages_ids")
-        showed_packages_ids = showed_packages_ids if showed_packages_ids is not None else []
-        r = requests.get(f'{config["DB_API_ADDRESS"]}/package/popular', 
-                            params={
-                                "batch": 4,
-                                "showed_package_ids": showed_packages_ids
-                            })
-        packages = r.json()['packages']
+        offset = decode_cursor(tracker.get_slot("popular_packages_cursor"))
+        await catalog_loader.ensure_loaded()
+        if catalog.loaded:
+            packages = catalog.popular_page(offset, POPULAR_PAGE_SIZE)
+        else:
+            r = await backend.get('/package/popular', params={"batch": offset + POPULAR_PAGE_SIZE})
+            packages = r.json()['packages'][offset:]
         if len(packages) != 0:
             dispatcher.utter_message("Here are some popular package:")
             utter_packages(dispatcher, packages)
-            new_package_ids = [package['id'] for package in packages]
-            return [SlotSet("showed_packages_ids", showed_packages_ids + new_package_ids),]
+            return [SlotSet("popular_packages_cursor", encode_cursor(offset + len(packages))),]
         else:
             dispatcher.utter_message("I've show you all packages that Trippy offers.")
             return [SlotSet("no_more_packages", True)]
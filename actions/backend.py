@@ -0,0 +1,391 @@
+import asyncio
+import functools
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Text, Tuple
+
+import aiohttp
+
+from .cache import TTLCache
+from .metrics import record_backend_call, registry
+from .resilience import CircuitBreaker, RetryPolicy, hedged
+from .settings import config
+from .store import InvalidationLog, SharedStore, shared_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 5.0
+
+# Deadline in seconds for a call to the DB API, including retries and hedged requests.
+ROUTE_TIMEOUTS = {
+    "/user/checkname": 2.0,
+    "/user/login": 3.0,
+    "/user/register": 3.0,
+    "/info/company": 2.0,
+    "/info/contact": 2.0,
+    "/package/popular": 3.0,
+    "/package/country": 3.0,
+    "/package/destination": 3.0,
+    "/order": 8.0,
+    "/order/cancel": 8.0,
+}
+
+# (ttl, stale_ttl) in seconds for near-static catalog reads served from the cache.
+CACHE_TTLS = {
+    "/info/company": (3600.0, 86400.0),
+    "/info/contact": (3600.0, 86400.0),
+    "/package/country": (300.0, 3600.0),
+    "/package/destination": (300.0, 3600.0),
+}
+
+# Seconds to wait for a read before sending a second, hedged copy of it.
+HEDGE_DELAYS = {
+    "/package/popular": 0.2,
+}
+
+# Only these methods are retried; the DB API's PUT routes reassign guides and rooms.
+RETRYABLE_METHODS = {"GET"}
+
+FALLBACK_MESSAGE = "Sorry, I can't reach our booking system right now. Please try again in a moment."
+
+
+class BackendError(Exception):
+    """Raised when the DB API cannot be reached or does not answer in time."""
+
+
+class CircuitOpenError(BackendError):
+    """Raised without calling the DB API while the route's circuit breaker is open."""
+
+
+class ConnectError(BackendError):
+    """Raised when no connection to the DB API could be opened, so the request was never sent."""
+
+
+class ServerError(BackendError):
+    """Raised when the DB API still answers with a 5xx status after the retries."""
+
+    def __init__(self, status_code: int, message: Text) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class BackendResponse:
+    def __init__(self, status_code: int, data: Any) -> None:
+        self.status_code = status_code
+        self._data = data
+
+    def json(self) -> Any:
+        return self._data
+
+
+def encode_params(params: Optional[Dict[Text, Any]]) -> List[Tuple[Text, Text]]:
+    """Flatten query params the way `requests` does: lists repeat the key, None is dropped."""
+    pairs = []
+    for key, value in (params or {}).items():
+        if value is None:
+            continue
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        pairs.extend((key, str(item)) for item in values)
+    return pairs
+
+
+class BackendClient:
+    """Pooled, non-blocking client shared by every action talking to the DB API.
+
+    The session and concurrency limit are bound to the running event loop and
+    created on first use, so the client can be instantiated at import time.
+    With a `shared` store, cached reads are also shared with the other
+    worker processes, and so are invalidations. With `coalesce`, concurrent GETs of the same route and
+    params share one call to the DB API.
+    """
+
+    def __init__(
+        self,
+        base_url: Text,
+        max_connections: int = 100,
+        max_concurrency: int = 64,
+        timeouts: Optional[Dict[Text, float]] = None,
+        default_timeout: float = DEFAULT_TIMEOUT,
+        cache: Optional[TTLCache] = None,
+        cache_ttls: Optional[Dict[Text, Tuple[float, float]]] = None,
+        retry: Optional[RetryPolicy] = None,
+        hedge_delays: Optional[Dict[Text, float]] = None,
+        breaker_factory: Callable[[], CircuitBreaker] = CircuitBreaker,
+        shared: Optional[SharedStore] = None,
+        coalesce: bool = True,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.timeouts = dict(ROUTE_TIMEOUTS if timeouts is None else timeouts)
+        self.default_timeout = default_timeout
+        self.cache = cache if cache is not None else TTLCache()
+        self.cache_ttls = dict(CACHE_TTLS if cache_ttls is None else cache_ttls)
+        self.retry = retry or RetryPolicy()
+        self.hedge_delays = dict(HEDGE_DELAYS if hedge_delays is None else hedge_delays)
+        self.breaker_factory = breaker_factory
+        self.breakers: Dict[Text, CircuitBreaker] = {}
+        self.shared = shared
+        self.coalesce = coalesce
+        self._invalidations = InvalidationLog(shared, "invalidated reads") if shared is not None else None
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self.counters = {"retries": 0, "hedged": 0, "short_circuited": 0, "fallbacks": 0}
+        self._session = None
+        self._semaphore = None
+        self._loop = None
+
+    def timeout_for(self, route: Text) -> float:
+        return self.timeouts.get(route, self.default_timeout)
+
+    def breaker_for(self, route: Text) -> CircuitBreaker:
+        if route not in self.breakers:
+            self.breakers[route] = self.breaker_factory()
+        return self.breakers[route]
+
+    def _count_hedge(self) -> None:
+        self.counters["hedged"] += 1
+
+    def _ensure_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._session
+
+    async def _send(
+        self,
+        method: Text,
+        route: Text,
+        params: Optional[Dict[Text, Any]],
+        json: Any,
+        deadline: float,
+        headers: Optional[Dict[Text, Text]] = None,
+    ) -> BackendResponse:
+        """Send one request; the timeout is what is left of `deadline` (event loop time) when it is sent."""
+        session = self._ensure_session()
+        async with self._semaphore:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                raise BackendError(f"{method} {route} not sent: deadline passed")
+            start = time.perf_counter()
+            status = "error"
+            try:
+                async with session.request(
+                    method,
+                    f"{self.base_url}{route}",
+                    params=encode_params(params),
+                    json=json,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=timeout),
+                ) as resp:
+                    status = resp.status
+                    try:
+                        data = await resp.json(content_type=None)
+                    except ValueError:
+                        data = None
+                    return BackendResponse(resp.status, data)
+            except aiohttp.ClientConnectorError as e:
+                raise ConnectError(f"{method} {route} not sent: {e!r}") from e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise BackendError(f"{method} {route} failed: {e!r}") from e
+            finally:
+                record_backend_call(method, route, status, time.perf_counter() - start)
+
+    async def request(
+        self,
+        method: Text,
+        route: Text,
+        params: Optional[Dict[Text, Any]] = None,
+        json: Any = None,
+        timeout: Optional[float] = None,
+        headers: Optional[Dict[Text, Text]] = None,
+    ) -> BackendResponse:
+        """Call the DB API within the route's deadline.
+
+        GETs are retried on connection errors and 5xx answers, and hedged on
+        routes listed in `hedge_delays`. While the route's circuit breaker is
+        open, CircuitOpenError is raised without calling the API. A 5xx
+        answer that survives the retries raises ServerError.
+        """
+        breaker = self.breaker_for(route)
+        if not breaker.allow():
+            self.counters["short_circuited"] += 1
+            raise CircuitOpenError(f"{method} {route} skipped: circuit open")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout if timeout is not None else self.timeout_for(route))
+        attempts = self.retry.attempts if method in RETRYABLE_METHODS else 1
+        hedge_delay = self.hedge_delays.get(route) if method in RETRYABLE_METHODS else None
+        for attempt in range(1, attempts + 1):
+            send = functools.partial(self._send, method, route, params, json, deadline, headers)
+            error, response = None, None
+            try:
+                if hedge_delay is not None:
+                    response = await hedged(send, hedge_delay, self._count_hedge)
+                else:
+                    response = await send()
+            except BackendError as e:
+                error = e
+            if response is not None and response.status_code < 500:
+                breaker.record_success()
+                return response
+            breaker.record_failure()
+            delay = self.retry.backoff(attempt)
+            if attempt == attempts or loop.time() + delay >= deadline or not breaker.allow():
+                break
+            self.counters["retries"] += 1
+            logger.debug(f"Retrying {method} {route} in {delay:.3f}s after {error or response.status_code}")
+            await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        raise ServerError(response.status_code, f"{method} {route} answered {response.status_code}")
+
+    async def get(self, route: Text, params: Optional[Dict[Text, Any]] = None, **kwargs: Any) -> BackendResponse:
+        """GET `route`; joins an identical GET already in flight instead of sending another.
+
+        The shared call runs with the deadline of the caller that started it
+        and is not cancelled when one of its callers is. Like cached
+        responses, shared responses must not be mutated.
+        """
+        if not self.coalesce or kwargs.get("headers"):
+            return await self.request("GET", route, params=params, **kwargs)
+        key = (route, tuple(encode_params(params)))
+        call = self._inflight.get(key)
+        if call is not None and call.get_loop() is asyncio.get_running_loop():
+            registry.inc("trippy_backend_coalesced_total", (("route", route),))
+        else:
+            call = asyncio.ensure_future(self.request("GET", route, params=params, **kwargs))
+            call.add_done_callback(functools.partial(self._landed, key))
+            self._inflight[key] = call
+        return await asyncio.shield(call)
+
+    def _landed(self, key: Tuple, call: asyncio.Future) -> None:
+        if self._inflight.get(key) is call:
+            del self._inflight[key]
+        if not call.cancelled():
+            call.exception()  # retrieved here in case every caller was cancelled
+
+    async def get_cached(self, route: Text, params: Optional[Dict[Text, Any]] = None) -> BackendResponse:
+        """GET through the catalog cache; routes without a configured TTL go straight to the API.
+
+        Cached responses are shared between callers and must not be mutated.
+        When the DB API fails, an expired cached response is served if there is one.
+        """
+        if route not in self.cache_ttls:
+            return await self.get(route, params)
+        ttl, stale_ttl = self.cache_ttls[route]
+        key = (route, tuple(encode_params(params)))
+        self._catch_up()
+        try:
+            return await self.cache.get_or_fetch(
+                key,
+                lambda: self._get_shared(route, params, key, ttl),
+                ttl,
+                stale_ttl,
+                cacheable=lambda r: r.status_code == 200,
+            )
+        except BackendError:
+            # Serve the last known answer, however old, while the DB API is down.
+            fallback = self.cache.peek(key)
+            if fallback is None:
+                raise
+        self.counters["fallbacks"] += 1
+        return fallback
+
+    async def _get_shared(self, route: Text, params: Optional[Dict[Text, Any]], key: Tuple, ttl: float) -> BackendResponse:
+        if self.shared is None:
+            return await self.get(route, params)
+        namespace, shared_key = f"GET {route}", json.dumps(key[1])
+        stored = self.shared.get(namespace, shared_key)
+        if stored is not None:
+            return BackendResponse(*stored)
+        response = await self.get(route, params)
+        if response.status_code == 200:
+            self.shared.set(namespace, shared_key, [response.status_code, response.json()], ttl)
+        return response
+
+    def invalidate(self, route: Text, params: Optional[Dict[Text, Any]] = None) -> None:
+        """Drop cached and in-flight reads of `route`; only the given params if they are passed.
+
+        Reads started afterwards call the DB API again instead of joining one
+        that may have been answered before a write. With a shared store, the
+        other workers drop their copies before their next cached read.
+        """
+        key = None if params is None else tuple(encode_params(params))
+        self._drop(route, key)
+        if self.shared is not None:
+            self.shared.delete(f"GET {route}", None if key is None else json.dumps(key))
+            self._invalidations.publish([route, key])
+
+    def _drop(self, route: Text, key: Optional[Tuple]) -> None:
+        if key is not None:
+            self._inflight.pop((route, key), None)
+            self.cache.invalidate((route, key))
+        else:
+            for key in [key for key in self._inflight if key[0] == route]:
+                del self._inflight[key]
+            self.cache.invalidate_where(lambda key: key[0] == route)
+
+    def _catch_up(self) -> None:
+        """Drop the local copies of reads other workers invalidated since the last call."""
+        if self._invalidations is None:
+            return
+        unseen = self._invalidations.unseen()
+        if unseen is None:
+            self._inflight.clear()
+            self.cache.clear()
+            return
+        for route, key in unseen:
+            self._drop(route, None if key is None else tuple(tuple(pair) for pair in key))
+
+    async def post(self, route: Text, json: Any = None, **kwargs: Any) -> BackendResponse:
+        return await self.request("POST", route, json=json, **kwargs)
+
+    async def put(self, route: Text, params: Optional[Dict[Text, Any]] = None, **kwargs: Any) -> BackendResponse:
+        return await self.request("PUT", route, params=params, **kwargs)
+
+    async def delete(self, route: Text, params: Optional[Dict[Text, Any]] = None, **kwargs: Any) -> BackendResponse:
+        return await self.request("DELETE", route, params=params, **kwargs)
+
+    def metric_samples(self):
+        """Cache, resilience and circuit breaker state as gauge samples for the metrics registry."""
+        for name, value in self.cache.stats().items():
+            yield f"trippy_cache_{name}", {}, value
+        for name, value in self.counters.items():
+            yield f"trippy_backend_{name}_total", {}, value
+        for route, breaker in self.breakers.items():
+            yield "trippy_backend_circuit_open", {"route": route}, int(breaker.state != CircuitBreaker.CLOSED)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+def backend_fallback(run: Callable) -> Callable:
+    """Answer with an apology instead of failing the action when the DB API is unavailable."""
+
+    @functools.wraps(run)
+    async def wrapper(self, dispatcher, tracker, domain):
+        try:
+            return await run(self, dispatcher, tracker, domain)
+        except BackendError as e:
+            logger.warning(f"{self.name()} failed: {e}")
+            dispatcher.utter_message(FALLBACK_MESSAGE)
+            return []
+
+    return wrapper
+
+
+backend = BackendClient(
+    config.get("DB_API_ADDRESS") or "",
+    max_connections=int(config.get("DB_API_MAX_CONNECTIONS") or 100),
+    max_concurrency=int(config.get("DB_API_MAX_CONCURRENCY") or 64),
+    cache=TTLCache(max_size=int(config.get("CATALOG_CACHE_SIZE") or 256)),
+    shared=shared_store,
+)
+registry.add_collector(backend.metric_samples)
+registry.describe("trippy_backend_coalesced_total", "DB API reads that joined an identical read already in flight.")
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set, Text
+
+
+class CacheEntry:
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value: Any, fresh_until: float, stale_until: float) -> None:
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class TTLCache:
+    """Size-bounded LRU cache with per-entry TTLs and stale-while-revalidate.
+
+    An entry is served as-is until its TTL runs out. During the following
+    stale window it is still served, but a single background refresh is
+    started; after the stale window it is treated as missing.
+    """
+
+    def __init__(self, max_size: int = 256, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_size = max_size
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._refreshing: Set[Hashable] = set()
+        self._tasks: Set[asyncio.Future] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry.stale_until > self.clock()
+
+    def set(self, key: Hashable, value: Any, ttl: float, stale_ttl: float = 0.0) -> None:
+        now = self.clock()
+        self._entries[key] = CacheEntry(value, now + ttl, now + ttl + stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a fresh or stale value without triggering a refresh."""
+        entry = self._entries.get(key)
+        if entry is None or entry.stale_until <= self.clock():
+            return default
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def peek(self, key: Hashable) -> Any:
+        """Return the stored value even if it has expired, or None."""
+        entry = self._entries.get(key)
+        return entry.value if entry is not None else None
+
+    async def get_or_fetch(
+        self,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[Any]],
+        ttl: float,
+        stale_ttl: float = 0.0,
+        cacheable: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        now = self.clock()
+        entry = self._entries.get(key)
+        if entry is not None and entry.stale_until > now:
+            self._entries.move_to_end(key)
+            if entry.fresh_until > now:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self._schedule_refresh(key, fetch, ttl, stale_ttl, cacheable)
+            return entry.value
+
+        self.misses += 1
+        value = await fetch()
+        if cacheable(value):
+            self.set(key, value, ttl, stale_ttl)
+        return value
+
+    def _schedule_refresh(self, key, fetch, ttl, stale_ttl, cacheable) -> None:
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        task = asyncio.ensure_future(self._refresh(key, fetch, ttl, stale_ttl, cacheable))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, key, fetch, ttl, stale_ttl, cacheable) -> None:
+        try:
+            value = await fetch()
+            # An invalidation while the refresh was in flight wins over its result.
+            if key in self._refreshing and cacheable(value):
+                self.set(key, value, ttl, stale_ttl)
+                self.refreshes += 1
+        except Exception:
+            # Keep serving the stale entry; the next stale hit retries.
+            pass
+        finally:
+            self._refreshing.discard(key)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+        self._refreshing.discard(key)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        keys = [key for key in self._entries if predicate(key)]
+        for key in keys:
+            self.invalidate(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._refreshing.clear()
+
+    def stats(self) -> Dict[Text, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,113 @@
+from typing import Any, Dict, Iterable, List, Optional, Set, Text, Tuple
+
+from rasa_sdk import Tracker
+from rasa_sdk.events import EventType, SlotSet
+
+from .backend import BackendClient, backend
+
+# Rejected candidates remembered per conversation. Once more have been
+# rejected the oldest suggestions come around again instead of the slot and
+# the request growing without bound.
+MAX_EXCLUDED = 32
+
+
+def encode_ids(ids: Iterable[int]) -> Optional[Text]:
+    """Compact slot value for a set of ids: a hex bitset, or a base-36 list for sparse large ids."""
+    ids = sorted(set(ids))
+    if not ids:
+        return None
+    if any(not isinstance(i, int) or isinstance(i, bool) or i < 0 for i in ids):
+        raise ValueError(f"ids must be non-negative integers: {ids}")
+    listed = "l" + ",".join(_base36(i) for i in ids)
+    # Only build the bitset when it can be the shorter one; one large id would
+    # otherwise make a huge integer.
+    if 1 + ids[-1] // 4 + 1 > len(listed):
+        return listed
+    bits = 0
+    for i in ids:
+        bits |= 1 << i
+    return "b" + format(bits, "x")
+
+
+def decode_ids(value: Optional[Text]) -> Set[int]:
+    if not value:
+        return set()
+    try:
+        if value[0] == "b":
+            bits = int(value[1:], 16)
+            return {i for i in range(bits.bit_length()) if bits >> i & 1}
+        if value[0] == "l":
+            return {int(i, 36) for i in value[1:].split(",")}
+    except ValueError:
+        pass
+    return set()
+
+
+def _base36(number: int) -> Text:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    text = ""
+    while True:
+        number, digit = divmod(number, 36)
+        text = digits[digit] + text
+        if not number:
+            return text
+
+
+class CandidateIterator:
+    """Walks through the alternatives the DB API offers for a hotel room or a flight.
+
+    The offer on the table is kept in `candidate_slot`, apart from the ones
+    the user turned down, which are stored as an encoded set in
+    `excluded_slot`. Asking for the next offer rejects the current one.
+    """
+
+    def __init__(
+        self,
+        route: Text,
+        result_key: Text,
+        param: Text,
+        candidate_slot: Text,
+        excluded_slot: Text,
+        initial_excluded: Iterable[int] = (),
+        client: Optional[BackendClient] = None,
+    ) -> None:
+        self.route = route
+        self.result_key = result_key
+        self.param = param
+        self.candidate_slot = candidate_slot
+        self.excluded_slot = excluded_slot
+        self.initial_excluded = set(initial_excluded)
+        self.client = client or backend
+
+    def candidate(self, tracker: Tracker) -> Optional[int]:
+        candidate = tracker.get_slot(self.candidate_slot)
+        return int(candidate) if candidate is not None else None
+
+    def excluded(self, tracker: Tracker) -> Set[int]:
+        """Ids to skip when asking for the next offer, including the current one."""
+        value = tracker.get_slot(self.excluded_slot)
+        excluded = decode_ids(value) if value is not None else set(self.initial_excluded)
+        if len(excluded) >= MAX_EXCLUDED:
+            excluded = set(self.initial_excluded)
+        candidate = self.candidate(tracker)
+        if candidate is not None:
+            excluded.add(candidate)
+        return excluded
+
+    async def next(
+        self,
+        tracker: Tracker,
+        params: Optional[Dict[Text, Any]] = None,
+    ) -> Tuple[Optional[Dict[Text, Any]], List[EventType]]:
+        """The next offer, or None when the DB API has none left, with the slot events to store."""
+        excluded = self.excluded(tracker)
+        r = await self.client.get(self.route, params={**(params or {}), self.param: sorted(excluded)})
+        offer = r.json()[self.result_key]
+        return offer, [
+            SlotSet(self.excluded_slot, encode_ids(excluded)),
+            SlotSet(self.candidate_slot, offer["id"] if offer else None),
+        ]
+
+    def accept(self, tracker: Tracker) -> Tuple[Optional[int], List[EventType]]:
+        """The offer the user took; it is no longer on the table, the rejected ones stay excluded."""
+        return self.candidate(tracker), [SlotSet(self.candidate_slot, None)]
@@ -0,0 +1,98 @@
+from typing import Any, Callable, Dict, Set, Text, Tuple
+
+from .catalog import CatalogIndex, catalog, normalize
+from .matching import intent_payload
+from .metrics import registry
+from .settings import flag
+
+# Send a set of packages as one carousel message, a generic template with an
+# element per package, instead of one message per package.
+PACKAGE_CAROUSEL = flag("PACKAGE_CAROUSEL")
+
+PACKAGE_TITLE = "{title} | Country: {country} | Destination: {destination}"
+PACKAGE_SUMMARY = "Description: {description}\nThe trip is {duration} days long and the price is ${price}"
+PACKAGE_TEXT = PACKAGE_TITLE + "\n" + PACKAGE_SUMMARY
+ORDER_DETAILS = "\n".join([
+    "Your guide of the tour is {guide[name]}, his/her phone number is {guide[phone_number]} and his/her email is "
+    "{guide[email]}, the guide will give you guided tours of major landmarks and venues. This is included in the "
+    "package so it's free.",
+    "We have also secure a hotel room for you at {hotel[name]} with our special discount, you only need to pay "
+    "anthor ${hotel[price]} to book the room.",
+    "We also help you find a good car rental company which is provided by {car_rental[name]} at a cost of only "
+    "${car_rental[price]}. It is also much cheaper than their normal price.",
+    "Have a fantastic trip!",
+])
+
+
+def package_element(package: Dict[Text, Any]) -> Dict[Text, Any]:
+    return {
+        "title": PACKAGE_TITLE.format_map(package),
+        "subtitle": PACKAGE_SUMMARY.format_map(package),
+        "image_url": package["pic_url"],
+        "buttons": [{
+            "type": "postback",
+            "title": f"Book {package['destination']}",
+            "payload": intent_payload("inform", destination=package["destination"]),
+        }],
+    }
+
+
+RENDERERS: Dict[Text, Callable[[Dict[Text, Any]], Any]] = {
+    "text": PACKAGE_TEXT.format_map,
+    "element": package_element,
+    "order": ORDER_DETAILS.format_map,
+}
+
+
+class CardRenderer:
+    """Package messages rendered once and reused while the package is unchanged.
+
+    Rendered cards are cached by catalog version, kind and package id; the
+    package itself is not compared. A package that changes, e.g. after a
+    guide or hotel change, must be forgotten through
+    `CatalogIndex.forget_package`, which drops its cards here. The cache is
+    emptied whenever the catalog loads a new version.
+    """
+
+    def __init__(self, index: CatalogIndex) -> None:
+        self.index = index
+        self._version = index.version
+        self._cards: Dict[Tuple[int, Text, Any], Any] = {}
+        self._ids: Dict[Text, Set[Any]] = {}
+        index.on_forget(self.forget)
+
+    def render(self, kind: Text, package: Dict[Text, Any]) -> Any:
+        version = self.index.version
+        if version != self._version:
+            self._cards.clear()
+            self._ids.clear()
+            self._version = version
+        key = (version, kind, package["id"])
+        card = self._cards.get(key)
+        if card is not None:
+            registry.inc("trippy_card_renders_total", (("kind", kind), ("result", "cached")))
+            return card
+        registry.inc("trippy_card_renders_total", (("kind", kind), ("result", "rendered")))
+        card = RENDERERS[kind](package)
+        self._cards[key] = card
+        self._ids.setdefault(normalize(package["destination"]), set()).add(package["id"])
+        return card
+
+    def forget(self, destination: Text) -> None:
+        """Drop every card of the packages to a (normalized) destination."""
+        ids = self._ids.pop(destination, ())
+        if ids:
+            self._cards = {key: card for key, card in self._cards.items() if key[2] not in ids}
+
+    def text(self, package: Dict[Text, Any]) -> Text:
+        return self.render("text", package)
+
+    def element(self, package: Dict[Text, Any]) -> Dict[Text, Any]:
+        return self.render("element", package)
+
+    def order_details(self, package: Dict[Text, Any]) -> Text:
+        return self.render("order", package)
+
+
+cards = CardRenderer(catalog)
+registry.describe("trippy_card_renders_total", "Package messages by kind, rendered or served from the cache.")
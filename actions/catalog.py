@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Text
+
+from .backend import BackendClient, BackendError, backend
+from .matching import FuzzyMatcher, load_synonyms
+from .settings import config
+from .store import InvalidationLog, SharedStore, shared_store
+
+logger = logging.getLogger(__name__)
+
+# Served until the first successful load from the DB API.
+SEED_COUNTRIES = [
+    "Switzerland",
+    "Japan",
+    "Thailand",
+    "South Korea",
+    "Czech Republic",
+    "France",
+    "Italy",
+    "Spain",
+]
+
+SEED_DESTINATIONS = [
+    "Praha",
+    "Kalovy Vary",
+    "Fuengirola",
+    "Madrid",
+    "Versailles Palace",
+    "Mont Saint-Michel",
+    "Venice",
+    "Pompeii",
+    "Chiangmai",
+    "Bangkok",
+    "Seoul",
+    "Busan",
+    "Lucerne",
+    "Zurich",
+    "Hokkaido",
+    "Kobe",
+]
+
+CATALOG_REFRESH_INTERVAL = float(config.get("CATALOG_REFRESH_INTERVAL") or 600)
+# Minimum seconds between lazy load attempts while the DB API is unreachable.
+CATALOG_RETRY_INTERVAL = 30.0
+# `/package/popular` with a batch larger than the catalog returns every package.
+CATALOG_BATCH = 1000
+
+
+def normalize(name: Text) -> Text:
+    return " ".join(name.split()).casefold()
+
+
+class CatalogIndex:
+    """Normalized-name lookups over the package catalog.
+
+    Every load builds fresh maps and swaps them in at once, so readers never
+    see a half-built index. Country and destination names are resolved
+    through fuzzy matchers that also know the aliases in `aliases`. Aliases
+    can come from `alias_loader` instead; then they are read, and the
+    matchers built, on the first lookup or `warm()`, not at import.
+    """
+
+    def __init__(
+        self,
+        countries: Iterable[Text] = (),
+        destinations: Iterable[Text] = (),
+        aliases: Optional[Dict[Text, Text]] = None,
+        alias_loader: Optional[Callable[[], Dict[Text, Text]]] = None,
+    ) -> None:
+        self.version = 0
+        self.loaded_at = None
+        self._aliases = dict(aliases) if aliases is not None else None
+        self._alias_loader = alias_loader
+        self._countries = {normalize(c): c for c in countries}
+        self._destinations = {normalize(d): d for d in destinations}
+        self._packages: Dict[Text, Dict[Text, Any]] = {}
+        self._country_packages: Dict[Text, List[Dict[Text, Any]]] = {}
+        self._ranking: List[Dict[Text, Any]] = []
+        self._forget_hooks: List[Callable[[Text], None]] = []
+        self._country_matcher = self._destination_matcher = None
+        if self._aliases is not None or alias_loader is None:
+            self._build_matchers()
+
+    @property
+    def aliases(self) -> Dict[Text, Text]:
+        if self._aliases is None:
+            self._aliases = dict(self._alias_loader()) if self._alias_loader else {}
+        return self._aliases
+
+    def warm(self) -> None:
+        if self._country_matcher is None:
+            self._build_matchers()
+
+    def _build_matchers(self) -> None:
+        self._country_matcher = FuzzyMatcher(self._countries.values(), self.aliases)
+        self._destination_matcher = FuzzyMatcher(self._destinations.values(), self.aliases)
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    @property
+    def countries(self) -> List[Text]:
+        return list(self._countries.values())
+
+    @property
+    def destinations(self) -> List[Text]:
+        return list(self._destinations.values())
+
+    def load(self, packages: List[Dict[Text, Any]]) -> None:
+        countries, destinations, by_destination, by_country = {}, {}, {}, {}
+        for package in packages:
+            country, destination = normalize(package["country"]), normalize(package["destination"])
+            countries.setdefault(country, package["country"])
+            destinations.setdefault(destination, package["destination"])
+            by_destination.setdefault(destination, package)
+            by_country.setdefault(country, []).append(package)
+        self._countries, self._destinations = countries, destinations
+        self._packages, self._country_packages = by_destination, by_country
+        self._ranking = list(packages)
+        self._build_matchers()
+        self.version += 1
+        self.loaded_at = time.time()
+
+    def canonical_country(self, name: Optional[Text]) -> Optional[Text]:
+        self.warm()
+        return self._country_matcher.resolve(name)
+
+    def canonical_destination(self, name: Optional[Text]) -> Optional[Text]:
+        self.warm()
+        return self._destination_matcher.resolve(name)
+
+    def suggest_countries(self, name: Optional[Text], limit: int = 3) -> List[Text]:
+        self.warm()
+        return [m.name for m in self._country_matcher.suggest(name, limit)]
+
+    def suggest_destinations(self, name: Optional[Text], limit: int = 3) -> List[Text]:
+        self.warm()
+        return [m.name for m in self._destination_matcher.suggest(name, limit)]
+
+    def package_for(self, destination: Text) -> Optional[Dict[Text, Any]]:
+        return self._packages.get(normalize(destination))
+
+    def packages_in(self, country: Text) -> Optional[List[Dict[Text, Any]]]:
+        return self._country_packages.get(normalize(country))
+
+    def popular_page(self, offset: int, size: int) -> List[Dict[Text, Any]]:
+        """A page of packages in the DB API's popularity order, as of the last load."""
+        return self._ranking[offset:offset + size]
+
+    def on_forget(self, hook: Callable[[Text], None]) -> None:
+        """Call `hook` with the normalized destination whenever its package is forgotten."""
+        self._forget_hooks.append(hook)
+
+    def forget_package(self, destination: Text) -> Optional[Dict[Text, Any]]:
+        """Drop a destination's package from every index until the next load; returns it.
+
+        Its country's listing is dropped as a whole, so it is read from the
+        DB API again; the popularity ranking just skips the package.
+        """
+        for hook in self._forget_hooks:
+            hook(normalize(destination))
+        package = self._packages.pop(normalize(destination), None)
+        if package is not None:
+            self._country_packages.pop(normalize(package["country"]), None)
+            self._ranking = [p for p in self._ranking if p is not package]
+        return package
+
+
+class CatalogLoader:
+    """Loads the catalog index from the DB API and keeps it refreshed in the background.
+
+    With a `shared` store, a catalog another worker loaded less than
+    `interval` seconds ago is taken from there instead of the DB API, and
+    packages one worker forgets are forgotten by the others too.
+    """
+
+    def __init__(
+        self,
+        index: CatalogIndex,
+        client: BackendClient,
+        interval: float = CATALOG_REFRESH_INTERVAL,
+        shared: Optional[SharedStore] = None,
+    ) -> None:
+        self.index = index
+        self.client = client
+        self.interval = interval
+        self.shared = shared
+        self._lock = None
+        self._task = None
+        self._last_attempt = None
+        self._forgotten = InvalidationLog(shared, "forgotten packages") if shared is not None else None
+
+    async def refresh(self) -> bool:
+        if self._forgotten is not None:
+            # What was forgotten until now is already left out of what gets loaded.
+            self._forgotten.skip()
+        if self.shared is not None:
+            packages = self.shared.get("catalog", "packages", max_age=self.interval)
+            if packages is not None:
+                self.index.load(packages)
+                return True
+        try:
+            r = await self.client.get('/package/popular', params={"batch": CATALOG_BATCH})
+        except BackendError as e:
+            logger.warning(f"Catalog refresh failed: {e}")
+            return False
+        if r.status_code != 200:
+            logger.warning(f"Catalog refresh failed with status {r.status_code}")
+            return False
+        self.index.load(r.json()['packages'])
+        if self.shared is not None:
+            self.shared.set("catalog", "packages", r.json()['packages'], ttl=2 * self.interval)
+        logger.debug(f"Catalog v{self.index.version} loaded with {len(self.index.destinations)} destinations")
+        return True
+
+    async def ensure_loaded(self) -> None:
+        """Load once if nothing has been loaded yet, e.g. when started via `rasa run actions`.
+
+        Also forgets the packages other workers forgot since the last call.
+        """
+        if self.index.loaded:
+            await self._catch_up()
+            return
+        now = time.monotonic()
+        if self._last_attempt is not None and now - self._last_attempt < CATALOG_RETRY_INTERVAL:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.index.loaded:
+                return
+            self._last_attempt = time.monotonic()
+            if await self.refresh():
+                self.start()
+
+    def forget_package(self, destination: Text) -> None:
+        """Forget what the index and the read cache hold about a package that changed in the DB API."""
+        self.client.invalidate('/package/destination', params={"destination": destination})
+        package = self.index.forget_package(destination)
+        if package is not None:
+            self.client.invalidate('/package/country', params={"country": package["country"]})
+        if self.shared is not None:
+            self.shared.delete("catalog", "packages")
+            self._forgotten.publish(destination)
+
+    async def _catch_up(self) -> None:
+        if self._forgotten is None:
+            return
+        unseen = self._forgotten.unseen()
+        if unseen is None:
+            await self.refresh()
+            return
+        for destination in unseen:
+            self.index.forget_package(destination)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._refresh_forever())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _refresh_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.refresh()
+
+
+catalog = CatalogIndex(SEED_COUNTRIES, SEED_DESTINATIONS, alias_loader=load_synonyms)
+catalog_loader = CatalogLoader(catalog, backend, shared=shared_store)
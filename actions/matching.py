@@ -0,0 +1,137 @@
+import json
+import logging
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Text
+
+logger = logging.getLogger(__name__)
+
+NLU_DATA_PATH = "data/nlu.yml"
+# Rasa parses messages starting with this as `/intent{"entity": "value"}` without the NLU pipeline.
+INTENT_MESSAGE_PREFIX = "/"
+# Trigram candidates that get a full edit-distance check per query.
+MAX_CANDIDATES = 8
+
+
+class Match(NamedTuple):
+    name: Text
+    score: float
+    distance: int
+
+
+def match_key(text: Text) -> Text:
+    """Case-, accent-, space- and punctuation-insensitive form used for matching."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if c.isalnum())
+
+
+def intent_payload(intent: Text, **entities: Any) -> Text:
+    """Button payload for an intent and entities, e.g. `/inform{"destination": "Kobe"}`."""
+    return INTENT_MESSAGE_PREFIX + intent + (json.dumps(entities) if entities else "")
+
+
+def trigrams(key: Text) -> List[Text]:
+    padded = f"^{key}$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def edit_distance(a: Text, b: Text, limit: int) -> int:
+    """Optimal string alignment distance, giving up with `limit + 1` once it is exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def allowed_distance(key: Text) -> int:
+    if len(key) < 4:
+        return 0
+    return 1 + len(key) // 8
+
+
+def load_synonyms(path: Text = NLU_DATA_PATH) -> Dict[Text, Text]:
+    """Map every synonym example in the NLU training data to its canonical value."""
+    import yaml
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) or {}
+    except (OSError, yaml.YAMLError) as e:
+        logger.warning(f"Could not read synonyms from {path}: {e}")
+        return {}
+    synonyms = {}
+    for item in data.get("nlu", []):
+        if "synonym" not in item:
+            continue
+        for line in item.get("examples", "").splitlines():
+            alias = line.strip().lstrip("-").strip()
+            if alias:
+                synonyms[alias] = item["synonym"]
+    return synonyms
+
+
+class FuzzyMatcher:
+    """Resolves near-miss spellings and aliases to a fixed set of names.
+
+    Exact hits on the normalized form of a name or alias are a dict lookup;
+    anything else is narrowed down with a trigram index and ranked by edit
+    distance.
+    """
+
+    def __init__(self, names: Iterable[Text], aliases: Optional[Dict[Text, Text]] = None) -> None:
+        self.names = list(dict.fromkeys(names))
+        self._exact: Dict[Text, Text] = {}
+        for alias, name in (aliases or {}).items():
+            if name in self.names:
+                self._exact.setdefault(match_key(alias), name)
+        for name in self.names:
+            self._exact[match_key(name)] = name
+        self._keys = list(self._exact)
+        self._grams: Dict[Text, List[int]] = {}
+        for i, key in enumerate(self._keys):
+            for gram in set(trigrams(key)):
+                self._grams.setdefault(gram, []).append(i)
+
+    def suggest(self, query: Optional[Text], limit: int = 3) -> List[Match]:
+        """Ranked matches within the allowed edit distance, best first, one per name."""
+        if not query:
+            return []
+        key = match_key(query)
+        if key in self._exact:
+            return [Match(self._exact[key], 1.0, 0)]
+        shared = Counter(i for gram in trigrams(key) for i in self._grams.get(gram, ()))
+        best: Dict[Text, Match] = {}
+        limit_distance = max(allowed_distance(key), 1)
+        for i, _ in shared.most_common(MAX_CANDIDATES):
+            candidate = self._keys[i]
+            distance = edit_distance(key, candidate, limit_distance)
+            if distance > limit_distance:
+                continue
+            name = self._exact[candidate]
+            match = Match(name, 1 - distance / max(len(key), len(candidate)), distance)
+            if name not in best or match.score > best[name].score:
+                best[name] = match
+        return sorted(best.values(), key=lambda m: (-m.score, m.name))[:limit]
+
+    def resolve(self, query: Optional[Text]) -> Optional[Text]:
+        """The single name `query` confidently refers to, or None if unknown or ambiguous."""
+        matches = self.suggest(query, limit=2)
+        if not matches:
+            return None
+        top = matches[0]
+        if top.distance > allowed_distance(match_key(query)):
+            return None
+        if len(matches) > 1 and matches[1].distance == top.distance:
+            return None
+        return top.name
@@ -0,0 +1,167 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Text, Tuple
+
+from .settings import flag
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[Text, Text], ...]
+Sample = Tuple[Text, Dict[Text, Any], float]
+
+# Backend calls made while handling the current action, when tracing is on.
+_trace: contextvars.ContextVar = contextvars.ContextVar("trippy_trace", default=None)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+def _format_labels(labels: Iterable[Tuple[Text, Any]]) -> Text:
+    pairs = ",".join(f'{k}="{str(v)}"' for k, v in labels)
+    return f"{{{pairs}}}" if pairs else ""
+
+
+class MetricsRegistry:
+    """In-process counters and histograms rendered in the Prometheus text format.
+
+    Collectors are callables returning `(name, labels, value)` gauge samples,
+    evaluated on every render, for state owned by other components.
+    """
+
+    def __init__(self) -> None:
+        self.histograms: Dict[Text, Dict[Labels, Histogram]] = {}
+        self.counters: Dict[Text, Dict[Labels, float]] = {}
+        self.help: Dict[Text, Text] = {}
+        self.collectors: List[Callable[[], Iterable[Sample]]] = []
+        # Log one line per action call with its backend calls.
+        self.trace_enabled = flag("ACTION_TRACE_LOG")
+
+    def describe(self, name: Text, text: Text) -> None:
+        self.help[name] = text
+
+    def observe(self, name: Text, value: float, labels: Labels = ()) -> None:
+        series = self.histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name: Text, labels: Labels = (), amount: float = 1.0) -> None:
+        series = self.counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0.0) + amount
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        self.collectors.append(collector)
+
+    def reset(self) -> None:
+        self.histograms.clear()
+        self.counters.clear()
+
+    def render(self) -> Text:
+        lines = []
+        for name, series in sorted(self.counters.items()):
+            lines += self._header(name, "counter")
+            lines += [f"{name}{_format_labels(labels)} {value}" for labels, value in series.items()]
+        for name, series in sorted(self.histograms.items()):
+            lines += self._header(name, "histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        gauges: Dict[Text, List[Text]] = {}
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                gauges.setdefault(name, []).append(f"{name}{_format_labels(sorted(labels.items()))} {value}")
+        for name, samples in sorted(gauges.items()):
+            lines += self._header(name, "gauge") + samples
+        return "\n".join(lines) + "\n"
+
+    def _header(self, name: Text, kind: Text) -> List[Text]:
+        header = [f"# TYPE {name} {kind}"]
+        if name in self.help:
+            header.insert(0, f"# HELP {name} {self.help[name]}")
+        return header
+
+
+registry = MetricsRegistry()
+registry.describe("trippy_action_seconds", "Time spent in action run and validate_* methods.")
+registry.describe("trippy_action_errors_total", "Action methods that raised an exception.")
+registry.describe("trippy_backend_request_seconds", "Duration of DB API requests by route.")
+registry.describe("trippy_backend_requests_total", "DB API requests by route and status.")
+
+
+def record_backend_call(method: Text, route: Text, status: Any, seconds: float) -> None:
+    registry.observe("trippy_backend_request_seconds", seconds, (("method", method), ("route", route)))
+    registry.inc("trippy_backend_requests_total", (("method", method), ("route", route), ("status", str(status))))
+    calls = _trace.get()
+    if calls is not None:
+        calls.append({"route": f"{method} {route}", "status": status, "ms": round(seconds * 1000, 2)})
+
+
+def _instrumented(method_name: Text, method: Callable) -> Callable:
+    @functools.wraps(method)
+    async def wrapper(self, *args: Any, **kwargs: Any) -> Any:
+        labels = (("action", self.name()), ("method", method_name))
+        token = _trace.set([]) if registry.trace_enabled else None
+        start = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except Exception:
+            registry.inc("trippy_action_errors_total", labels)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            registry.observe("trippy_action_seconds", elapsed, labels)
+            if token is not None:
+                _log_trace(args, labels, elapsed, _trace.get())
+                _trace.reset(token)
+
+    return wrapper
+
+
+def _log_trace(args: Tuple, labels: Labels, elapsed: float, calls: List[Dict[Text, Any]]) -> None:
+    sender_id = next((arg.sender_id for arg in args if hasattr(arg, "sender_id")), None)
+    logger.info("trace " + json.dumps({
+        "sender_id": sender_id,
+        **dict(labels),
+        "ms": round(elapsed * 1000, 2),
+        "backend_calls": calls,
+    }))
+
+
+def instrument(cls: type) -> type:
+    """Class decorator recording latency and errors of an action's `run` and `validate_*` methods."""
+    names = ["run"] + [name for name in vars(cls) if name.startswith("validate_")]
+    for name in names:
+        method = getattr(cls, name, None)
+        if method is not None and not getattr(method, "__instrumented__", False):
+            wrapped = _instrumented(name, method)
+            wrapped.__instrumented__ = True
+            setattr(cls, name, wrapped)
+    return cls
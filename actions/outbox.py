@@ -0,0 +1,269 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+from rasa_sdk import Tracker
+
+from .backend import BackendClient, BackendError, CircuitOpenError, ConnectError, ServerError, backend
+from .catalog import catalog_loader
+from .metrics import registry
+from .resilience import RetryPolicy
+from .settings import config, flag
+
+logger = logging.getLogger(__name__)
+
+# Acknowledge order writes right away and send them to the DB API in the background.
+WRITE_BEHIND = flag("ORDER_WRITE_BEHIND")
+OUTBOX_PATH = config.get("ORDER_QUEUE_PATH") or "order_queue.sqlite3"
+
+PENDING, DONE, REJECTED, FAILED = "pending", "done", "rejected", "failed"
+
+# Writes that change package details the catalog and cache hold.
+CHANGES_PACKAGE = {"change_guide", "change_hotel"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS writes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    username TEXT,
+    destination TEXT,
+    method TEXT NOT NULL,
+    route TEXT NOT NULL,
+    params TEXT,
+    body TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL NOT NULL DEFAULT 0,
+    response_status INTEGER,
+    result TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS writes_status ON writes (status, id);
+CREATE INDEX IF NOT EXISTS writes_username ON writes (username, id);
+"""
+
+
+def idempotency_key(tracker: Tracker, kind: Text, **fields: Any) -> Text:
+    """Same key when Rasa runs the same action again for the same user message."""
+    message = tracker.latest_message or {}
+    turn = message.get("message_id") or len(tracker.events)
+    raw = json.dumps([tracker.sender_id, turn, kind, fields], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class WriteBehindQueue:
+    """Durable journal of DB API writes, drained by a background worker.
+
+    Writes are stored in SQLite before the user is answered, so they survive
+    action server restarts. The worker sends due writes in batches; writes for
+    the same user and destination go out one at a time in the order they were
+    made, and one waiting for a retry holds back the ones behind it. Only
+    writes that were provably never sent (no connection, or an open circuit
+    breaker) are retried, with backoff, up to `max_attempts` times: the DB
+    API does not deduplicate writes, and a resent order or guide change
+    would be applied twice. A 5xx answer, a timeout or a dropped connection
+    leaves the outcome unknown, so the write is marked FAILED for
+    reconciliation; 4xx answers are final. Each write carries an
+    `Idempotency-Key` header, and a claimed write is leased for `lease`
+    seconds so several processes can share one journal.
+    """
+
+    def __init__(
+        self,
+        path: Text,
+        client: BackendClient,
+        batch_size: int = 20,
+        max_attempts: int = 8,
+        interval: float = 1.0,
+        lease: float = 30.0,
+        retry: Optional[RetryPolicy] = None,
+    ) -> None:
+        self.path = path
+        self.client = client
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.interval = interval
+        self.lease = lease
+        self.retry = retry or RetryPolicy(base_delay=1.0, max_delay=60.0)
+        self._db = None
+        self._task = None
+        self._wakeup = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def enqueue(
+        self,
+        key: Text,
+        kind: Text,
+        method: Text,
+        route: Text,
+        username: Optional[Text] = None,
+        destination: Optional[Text] = None,
+        params: Optional[Dict[Text, Any]] = None,
+        body: Any = None,
+    ) -> bool:
+        """Journal a write; False if one with the same key is already there."""
+        now = time.time()
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO writes (key, kind, username, destination, method, route, params, body,"
+            " next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, kind, username, destination, method, route,
+             json.dumps(params) if params is not None else None,
+             json.dumps(body) if body is not None else None, now, now, now),
+        )
+        self.start()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return cursor.rowcount == 1
+
+    def recent(self, username: Text, limit: int = 5) -> List[sqlite3.Row]:
+        return self.db.execute(
+            "SELECT * FROM writes WHERE username = ? ORDER BY id DESC LIMIT ?", (username, limit)
+        ).fetchall()
+
+    def counts(self) -> Dict[Text, int]:
+        return dict(self.db.execute("SELECT status, COUNT(*) FROM writes GROUP BY status").fetchall())
+
+    def _claim(self) -> "OrderedDict[Tuple, List[sqlite3.Row]]":
+        """Lease the due writes at the head of each user/destination sequence."""
+        now = time.time()
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = db.execute("SELECT * FROM writes WHERE status = ? ORDER BY id LIMIT ?",
+                              (PENDING, self.batch_size * 10)).fetchall()
+            groups: "OrderedDict[Tuple, List[sqlite3.Row]]" = OrderedDict()
+            blocked, claimed = set(), []
+            for row in rows:
+                group = (row["username"], row["destination"])
+                if group in blocked:
+                    continue
+                if row["next_attempt_at"] > now or row["lease_until"] > now or len(claimed) >= self.batch_size:
+                    blocked.add(group)
+                    continue
+                groups.setdefault(group, []).append(row)
+                claimed.append(row["id"])
+            db.executemany("UPDATE writes SET lease_until = ? WHERE id = ?",
+                           [(now + self.lease, write_id) for write_id in claimed])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return groups
+
+    async def _send(self, row: sqlite3.Row) -> bool:
+        """Send one write and record the outcome; True if later writes of its group may follow."""
+        attempts = row["attempts"] + 1
+        try:
+            r = await self.client.request(
+                row["method"],
+                row["route"],
+                params=json.loads(row["params"]) if row["params"] else None,
+                json=json.loads(row["body"]) if row["body"] else None,
+                headers={"Idempotency-Key": row["key"]},
+            )
+            status, result, error, unsent = r.status_code, r.json(), None, False
+        except (ConnectError, CircuitOpenError) as e:
+            status, result, error, unsent = None, None, str(e), True
+        except ServerError as e:
+            status, result, error, unsent = e.status_code, None, str(e), False
+        except BackendError as e:
+            status, result, error, unsent = None, None, str(e), False
+        now = time.time()
+        if status is not None and status < 500:
+            outcome = DONE if status < 400 else REJECTED
+            self.db.execute(
+                "UPDATE writes SET status = ?, attempts = ?, response_status = ?, result = ?, lease_until = 0,"
+                " updated_at = ? WHERE id = ?",
+                (outcome, attempts, status, json.dumps(result), now, row["id"]),
+            )
+            registry.inc("trippy_outbox_writes_total", (("kind", row["kind"]), ("status", outcome)))
+            if outcome == DONE and row["kind"] in CHANGES_PACKAGE and row["destination"]:
+                catalog_loader.forget_package(row["destination"])
+            return True
+        error = error or f"status {status}"
+        if not unsent or attempts >= self.max_attempts:
+            if not unsent:
+                error = f"outcome unknown, not resent: {error}"
+            self.db.execute(
+                "UPDATE writes SET status = ?, attempts = ?, response_status = ?, last_error = ?, lease_until = 0,"
+                " updated_at = ? WHERE id = ?",
+                (FAILED, attempts, status, error, now, row["id"]),
+            )
+            registry.inc("trippy_outbox_writes_total", (("kind", row["kind"]), ("status", FAILED)))
+            logger.error(f"Giving up on {row['kind']} write {row['key']} after {attempts} attempt(s): {error}")
+            return True
+        self.db.execute(
+            "UPDATE writes SET attempts = ?, response_status = ?, last_error = ?, next_attempt_at = ?,"
+            " lease_until = 0, updated_at = ? WHERE id = ?",
+            (attempts, status, error, now + self.retry.backoff(attempts), now, row["id"]),
+        )
+        return False
+
+    async def _send_in_order(self, rows: List[sqlite3.Row]) -> None:
+        for row in rows:
+            if not await self._send(row):
+                return
+
+    async def drain_once(self) -> int:
+        """Send one batch of due writes; returns how many were claimed."""
+        groups = self._claim()
+        await asyncio.gather(*(self._send_in_order(rows) for rows in groups.values()))
+        return sum(len(rows) for rows in groups.values())
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._drain_forever())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _drain_forever(self) -> None:
+        while True:
+            try:
+                claimed = await self.drain_once()
+            except Exception:
+                logger.exception("Draining the order queue failed")
+                claimed = 0
+            if claimed:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def metric_samples(self):
+        if self._db is None:
+            return
+        for status, count in self.counts().items():
+            yield "trippy_outbox_writes", {"status": status}, count
+
+
+outbox = WriteBehindQueue(OUTBOX_PATH, backend)
+registry.describe("trippy_outbox_writes_total", "Queued DB API writes finished, by kind and outcome.")
+registry.add_collector(outbox.metric_samples)
@@ -0,0 +1,90 @@
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Text, Tuple
+
+from rasa_sdk import Tracker
+from rasa_sdk.events import EventType, FollowupAction, SlotSet
+
+logger = logging.getLogger(__name__)
+
+DOMAIN_PATH = "domain.yml"
+ROUTES_PATH = "post_auth_routes.yml"
+# Action to run again after a login it was waiting for; set when a session expired.
+RESUME_SLOT = "resume_action"
+
+
+class PostAuthRouter:
+    """Intent -> followup lookup shared by the login and registration actions.
+
+    The followup is returned as a `FollowupAction`, so Rasa runs it right away
+    instead of asking the policies what comes after authentication. An
+    action that was refused for lack of a session takes precedence.
+    """
+
+    def __init__(self, routes: Dict[Text, Tuple[Optional[Text], Optional[Text]]]) -> None:
+        self.routes = dict(routes)
+        self._with_destination = {intent: route[0] for intent, route in self.routes.items() if route[0]}
+        self._without_destination = {intent: route[1] for intent, route in self.routes.items() if route[1]}
+
+    def followup(self, last_intent: Optional[Text], destination: Any = None) -> Optional[Text]:
+        return (self._with_destination if destination else self._without_destination).get(last_intent)
+
+    def authenticated(self, tracker: Tracker) -> List[EventType]:
+        resume = tracker.get_slot(RESUME_SLOT)
+        followup = resume or self.followup(tracker.get_slot("last_intent"), tracker.get_slot("destination"))
+        events = [SlotSet("is_authenticated", True)]
+        if resume:
+            events.append(SlotSet(RESUME_SLOT, None))
+        if followup is not None:
+            events.append(FollowupAction(name=followup))
+        return events
+
+    def problems(self, domain: Dict[Text, Any]) -> List[Text]:
+        if not self.routes:
+            return [f"no routes, check {ROUTES_PATH}"]
+        intents = set(_names(domain.get("intents")))
+        actions = set(_names(domain.get("actions"))) | set(domain.get("responses") or {}) | set(domain.get("forms") or {})
+        problems = [f"unknown intent '{intent}'" for intent in self.routes if intent not in intents]
+        problems += [f"unknown action '{action}' for intent '{intent}'"
+                     for table in (self._with_destination, self._without_destination)
+                     for intent, action in table.items() if action not in actions]
+        return problems
+
+    def validate(self, domain: Dict[Text, Any]) -> None:
+        problems = self.problems(domain)
+        if problems:
+            raise ValueError("Invalid post-authentication routes: " + "; ".join(problems))
+
+
+def _names(entries: Optional[Iterable[Any]]) -> Iterable[Text]:
+    # Intents may be listed as plain names or as `{name: {options}}` mappings.
+    for entry in entries or []:
+        yield from (entry if isinstance(entry, dict) else [entry])
+
+
+def load_routes(path: Text = ROUTES_PATH) -> Dict[Text, Tuple[Optional[Text], Optional[Text]]]:
+    """Intent -> (followup with a destination, followup without one) from the routes file."""
+    import yaml
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) or {}
+    except (OSError, yaml.YAMLError) as e:
+        logger.warning(f"Could not read the post-authentication routes from {path}: {e}")
+        return {}
+    return {intent: ((route or {}).get("with_destination"), (route or {}).get("without_destination"))
+            for intent, route in data.items()}
+
+
+def load_domain(path: Text = DOMAIN_PATH) -> Optional[Dict[Text, Any]]:
+    import yaml
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            return yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) or {}
+    except (OSError, yaml.YAMLError) as e:
+        logger.warning(f"Could not read the domain from {path}: {e}")
+        return None
+
+
+POST_AUTH_ROUTES = load_routes()
+post_auth_router = PostAuthRouter(POST_AUTH_ROUTES)
@@ -0,0 +1,117 @@
+"""Action server entrypoint that preloads the package catalog before serving.
+
+Equivalent to `rasa run actions`, plus startup/shutdown hooks, a `/ready`
+endpoint that answers 200 once warm-up is done, and a Prometheus-style
+`/metrics` endpoint:
+
+    python -m actions.server --port 5055 --workers 4
+
+With several workers, set SHARED_CACHE_PATH so they share the catalog,
+cached reads and sessions. Metrics are collected per worker.
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+STARTED = time.monotonic()
+
+from rasa_sdk import utils
+from rasa_sdk.constants import DEFAULT_SERVER_PORT
+from rasa_sdk.endpoint import create_app
+from sanic import Sanic, response
+from sanic.request import Request
+
+from .backend import BackendError, backend
+from .catalog import catalog, catalog_loader
+from .metrics import registry
+from .outbox import WRITE_BEHIND, outbox
+from .routing import load_domain, post_auth_router
+from .store import shared_store
+from .usernames import usernames
+
+logger = logging.getLogger(__name__)
+
+IMPORTED = time.monotonic()
+
+# Cached reads fetched during warm-up, which also opens pooled connections.
+WARM_ROUTES = ('/info/company', '/info/contact')
+
+startup = {"ready": False, "import_ms": (IMPORTED - STARTED) * 1000, "warm_up_ms": None}
+
+
+async def prime(route: str) -> None:
+    try:
+        await backend.get_cached(route)
+    except BackendError as e:
+        logger.warning(f"Warm-up read of {route} failed: {e}")
+
+
+async def warm_up(app: Sanic, loop) -> None:
+    begin = time.monotonic()
+    domain = load_domain()
+    if domain is not None:
+        post_auth_router.validate(domain)
+    loaded, *_ = await asyncio.gather(catalog_loader.refresh(), usernames.refresh(),
+                                      *(prime(route) for route in WARM_ROUTES))
+    if loaded:
+        catalog_loader.start()
+    catalog.warm()
+    usernames.start()
+    if WRITE_BEHIND:
+        outbox.start()
+    startup["warm_up_ms"] = (time.monotonic() - begin) * 1000
+    startup["ready"] = True
+    logger.info(f"Action server ready: imports {startup['import_ms']:.0f} ms, "
+                f"warm-up {startup['warm_up_ms']:.0f} ms, catalog loaded: {catalog.loaded}")
+
+
+async def shut_down(app: Sanic, loop) -> None:
+    catalog_loader.stop()
+    usernames.stop()
+    outbox.stop()
+    await backend.close()
+
+
+async def ready(request: Request) -> response.HTTPResponse:
+    body = {
+        "status": "ready" if startup["ready"] else "starting",
+        "catalog_loaded": catalog.loaded,
+        "catalog_version": catalog.version,
+        "import_ms": round(startup["import_ms"]),
+        "warm_up_ms": startup["warm_up_ms"] and round(startup["warm_up_ms"]),
+    }
+    return response.json(body, status=200 if startup["ready"] else 503)
+
+
+async def metrics(request: Request) -> response.HTTPResponse:
+    return response.text(registry.render(), content_type="text/plain; version=0.0.4")
+
+
+def create_server(action_package_name: str = "actions", cors_origins: str = "*") -> Sanic:
+    app = create_app(action_package_name, cors_origins=cors_origins)
+    app.register_listener(warm_up, "before_server_start")
+    app.register_listener(shut_down, "after_server_stop")
+    app.add_route(ready, "/ready", methods=["GET"])
+    app.add_route(metrics, "/metrics", methods=["GET"])
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Start the Trippy action server.")
+    parser.add_argument("-p", "--port", type=int, default=DEFAULT_SERVER_PORT)
+    parser.add_argument("--actions", default="actions", help="name of the action package to load")
+    parser.add_argument("--cors", default="*")
+    parser.add_argument("--workers", type=int, default=utils.number_of_sanic_workers(),
+                        help="worker processes (default: ACTION_SERVER_SANIC_WORKERS or 1)")
+    args = parser.parse_args()
+
+    if args.workers > 1 and shared_store is None:
+        logger.warning("Running several workers without SHARED_CACHE_PATH: every worker keeps its own "
+                       "catalog and caches.")
+    app = create_server(args.actions, cors_origins=args.cors)
+    app.run("0.0.0.0", args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import functools
+import logging
+import secrets
+from typing import Any, Callable, Dict, Iterable, Optional, Text, Tuple
+
+from rasa_sdk.events import FollowupAction, SlotSet
+
+from .cache import TTLCache
+from .metrics import registry
+from .routing import RESUME_SLOT, load_domain
+from .settings import config
+from .store import SharedStore, shared_store
+
+logger = logging.getLogger(__name__)
+
+# Where sessions are kept when no SHARED_CACHE_PATH is set, so they survive restarts.
+SESSION_STORE_PATH = config.get("SESSION_STORE_PATH") or "sessions.sqlite3"
+SESSION_EXPIRED_MESSAGE = "Your session has expired, please log in again."
+LOGIN_FORM = "login_form"
+
+
+def domain_session_ttl(domain: Optional[Dict[Text, Any]]) -> float:
+    """The domain's `session_expiration_time` in seconds, 60 minutes if it has none."""
+    minutes = ((domain or {}).get("session_config") or {}).get("session_expiration_time") or 60
+    return float(minutes) * 60
+
+
+# A session lasts as long as Rasa keeps the `is_authenticated` slot of the conversation.
+SESSION_TTL = float(config.get("SESSION_TTL") or 0) or domain_session_ttl(load_domain())
+
+
+class Session:
+    __slots__ = ("username", "token")
+
+    def __init__(self, username: Text, token: Text) -> None:
+        self.username = username
+        self.token = token
+
+
+class SessionStore:
+    """Short-lived session tokens handed out after a login, keyed by sender id.
+
+    Credentials are checked against the DB API once per session; authenticated
+    actions afterwards only need a live session for the same username. Every
+    use extends the session by `ttl` seconds. With a `shared` store, sessions
+    opened by one worker process are valid in the others.
+    """
+
+    def __init__(self, ttl: float = SESSION_TTL, max_size: int = 10000, shared: Optional[SharedStore] = None) -> None:
+        self.ttl = ttl
+        self.shared = shared
+        self._sessions = TTLCache(max_size=max_size)
+
+    def _store(self, sender_id: Text, session: Session) -> None:
+        self._sessions.set(sender_id, session, self.ttl)
+        if self.shared is not None:
+            self.shared.set("session", sender_id, [session.username, session.token], self.ttl)
+
+    def open(self, sender_id: Text, username: Text, token: Optional[Text] = None) -> Session:
+        session = Session(username, token or secrets.token_urlsafe(24))
+        self._store(sender_id, session)
+        return session
+
+    def get(self, sender_id: Text, username: Optional[Text]) -> Optional[Session]:
+        session = self._sessions.get(sender_id)
+        if session is None and self.shared is not None:
+            stored = self.shared.get("session", sender_id)
+            session = Session(*stored) if stored is not None else None
+        if session is None or not username or session.username != username:
+            return None
+        self._store(sender_id, session)
+        return session
+
+    def metric_samples(self) -> Iterable[Tuple[Text, Dict[Text, Any], float]]:
+        yield "trippy_sessions", {}, len(self._sessions)
+
+
+def requires_session(run: Callable) -> Callable:
+    """Only run the action for a conversation with a live session for its `username` slot.
+
+    Otherwise the conversation is marked unauthenticated and the login form
+    asks for the password again; once the login succeeds, the action is run
+    again (see `PostAuthRouter.authenticated`).
+    """
+
+    @functools.wraps(run)
+    async def wrapper(self, dispatcher, tracker, domain):
+        if sessions.get(tracker.sender_id, tracker.get_slot("username")) is None:
+            logger.debug(f"{self.name()} refused for {tracker.sender_id}: no session")
+            dispatcher.utter_message(SESSION_EXPIRED_MESSAGE)
+            return [
+                SlotSet("is_authenticated", False),
+                SlotSet("password", None),
+                SlotSet(RESUME_SLOT, self.name()),
+                FollowupAction(name=LOGIN_FORM),
+            ]
+        return await run(self, dispatcher, tracker, domain)
+
+    return wrapper
+
+
+sessions = SessionStore(shared=shared_store or SharedStore(SESSION_STORE_PATH))
+registry.add_collector(sessions.metric_samples)
@@ -0,0 +1,12 @@
+from typing import Text
+
+from dotenv import dotenv_values
+
+config = dotenv_values(".env")
+
+
+def flag(name: Text, default: bool = False) -> bool:
+    value = config.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
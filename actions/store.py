@@ -0,0 +1,167 @@
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, List, Optional, Text
+
+from .settings import config
+
+logger = logging.getLogger(__name__)
+
+# SQLite file shared by every action server worker on the machine. Unset, each
+# worker only has its own in-process caches.
+SHARED_CACHE_PATH = config.get("SHARED_CACHE_PATH") or None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_expiry ON entries (expires_at);
+"""
+
+
+class SharedStore:
+    """Expiring JSON values in a SQLite file that worker processes share.
+
+    It sits behind the in-process caches: a worker that misses locally looks
+    here before calling the DB API, and what one worker fetches the others
+    can reuse. Store errors are logged and treated as misses.
+    """
+
+    # Expired entries are removed every `purge_every` writes.
+    purge_every = 1000
+
+    def __init__(self, path: Text) -> None:
+        self.path = path
+        self._db = None
+        self._writes = 0
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, isolation_level=None, timeout=1.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=OFF")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def get(self, namespace: Text, key: Text, max_age: Optional[float] = None) -> Any:
+        """The stored value, or None if missing, expired or older than `max_age` seconds."""
+        try:
+            row = self.db.execute(
+                "SELECT value, stored_at FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared store read failed: {e}")
+            return None
+        if row is None or (max_age is not None and time.time() - row[1] > max_age):
+            return None
+        return json.loads(row[0])
+
+    def set(self, namespace: Text, key: Text, value: Any, ttl: float) -> None:
+        now = time.time()
+        try:
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, stored_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now, now + ttl),
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Shared store write failed: {e}")
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self.purge()
+
+    def delete(self, namespace: Text, key: Optional[Text] = None) -> None:
+        """Drop one key, or the whole namespace."""
+        try:
+            if key is None:
+                self.db.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+            else:
+                self.db.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+        except sqlite3.Error as e:
+            logger.warning(f"Shared store delete failed: {e}")
+
+    def increment(self, namespace: Text, key: Text, ttl: float) -> Optional[int]:
+        """Add one to a counter, created at 1, and return the new value; None if the store failed."""
+        now = time.time()
+        try:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.execute(
+                    "INSERT INTO entries (namespace, key, value, stored_at, expires_at) VALUES (?, ?, '1', ?, ?) "
+                    "ON CONFLICT (namespace, key) DO UPDATE SET value = CAST(value AS INTEGER) + 1, "
+                    "stored_at = excluded.stored_at, expires_at = excluded.expires_at",
+                    (namespace, key, now, now + ttl),
+                )
+                row = self.db.execute(
+                    "SELECT value FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+                ).fetchone()
+            except sqlite3.Error:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.warning(f"Shared store increment failed: {e}")
+            return None
+        return int(row[0])
+
+    def purge(self) -> None:
+        try:
+            self.db.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        except sqlite3.Error as e:
+            logger.warning(f"Shared store purge failed: {e}")
+
+
+class InvalidationLog:
+    """Numbered invalidations in a SharedStore, for every worker to replay.
+
+    A worker publishes what it invalidated; the others call `unseen()` before
+    serving from their own caches. `unseen()` returns None when the log can
+    no longer tell what was missed (entries expired, or too many of them),
+    and the caller then drops everything it holds.
+    """
+
+    # How long the counter and the published items are kept.
+    counter_ttl = 365 * 24 * 3600.0
+    item_ttl = 24 * 3600.0
+    max_replay = 1000
+
+    def __init__(self, store: SharedStore, namespace: Text) -> None:
+        self.store = store
+        self.namespace = namespace
+        self._seen: Optional[int] = None
+
+    def last(self) -> int:
+        return self.store.get(self.namespace, "last") or 0
+
+    def publish(self, item: Any) -> None:
+        number = self.store.increment(self.namespace, "last", ttl=self.counter_ttl)
+        if number is not None:
+            self.store.set(self.namespace, str(number), item, ttl=self.item_ttl)
+
+    def skip(self) -> None:
+        """Mark everything published so far as seen, e.g. right before a full reload."""
+        self._seen = self.last()
+
+    def unseen(self) -> Optional[List[Any]]:
+        """The items published since the last call, or None if they cannot all be replayed."""
+        last = self.last()
+        if self._seen is None:
+            self._seen = last
+            return []
+        if last == self._seen:
+            return []
+        seen, self._seen = self._seen, last
+        if not 0 < last - seen <= self.max_replay:
+            return None
+        items = [self.store.get(self.namespace, str(number)) for number in range(seen + 1, last + 1)]
+        return None if any(item is None for item in items) else items
+
+
+shared_store = SharedStore(SHARED_CACHE_PATH) if SHARED_CACHE_PATH else None
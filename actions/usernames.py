@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import logging
+import math
+from typing import Iterable, Optional, Text
+
+from .backend import BackendClient, BackendError, backend
+from .settings import config
+
+logger = logging.getLogger(__name__)
+
+# Optional DB API route answering with every taken username as {"usernames": [...]}.
+USERNAMES_ROUTE = config.get("DB_API_USERNAMES_ROUTE") or None
+USERNAMES_REFRESH_INTERVAL = float(config.get("USERNAMES_REFRESH_INTERVAL") or 300)
+USERNAMES_FALSE_POSITIVE_RATE = 0.01
+
+
+class BloomFilter:
+    """Fixed-size set membership test with no false negatives.
+
+    Sized for `capacity` items at `error_rate` false positives; the k bit
+    positions come from double hashing one blake2b digest.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = USERNAMES_FALSE_POSITIVE_RATE) -> None:
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: Text) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: Text) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: Text) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class UsernameIndex:
+    """Answers "definitely free" for usernames without asking the DB API.
+
+    Until the first sync from `route` every name counts as possibly taken,
+    so callers keep checking with the DB API. Names registered through this
+    server are added right away; others registered elsewhere show up with
+    the next sync.
+    """
+
+    def __init__(
+        self,
+        client: BackendClient,
+        route: Optional[Text] = USERNAMES_ROUTE,
+        interval: float = USERNAMES_REFRESH_INTERVAL,
+        error_rate: float = USERNAMES_FALSE_POSITIVE_RATE,
+    ) -> None:
+        self.client = client
+        self.route = route
+        self.interval = interval
+        self.error_rate = error_rate
+        self.filter: Optional[BloomFilter] = None
+        self._task = None
+
+    @property
+    def synced(self) -> bool:
+        return self.filter is not None
+
+    def load(self, usernames: Iterable[Text]) -> None:
+        usernames = list(usernames)
+        # Headroom so registrations between syncs keep the error rate down.
+        bloom = BloomFilter(max(1000, 2 * len(usernames)), self.error_rate)
+        for username in usernames:
+            bloom.add(username)
+        self.filter = bloom
+
+    def maybe_taken(self, username: Text) -> bool:
+        return self.filter is None or username in self.filter
+
+    def add(self, username: Text) -> None:
+        if self.filter is not None:
+            self.filter.add(username)
+
+    async def refresh(self) -> bool:
+        if not self.route:
+            return False
+        try:
+            r = await self.client.get(self.route)
+        except BackendError as e:
+            logger.warning(f"Username sync failed: {e}")
+            return False
+        if r.status_code != 200:
+            logger.warning(f"Username sync failed with status {r.status_code}")
+            return False
+        self.load(r.json()['usernames'])
+        return True
+
+    def start(self) -> None:
+        if self.route and (self._task is None or self._task.done()):
+            self._task = asyncio.ensure_future(self._refresh_forever())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _refresh_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.refresh()
+
+
+usernames = UsernameIndex(backend)
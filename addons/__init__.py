@@ -0,0 +1 @@
+"""Extensions loaded by the Rasa server itself (not by the action server)."""
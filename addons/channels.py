@@ -0,0 +1,64 @@
+from typing import Any, Awaitable, Callable, Optional, Text, Tuple
+
+from rasa.core.channels.channel import UserMessage
+from rasa.core.channels.rest import RestInput
+from rasa.core.channels.socketio import SocketIOInput
+from sanic import Blueprint
+
+from actions.routing import load_domain
+from addons.fast_path import FastPath
+
+fast_path = FastPath.from_nlu_data(domain=load_domain())
+
+
+class FastPathInput:
+    """Input channel mixin that sends bare destinations and countries past the NLU pipeline.
+
+    Messages `fast_path` recognizes are rewritten to intent payloads before
+    Rasa parses them, unless the conversation's active form is asking for
+    something else (see `FastPath.rewrite`); the text the user typed is
+    kept in the message metadata as `typed_text`.
+    """
+
+    app = None
+
+    def form_state(self, sender_id: Text) -> Optional[Tuple[Optional[Text], Optional[Text]]]:
+        """(active loop, requested slot) of the stored conversation; None if it cannot be read."""
+        agent = getattr(self.app, "agent", None)
+        if agent is None or agent.tracker_store is None:
+            return None
+        tracker = agent.tracker_store.retrieve(sender_id)
+        if tracker is None:
+            return None, None
+        return tracker.active_loop_name, tracker.get_slot("requested_slot")
+
+    def blueprint(self, on_new_message: Callable[[UserMessage], Awaitable[Any]]) -> Blueprint:
+        async def handle(message: UserMessage) -> Any:
+            # Only load the tracker for messages the fast path could rewrite.
+            if fast_path.match(message.text) is not None:
+                state = self.form_state(message.sender_id)
+                payload = fast_path.rewrite(message.text, *state) if state is not None else None
+                if payload is not None:
+                    message.metadata = {**(message.metadata or {}), "typed_text": message.text}
+                    message.text = payload
+            return await on_new_message(message)
+
+        blueprint = super().blueprint(handle)
+        # The agent is only reachable through the app, which socket.io
+        # messages never pass as a request; keep the app it is registered on.
+        register = blueprint.register
+
+        def register_on(app: Any, options: Any) -> None:
+            self.app = app
+            register(app, options)
+
+        blueprint.register = register_on
+        return blueprint
+
+
+class FastPathRestInput(FastPathInput, RestInput):
+    pass
+
+
+class FastPathSocketIOInput(FastPathInput, SocketIOInput):
+    pass
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Text
+
+import numpy as np
+from rasa.core.brokers.broker import EventBroker
+from rasa.utils.endpoints import EndpointConfig
+
+from addons.event_columns import ColumnarEventLog
+
+logger = logging.getLogger(__name__)
+
+
+class ColumnarEventBroker(EventBroker):
+    """Event broker appending every tracker event to a columnar event log.
+
+    Configured in `endpoints.yml` with `path`, the log directory, and
+    optionally `segment_rows` and `flush_interval`: buffered events are
+    written once `segment_rows` have accumulated, every `flush_interval`
+    seconds from a timer, and when Rasa shuts down. Segment files are
+    compressed and written on a worker thread, not on the event loop. Read
+    the log with `python -m tools.analytics`.
+    """
+
+    def __init__(self, path: Text = "analytics/events", segment_rows: int = 5000,
+                 flush_interval: float = 60.0) -> None:
+        self.log = ColumnarEventLog(path, int(segment_rows))
+        self.flush_interval = float(flush_interval)
+        # One thread, so segments are written one at a time and in order.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analytics")
+        self._writes: Set[asyncio.Future] = set()
+        self._unwritten: List[Dict[Text, np.ndarray]] = []
+        self._timer: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def from_endpoint_config(
+        cls, broker_config: EndpointConfig, event_loop: Optional[Any] = None
+    ) -> "ColumnarEventBroker":
+        broker = cls(**broker_config.kwargs)
+        broker.start()
+        return broker
+
+    def start(self) -> None:
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.ensure_future(self._flush_periodically())
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    def publish(self, event: Dict[Text, Any]) -> None:
+        self.log.buffer(event)
+        if len(self.log) >= self.log.segment_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        """Hand the buffered rows, and any that failed to write before, to the writer thread."""
+        arrays = self.log.take()
+        batches, self._unwritten = self._unwritten + ([arrays] if arrays is not None else []), []
+        for batch in batches:
+            write = asyncio.get_event_loop().run_in_executor(self._executor, self._write, batch)
+            self._writes.add(write)
+            write.add_done_callback(self._written)
+
+    def _write(self, arrays: Dict[Text, np.ndarray]) -> Optional[Dict[Text, np.ndarray]]:
+        """Runs on the writer thread; returns the arrays if they could not be written."""
+        try:
+            self.log.write(arrays)
+        except OSError as e:
+            logger.warning(f"Could not write analytics events to {self.log.directory}: {e}")
+            return arrays
+        return None
+
+    def _written(self, write: asyncio.Future) -> None:
+        self._writes.discard(write)
+        if not write.cancelled() and write.result() is not None:
+            # Keep the rows and try again on the next flush.
+            self._unwritten.append(write.result())
+
+    async def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self.flush()
+        if self._writes:
+            await asyncio.gather(*self._writes)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,108 @@
+"""Compact storage format for tracker events, and truncation of old turns.
+
+Works on event dicts as produced by `Event.as_dict()`, so it can be used and
+measured without Rasa installed.
+"""
+import json
+import zlib
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+MAGIC = b"z1:"
+
+# Events after which no slot value from before is left.
+RESETS = {"restart", "session_started"}
+
+
+def trim_parse_data(event: Dict[Text, Any], ranking_length: Optional[int]) -> Dict[Text, Any]:
+    """Keep only the top `ranking_length` intents of a user event's ranking."""
+    parse_data = event.get("parse_data") or {}
+    ranking = parse_data.get("intent_ranking")
+    if ranking_length is None or not ranking or len(ranking) <= ranking_length:
+        return event
+    return {**event, "parse_data": {**parse_data, "intent_ranking": ranking[:ranking_length]}}
+
+
+def encode(events: List[Dict[Text, Any]], level: int = 1) -> bytes:
+    """`MAGIC`, the event count, then the zlib-compressed JSON list.
+
+    The count can be read from the first bytes without decompressing.
+    """
+    payload = json.dumps(events, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return MAGIC + str(len(events)).encode() + b":" + zlib.compress(payload, level)
+
+
+def decode(stored: bytes) -> List[Dict[Text, Any]]:
+    """Events from `encode`, or from a plain Rasa dialogue JSON stored before."""
+    if not stored.startswith(MAGIC):
+        return json.loads(stored)["events"]
+    _, _, payload = stored[len(MAGIC):].partition(b":")
+    return json.loads(zlib.decompress(payload))
+
+
+def stored_count(header: bytes) -> Optional[int]:
+    """Event count from the first bytes of an encoded value; None for other formats."""
+    if not header.startswith(MAGIC):
+        return None
+    count, sep, _ = header[len(MAGIC):].partition(b":")
+    return int(count) if sep else None
+
+
+def session_start(events: List[Dict[Text, Any]]) -> int:
+    """Index where the current session begins, at its `action_session_start`."""
+    for i in range(len(events) - 1, -1, -1):
+        if events[i].get("event") == "session_started":
+            previous = events[i - 1] if i else {}
+            if previous.get("event") == "action" and previous.get("name") == "action_session_start":
+                return i - 1
+            return i
+    return 0
+
+
+def truncate(
+    events: List[Dict[Text, Any]], max_age: float, keep_turns: int, now: float
+) -> Tuple[List[Dict[Text, Any]], int]:
+    """Drop earlier sessions and, in long sessions, turns older than `max_age` seconds.
+
+    Everything before the current session goes, since starting a session
+    resets the tracker. Inside the current session the stored history is cut
+    at a user message when everything before it is older than `max_age`,
+    at least `keep_turns` user turns remain, and no form is active and the
+    conversation not paused there. The slots set before the cut are replaced
+    by one snapshot of their values, including slots set back to None, which
+    would otherwise revert to their `initial_value`. With `max_age` 0 only earlier sessions
+    are dropped. Returns the kept events and how many were dropped.
+    """
+    start = session_start(events)
+    turns = [i for i in range(start + 1, len(events)) if events[i].get("event") == "user"]
+    cutoff = now - max_age
+    candidates = {i for i in turns[:max(0, len(turns) - keep_turns + 1)]
+                  if events[i - 1].get("timestamp", now) < cutoff} if max_age > 0 else set()
+
+    slots: Dict[Text, Any] = {}
+    snapshot: Dict[Text, Any] = {}
+    loop, paused = None, False
+    cut = start
+    for i, event in enumerate(events[:max(candidates, default=-1) + 1]):
+        if i in candidates and loop is None and not paused:
+            cut, snapshot = i, dict(slots)
+        kind = event.get("event")
+        if kind == "slot":
+            slots[event["name"]] = event.get("value")
+        elif kind == "reset_slots":
+            slots.clear()
+        elif kind in RESETS:
+            slots.clear()
+            loop, paused = None, False
+        elif kind in ("active_loop", "form"):
+            loop = event.get("name")
+        elif kind == "pause":
+            paused = True
+        elif kind == "resume":
+            paused = False
+    if cut == start:
+        return events[start:], start
+
+    timestamp = events[cut - 1].get("timestamp")
+    restored = [{"event": "slot", "timestamp": timestamp, "name": name, "value": value}
+                for name, value in snapshot.items()]
+    return restored + events[cut:], cut
@@ -0,0 +1,136 @@
+"""Append-only columnar storage of tracker events for analytics.
+
+Every event becomes one row of a few typed columns (see `COLUMNS`); message
+texts, entities and slot values are not kept. Rows are buffered and
+written as numbered segments, one `.npz` file of column arrays each, that
+are never modified afterwards. Reading loads only the columns asked for.
+Works on event dicts as produced by `Event.as_dict()`, so it can be used
+and measured without Rasa installed.
+"""
+import glob
+import itertools
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Text
+
+import numpy as np
+
+COLUMNS = {
+    "sender_id": str,
+    "event": str,
+    "timestamp": np.float64,
+    # Intent of user events, action of action events, response of bot events,
+    # slot of slot events, form of active_loop events.
+    "name": str,
+    # Intent or action confidence; NaN for other events.
+    "confidence": np.float32,
+    "policy": str,
+    "fallback": bool,
+}
+
+FALLBACK_INTENTS = {"nlu_fallback"}
+FALLBACK_ACTIONS = {"action_default_fallback", "action_two_stage_fallback"}
+# What `actions.backend.backend_fallback` answers while the DB API is unavailable.
+FALLBACK_TEXTS = {"Sorry, I can't reach our booking system right now. Please try again in a moment."}
+
+
+def to_row(event: Dict[Text, Any]) -> Dict[Text, Any]:
+    kind = event.get("event") or ""
+    name, confidence, policy = "", float("nan"), ""
+    if kind == "user":
+        intent = (event.get("parse_data") or {}).get("intent") or {}
+        name, confidence = intent.get("name") or "", intent.get("confidence")
+    elif kind == "action":
+        name, confidence, policy = event.get("name") or "", event.get("confidence"), event.get("policy") or ""
+    elif kind == "bot":
+        name = (event.get("metadata") or {}).get("utter_action") or ""
+    elif kind in ("slot", "active_loop"):
+        name = event.get("name") or ""
+    fallback = (kind == "user" and name in FALLBACK_INTENTS) or (kind == "action" and name in FALLBACK_ACTIONS) \
+        or (kind == "bot" and event.get("text") in FALLBACK_TEXTS)
+    return {
+        "sender_id": event.get("sender_id") or "",
+        "event": kind,
+        "timestamp": event.get("timestamp") or time.time(),
+        "name": name,
+        "confidence": float("nan") if confidence is None else confidence,
+        "policy": policy,
+        "fallback": fallback,
+    }
+
+
+class ColumnarEventLog:
+    """Buffers event rows and appends them to `directory` as segment files.
+
+    A segment is written once `segment_rows` rows are buffered, or on
+    `flush()`. Segments are written to a temporary file and renamed, so
+    readers never see a partial one; the process id in their names lets
+    several Rasa processes append to the same directory. `take()` and
+    `write()` split a flush so the file can be written on another thread.
+    """
+
+    def __init__(self, directory: Text, segment_rows: int = 5000) -> None:
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self._buffer: Dict[Text, List[Any]] = {column: [] for column in COLUMNS}
+        self._segments = itertools.count(1)
+        os.makedirs(directory, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._buffer["event"])
+
+    def buffer(self, event: Dict[Text, Any]) -> None:
+        """Add the event's row to the buffer without writing anything."""
+        for column, value in to_row(event).items():
+            self._buffer[column].append(value)
+
+    def append(self, event: Dict[Text, Any]) -> None:
+        self.buffer(event)
+        if len(self) >= self.segment_rows:
+            self.flush()
+
+    def take(self) -> Optional[Dict[Text, np.ndarray]]:
+        """The buffered rows as column arrays, emptying the buffer; None if there are none."""
+        if not len(self):
+            return None
+        arrays = {column: np.asarray(values, dtype=COLUMNS[column]) for column, values in self._buffer.items()}
+        self._buffer = {column: [] for column in COLUMNS}
+        return arrays
+
+    def write(self, arrays: Dict[Text, np.ndarray]) -> Text:
+        """Write column arrays from `take()` as a new segment; returns its path."""
+        path = os.path.join(self.directory,
+                            f"events-{int(time.time() * 1000):013d}-{os.getpid()}-{next(self._segments):06d}.npz")
+        partial = path + ".partial"
+        with open(partial, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(partial, path)
+        return path
+
+    def flush(self) -> Optional[Text]:
+        """Write the buffered rows as a new segment; returns its path."""
+        arrays = self.take()
+        return self.write(arrays) if arrays is not None else None
+
+
+def segments(directory: Text) -> List[Text]:
+    return sorted(glob.glob(os.path.join(directory, "events-*.npz")))
+
+
+def load(directory: Text, columns: Sequence[Text] = tuple(COLUMNS), since: Optional[float] = None) -> Dict[Text, np.ndarray]:
+    """The given columns of every segment in `directory`, concatenated.
+
+    With `since`, only rows with a later timestamp are returned.
+    """
+    needed = list(columns) + (["timestamp"] if since is not None and "timestamp" not in columns else [])
+    parts: Dict[Text, List[np.ndarray]] = {column: [] for column in needed}
+    for path in segments(directory):
+        with np.load(path) as segment:
+            for column in needed:
+                parts[column].append(segment[column])
+    data = {column: np.concatenate(arrays) if arrays else np.asarray([], dtype=COLUMNS[column])
+            for column, arrays in parts.items()}
+    if since is not None:
+        keep = data["timestamp"] > since
+        data = {column: values[keep] for column, values in data.items()}
+    return {column: data[column] for column in columns}
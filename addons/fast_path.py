@@ -0,0 +1,116 @@
+"""Messages that can skip the NLU pipeline.
+
+Rasa parses a message of the form `/intent{"entity": "value"}`, which is what
+buttons send, without running the NLU pipeline. `FastPath` rewrites a message
+that is nothing but a value of one of the lookup tables in the NLU training
+data (a destination or a country, or a synonym of one) into that form, so
+it skips the pipeline too. While a form asks for a slot that is not filled
+from that entity, e.g. a username, the message is left to the pipeline.
+"""
+import logging
+from typing import Any, Dict, Optional, Text, Tuple
+
+import yaml
+
+from actions.matching import INTENT_MESSAGE_PREFIX, NLU_DATA_PATH, intent_payload, match_key
+
+logger = logging.getLogger(__name__)
+
+# Intent given to a message that is only a value of the lookup table.
+LOOKUP_INTENTS = {"destination": "inform", "country": "ask_for_package_by_country"}
+# Longer messages are never a bare lookup value.
+MAX_LENGTH = 40
+
+
+def form_slot_entities(domain: Optional[Dict[Text, Any]]) -> Dict[Text, Text]:
+    """Entity each form slot is filled from, e.g. target_destination -> destination."""
+    mapping = {}
+    for form in ((domain or {}).get("forms") or {}).values():
+        for slot, extractors in ((form or {}).get("required_slots") or {}).items():
+            for extractor in extractors or []:
+                if extractor.get("type") == "from_entity":
+                    mapping.setdefault(slot, extractor.get("entity"))
+    return mapping
+
+
+class FastPath:
+    """Rewrites bare lookup values into intent payloads.
+
+    `values` maps the `match_key` of a value or synonym to its entity and
+    canonical value. Values listed for more than one entity are left to the
+    NLU pipeline. `slot_entities` maps form slots to the entity they are
+    filled from.
+    """
+
+    def __init__(
+        self,
+        values: Dict[Text, Tuple[Text, Text]],
+        intents: Dict[Text, Text] = LOOKUP_INTENTS,
+        slot_entities: Optional[Dict[Text, Text]] = None,
+    ) -> None:
+        self.values = values
+        self.intents = intents
+        self.slot_entities = slot_entities or {}
+
+    @classmethod
+    def from_nlu_data(
+        cls,
+        path: Text = NLU_DATA_PATH,
+        intents: Dict[Text, Text] = LOOKUP_INTENTS,
+        domain: Optional[Dict[Text, Any]] = None,
+    ) -> "FastPath":
+        slot_entities = form_slot_entities(domain)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) or {}
+        except (OSError, yaml.YAMLError) as e:
+            logger.warning(f"Could not read lookup tables from {path}, fast path disabled: {e}")
+            return cls({}, intents, slot_entities)
+
+        def examples(item) -> list:
+            return [line.strip().lstrip("-").strip() for line in item.get("examples", "").splitlines()
+                    if line.strip()]
+
+        values: Dict[Text, Tuple[Text, Text]] = {}
+        ambiguous = set()
+
+        def add(key: Text, entity: Text, value: Text) -> None:
+            if key in values and values[key][0] != entity:
+                ambiguous.add(key)
+            values.setdefault(key, (entity, value))
+
+        items = data.get("nlu", [])
+        for item in items:
+            if item.get("lookup") in intents:
+                for value in examples(item):
+                    add(match_key(value), item["lookup"], value)
+        for item in items:
+            canonical = values.get(match_key(item.get("synonym", "")))
+            if canonical is not None:
+                for alias in examples(item):
+                    add(match_key(alias), *canonical)
+        for key in ambiguous:
+            del values[key]
+        return cls(values, intents, slot_entities)
+
+    def match(self, text: Optional[Text]) -> Optional[Tuple[Text, Text]]:
+        """(entity, canonical value) if `text` is nothing but a lookup value."""
+        if not text or len(text) > MAX_LENGTH or text.startswith(INTENT_MESSAGE_PREFIX):
+            return None
+        return self.values.get(match_key(text))
+
+    def rewrite(
+        self, text: Optional[Text], active_loop: Optional[Text] = None, requested_slot: Optional[Text] = None
+    ) -> Optional[Text]:
+        """The intent payload for `text`, or None if it needs the NLU pipeline.
+
+        While a form (`active_loop`) is running, only a value of the entity
+        its `requested_slot` is filled from is rewritten.
+        """
+        hit = self.match(text)
+        if hit is None:
+            return None
+        entity, value = hit
+        if active_loop and self.slot_entities.get(requested_slot) != entity:
+            return None
+        return intent_payload(self.intents[entity], **{entity: value})
@@ -0,0 +1,87 @@
+import logging
+import time
+from typing import Any, Dict, Optional, Text, Union
+
+from rasa.core.brokers.broker import EventBroker
+from rasa.core.tracker_store import RedisTrackerStore
+from rasa.shared.core.domain import Domain
+from rasa.shared.core.trackers import DialogueStateTracker
+
+from addons import event_codec
+
+logger = logging.getLogger(__name__)
+
+
+class CompactRedisTrackerStore(RedisTrackerStore):
+    """Redis tracker store that keeps stored trackers small.
+
+    Takes the options of Rasa's `redis` tracker store, plus `keep_turns`,
+    `ranking_length` and `compression_level`. Trackers are saved with
+    `event_codec.encode` after dropping earlier sessions and, in long
+    sessions, turns older than the domain's `session_expiration_time` (see
+    `event_codec.truncate`); user messages keep only their top
+    `ranking_length` intents. Trackers the stock Redis store saved are still
+    read.
+    """
+
+    def __init__(
+        self,
+        domain: Domain,
+        host: Text = "localhost",
+        port: int = 6379,
+        db: int = 0,
+        password: Optional[Text] = None,
+        event_broker: Optional[EventBroker] = None,
+        record_exp: Optional[float] = None,
+        key_prefix: Optional[Text] = None,
+        use_ssl: bool = False,
+        keep_turns: int = 10,
+        ranking_length: Optional[int] = 3,
+        compression_level: int = 1,
+        **kwargs: Dict[Text, Any],
+    ) -> None:
+        super().__init__(domain, host=host, port=port, db=db, password=password, event_broker=event_broker,
+                         record_exp=record_exp, key_prefix=key_prefix, use_ssl=use_ssl, **kwargs)
+        self.keep_turns = int(keep_turns)
+        self.ranking_length = None if ranking_length is None else int(ranking_length)
+        self.compression_level = int(compression_level)
+
+    @property
+    def max_age(self) -> float:
+        if self.domain is None:
+            return 0
+        return self.domain.session_config.session_expiration_time * 60
+
+    def save(self, tracker: DialogueStateTracker, timeout: Optional[float] = None) -> None:
+        if self.event_broker:
+            self.stream_events(tracker)
+        if not timeout and self.record_exp:
+            timeout = self.record_exp
+        self.red.set(self.key_prefix + tracker.sender_id, self.serialise_tracker(tracker), ex=timeout)
+
+    def serialise_tracker(self, tracker: DialogueStateTracker) -> bytes:
+        events = [event_codec.trim_parse_data(e.as_dict(), self.ranking_length) for e in tracker.events]
+        events, dropped = event_codec.truncate(events, self.max_age, self.keep_turns, time.time())
+        if dropped:
+            logger.debug(f"Dropped {dropped} old events from the tracker of '{tracker.sender_id}'")
+        return event_codec.encode(events, self.compression_level)
+
+    def deserialise_tracker(
+        self, sender_id: Text, serialised_tracker: Union[Text, bytes]
+    ) -> Optional[DialogueStateTracker]:
+        if isinstance(serialised_tracker, str):
+            serialised_tracker = serialised_tracker.encode("utf-8")
+        return DialogueStateTracker.from_dict(
+            sender_id,
+            event_codec.decode(serialised_tracker),
+            self.domain.slots if self.domain else None,
+            max_event_history=self.max_event_history,
+        )
+
+    def number_of_existing_events(self, sender_id: Text) -> int:
+        # Read from the stored header instead of loading the whole tracker.
+        header = self.red.getrange(self.key_prefix + sender_id, 0, 31)
+        if not header:
+            return 0
+        count = event_codec.stored_count(header)
+        return count if count is not None else super().number_of_existing_events(sender_id)
@@ -0,0 +1,102 @@
+"""Ingest rate, size on disk and report time of the columnar analytics event log.
+
+Publishes synthetic booking conversations, shaped like Rasa 2.8's events,
+through the event log the analytics event broker uses, then computes the
+`tools.analytics` report over them. The per-action timing is also computed
+with a plain Python loop over the event dicts for comparison:
+
+    python -m benchmarks.bench_analytics --conversations 20000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List, Text
+
+from addons.event_columns import ColumnarEventLog, load, segments
+from benchmarks.bench_tracker_store import action_event, load_domain, user_event
+from tools import analytics
+
+BOOKING = [("book_package", ["action_login_or_register"]), ("login", ["login_form"]),
+           ("affirm", ["utter_confirm_book_package"]), ("affirm", ["action_create_user_order"])]
+
+
+def conversation(rng: random.Random, intents: List[Text], sender_id: Text, ts: float) -> List[Dict[Text, Any]]:
+    events = [action_event("action_session_start", ts), {"event": "session_started", "timestamp": ts},
+              action_event("action_listen", ts)]
+    for intent, actions in BOOKING[:rng.randint(1, len(BOOKING))]:
+        ts += rng.uniform(5, 30)
+        user = user_event(rng, intents, ts)
+        user["parse_data"]["intent"] = {"name": intent, "confidence": 0.9}
+        events.append(user)
+        for action in actions:
+            ts += rng.expovariate(1 / (0.4 if action.startswith("action_") else 0.05))
+            events.append(action_event(action, ts))
+        events.append(action_event("action_listen", ts + 0.01))
+    for event in events:
+        event["sender_id"] = sender_id
+    return events
+
+
+def python_action_timings(events: List[Dict[Text, Any]]) -> Dict[Text, float]:
+    """Mean seconds per action, the way one would without the columnar log."""
+    totals: Dict[Text, List[float]] = {}
+    previous: Dict[Text, float] = {}
+    for event in sorted(events, key=lambda e: (e["sender_id"], e["timestamp"])):
+        if event["event"] not in ("user", "action"):
+            continue
+        sender = event["sender_id"]
+        if event["event"] == "action" and event["name"] != "action_listen" and sender in previous:
+            totals.setdefault(event["name"], []).append(event["timestamp"] - previous[sender])
+        previous[sender] = event["timestamp"]
+    return {name: sum(values) / len(values) for name, values in totals.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=20000)
+    parser.add_argument("--segment-rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    intents = load_domain()["intents"]
+    events = [event for i in range(args.conversations)
+              for event in conversation(rng, intents, f"user{i}", 1_600_000_000.0 + i * 7)]
+    directory = tempfile.mkdtemp(prefix="trippy-analytics-")
+    try:
+        log = ColumnarEventLog(directory, args.segment_rows)
+        start = time.perf_counter()
+        for event in events:
+            log.append(event)
+        log.flush()
+        ingest = time.perf_counter() - start
+        stored = sum(os.path.getsize(path) for path in segments(directory))
+        as_json = sum(len(json.dumps(event)) + 1 for event in events)
+        print(f"{len(events)} events: {len(events) / ingest:9.0f} events/s ingested, "
+              f"{stored / 2 ** 20:6.1f} MB on disk ({as_json / 2 ** 20:.1f} MB as JSON lines)")
+
+        start = time.perf_counter()
+        data = analytics.sort_events(load(directory))
+        loaded = time.perf_counter() - start
+        for label, report in (("action timings", analytics.action_timings),
+                              ("intent timings", analytics.intent_timings),
+                              ("booking funnel", lambda d: analytics.funnel(d, analytics.BOOKING_FUNNEL)),
+                              ("fallback rates", analytics.fallback_rates)):
+            start = time.perf_counter()
+            report(data)
+            print(f"{label:>16}: {(time.perf_counter() - start) * 1e3:8.1f} ms")
+        print(f"{'load and sort':>16}: {loaded * 1e3:8.1f} ms")
+        start = time.perf_counter()
+        python_action_timings(events)
+        print(f"{'python loop':>16}: {(time.perf_counter() - start) * 1e3:8.1f} ms for the action timings")
+        for step, reached, median in analytics.funnel(data, analytics.BOOKING_FUNNEL):
+            print(f"  {step:<40} {reached:7d}  median {median or 0:6.1f} s")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
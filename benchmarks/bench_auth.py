@@ -0,0 +1,88 @@
+"""Action-server latency of the turn that completes a login, per `last_intent`.
+
+Runs LoginUser against a local DB API stub and, when the post-auth route
+forwards to another custom action, that action too, as Rasa would within the
+same turn. Also compares the routing table lookup with the if/elif ladder it
+replaced:
+
+    python -m benchmarks.bench_auth --rounds 200 --latency 0.02
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from typing import Optional, Text
+
+from rasa_sdk import Tracker
+from rasa_sdk.executor import CollectingDispatcher
+
+from actions.actions import LoginUser, QueryUserOrders
+from actions.backend import backend
+from actions.routing import POST_AUTH_ROUTES, post_auth_router
+from benchmarks.stub_db_api import start_stub
+
+CUSTOM_FOLLOWUPS = {"action_query_user_orders": QueryUserOrders()}
+
+
+def ladder_followup(last_intent: Optional[Text], destination: Optional[Text]) -> Optional[Text]:
+    if last_intent == "book_package":
+        return "utter_confirm_book_package" if destination else "utter_ask_where"
+    elif last_intent == "guide_unavailable_or_delayed":
+        return "utter_offer_change_guide"
+    elif last_intent == "flight_delays_or_cancellation":
+        return "utter_offer_next_available_or_cancel"
+    elif last_intent == "hotel_unavailable":
+        return "utter_ask_if_want_new_room"
+    elif last_intent == "ask_user_orders":
+        return "action_query_user_orders"
+    elif last_intent == "inform":
+        return "utter_confirm_book_package" if destination else None
+    return None
+
+
+def lookup_cost(lookup, calls: int) -> float:
+    keys = [(intent, destination) for intent in list(POST_AUTH_ROUTES) + ["greet"] for destination in ("Kobe", None)]
+    start = time.perf_counter()
+    for _ in range(calls // len(keys)):
+        for intent, destination in keys:
+            lookup(intent, destination)
+    return (time.perf_counter() - start) / (calls // len(keys) * len(keys))
+
+
+async def authenticated_turn(last_intent: Text) -> float:
+    slots = {"username": "alice", "password": "secret", "last_intent": last_intent, "destination": None}
+    tracker = Tracker(f"bench-{uuid.uuid4().hex}", slots, {}, [], False, None, {}, "")
+    start = time.perf_counter()
+    events = await LoginUser().run(CollectingDispatcher(), tracker, {})
+    followup = next((e["name"] for e in events if e["event"] == "followup"), None)
+    if followup in CUSTOM_FOLLOWUPS:
+        await CUSTOM_FOLLOWUPS[followup].run(CollectingDispatcher(), tracker, {})
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="stub latency per call in seconds")
+    args = parser.parse_args()
+
+    stub, runner, base_url = await start_stub(args.latency, open_accounts=True)
+    backend.base_url = base_url
+    try:
+        print(f"{args.latency * 1000:.0f} ms stub latency, {args.rounds} logins per intent")
+        for intent in POST_AUTH_ROUTES:
+            samples = sorted([await authenticated_turn(intent) for _ in range(args.rounds)])
+            followup = post_auth_router.followup(intent) or "(policies)"
+            print(f"{intent:>32} -> {followup:<38} p50 {samples[len(samples) // 2] * 1e3:6.1f} ms"
+                  f"  p99 {samples[int(len(samples) * 0.99)] * 1e3:6.1f} ms")
+    finally:
+        await backend.close()
+        await runner.cleanup()
+
+    calls = 1_000_000
+    print(f"if/elif ladder lookup: {lookup_cost(ladder_followup, calls) * 1e9:6.0f} ns")
+    print(f"routing table lookup:  {lookup_cost(post_auth_router.followup, calls) * 1e9:6.0f} ns")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
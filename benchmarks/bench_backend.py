@@ -0,0 +1,72 @@
+"""Concurrent-conversation throughput against a local DB API stub.
+
+Compares the old pattern (blocking `requests` calls made from inside
+`async def run`) with the shared pooled client in `actions.backend`:
+
+    python -m benchmarks.bench_backend --conversations 200 --latency 0.02
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Text, Tuple
+
+import requests
+
+from actions.backend import BackendClient
+from benchmarks.stub_db_api import StubThread
+
+# The backend calls one booking conversation makes, in order.
+CONVERSATION: List[Tuple[Text, Text, Dict[Text, Any]]] = [
+    ("GET", "/info/company", {}),
+    ("GET", "/package/popular", {"params": {"batch": 4, "showed_package_ids": []}}),
+    ("GET", "/package/country", {"params": {"country": "Japan"}}),
+    ("POST", "/user/login", {"json": {"username": "alice", "password": "secret"}}),
+    ("GET", "/package/destination", {"params": {"destination": "Kobe"}}),
+    ("GET", "/user/orders", {"params": {"username": "alice"}}),
+]
+
+
+async def blocking_conversation(base_url: Text) -> None:
+    for method, route, kwargs in CONVERSATION:
+        requests.request(method, f"{base_url}{route}", **kwargs).json()
+
+
+async def pooled_conversation(client: BackendClient) -> None:
+    for method, route, kwargs in CONVERSATION:
+        (await client.request(method, route, **kwargs)).json()
+
+
+async def drive(conversation: Callable, conversations: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(conversation() for _ in range(conversations)))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02, help="stub latency per call in seconds")
+    args = parser.parse_args()
+
+    with StubThread(args.latency) as stub:
+        client = BackendClient(stub.base_url)
+
+        async def run_pooled() -> float:
+            elapsed = await drive(lambda: pooled_conversation(client), args.conversations)
+            await client.close()
+            return elapsed
+
+        results = {
+            "blocking requests": asyncio.run(
+                drive(lambda: blocking_conversation(stub.base_url), args.conversations)),
+            "pooled async client": asyncio.run(run_pooled()),
+        }
+
+    calls = args.conversations * len(CONVERSATION)
+    print(f"{args.conversations} conversations, {calls} backend calls, {args.latency * 1000:.0f} ms stub latency")
+    for label, elapsed in results.items():
+        print(f"{label:>20}: {elapsed:7.3f} s  {args.conversations / elapsed:8.1f} conv/s  {calls / elapsed:8.1f} calls/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Latency of catalog reads with and without the TTL/LRU cache.
+
+    python -m benchmarks.bench_cache --lookups 2000 --latency 0.005
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from actions.backend import BackendClient
+from actions.cache import TTLCache
+from benchmarks.stub_db_api import PACKAGE_DESTINATIONS, start_stub
+
+ROUTES = [("/info/company", None), ("/info/contact", None)] + [
+    ("/package/country", {"country": country}) for country in PACKAGE_DESTINATIONS
+] + [
+    ("/package/destination", {"destination": d}) for ds in PACKAGE_DESTINATIONS.values() for d in ds
+]
+
+
+async def measure(fetch, lookups: int, seed: int = 0):
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(lookups):
+        route, params = rng.choice(ROUTES)
+        start = time.perf_counter()
+        await fetch(route, params)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def report(label: str, samples) -> None:
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2] * 1e6
+    p99 = samples[int(len(samples) * 0.99)] * 1e6
+    print(f"{label:>9}: mean {statistics.mean(samples) * 1e6:9.1f} us  p50 {p50:9.1f} us  p99 {p99:9.1f} us")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.005, help="stub latency per call in seconds")
+    args = parser.parse_args()
+
+    _, runner, base_url = await start_stub(args.latency)
+    client = BackendClient(base_url, cache=TTLCache())
+    try:
+        report("uncached", await measure(client.get, args.lookups))
+        report("cached", await measure(client.get_cached, args.lookups))
+        print("cache stats:", client.cache.stats())
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""Cost and size of the package messages of one popular-packages turn.
+
+Compares building the messages field by field on every turn, as before,
+with the cached cards, sent one message per package or as one carousel:
+
+    python -m benchmarks.bench_cards --turns 20000
+"""
+import argparse
+import json
+import time
+from typing import Callable, Dict, List, Text
+
+from rasa_sdk.executor import CollectingDispatcher
+
+from actions import actions
+from actions.catalog import catalog
+from benchmarks.stub_db_api import make_packages
+
+PAGE_SIZE = 4
+
+
+def field_by_field(dispatcher: CollectingDispatcher, packages: List[Dict]) -> None:
+    for i, package in enumerate(packages, 1):
+        dispatcher.utter_message(
+            text=f"#{i} {package['title']} | Country: {package['country']} | Destination: {package['destination']}",
+            image=package['pic_url'])
+        dispatcher.utter_message(f"Description: {package['description']}")
+        dispatcher.utter_message(f"The trip is {package['duration']} days long and the price is ${package['price']}")
+    dispatcher.utter_message("You can book a package by telling me the package destination.")
+
+
+def cached(carousel: bool) -> Callable[[CollectingDispatcher, List[Dict]], None]:
+    def utter(dispatcher: CollectingDispatcher, packages: List[Dict]) -> None:
+        actions.PACKAGE_CAROUSEL = carousel
+        actions.utter_packages(dispatcher, packages)
+    return utter
+
+
+def measure(utter, pages: List[List[Dict]], turns: int) -> Dict[Text, float]:
+    start = time.perf_counter()
+    size = messages = 0
+    for turn in range(turns):
+        dispatcher = CollectingDispatcher()
+        utter(dispatcher, pages[turn % len(pages)])
+        body = json.dumps({"events": [], "responses": dispatcher.messages})
+        size += len(body)
+        messages += len(dispatcher.messages)
+    elapsed = time.perf_counter() - start
+    return {"us": elapsed / turns * 1e6, "bytes": size / turns, "messages": messages / turns}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20000)
+    args = parser.parse_args()
+
+    packages = make_packages()
+    catalog.load(packages)
+    pages = [catalog.popular_page(offset, PAGE_SIZE) for offset in range(0, len(packages), PAGE_SIZE)]
+    for label, utter in (("field by field", field_by_field), ("cached cards", cached(False)),
+                         ("carousel", cached(True))):
+        result = measure(utter, pages, args.turns)
+        print(f"{label:>15}: {result['us']:6.1f} us per turn (render + JSON), {result['messages']:4.1f} messages, "
+              f"{result['bytes']:6.0f} response bytes")
+
+
+if __name__ == "__main__":
+    main()
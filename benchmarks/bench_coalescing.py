@@ -0,0 +1,68 @@
+"""DB API calls and latency of bursts of identical reads, with and without coalescing.
+
+Every burst sends `--burst` concurrent GETs, spread over a few popular
+reads (popular packages, a country listing, hotel and flight availability
+for a destination), as many users asking for the same thing at once would:
+
+    python -m benchmarks.bench_coalescing --bursts 50 --burst 100 --latency 0.02
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+from actions.backend import BackendClient
+from benchmarks.stub_db_api import start_stub
+
+READS: List[Tuple[Text, Optional[Dict[Text, Any]]]] = [
+    ("/package/popular", {"batch": 4}),
+    ("/package/country", {"country": "Japan"}),
+    ("/hotel/available", {"destination": "Madrid", "undesired_hotel_ids": []}),
+    ("/flight/available", {"undesired_flight_ids": [1]}),
+]
+
+
+async def run(client: BackendClient, stub, bursts: int, burst: int, seed: int = 0) -> Tuple[int, List[float]]:
+    rng = random.Random(seed)
+    samples: List[float] = []
+
+    async def read(route: Text, params: Optional[Dict[Text, Any]]) -> None:
+        start = time.perf_counter()
+        await client.get(route, params)
+        samples.append(time.perf_counter() - start)
+
+    requests = stub.request_count
+    for _ in range(bursts):
+        await asyncio.gather(*(read(*rng.choice(READS)) for _ in range(burst)))
+    return stub.request_count - requests, samples
+
+
+def percentile(samples: List[float], q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))] if samples else 0.0
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bursts", type=int, default=50)
+    parser.add_argument("--burst", type=int, default=100, help="concurrent reads per burst")
+    parser.add_argument("--latency", type=float, default=0.02, help="stub latency per call in seconds")
+    args = parser.parse_args()
+
+    stub, runner, base_url = await start_stub(args.latency)
+    try:
+        for coalesce in (False, True):
+            client = BackendClient(base_url, coalesce=coalesce)
+            try:
+                calls, samples = await run(client, stub, args.bursts, args.burst)
+            finally:
+                await client.close()
+            print(f"{'coalesced' if coalesce else 'separate':>9}: {calls:6d} DB API calls for {len(samples)} reads  "
+                  f"p50 {percentile(samples, 0.5) * 1e3:7.1f} ms  p95 {percentile(samples, 0.95) * 1e3:7.1f} ms")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
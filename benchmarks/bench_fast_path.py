@@ -0,0 +1,84 @@
+"""Share of user messages that skip the NLU pipeline, and what the fast path costs.
+
+Counts the messages Rasa parses without the NLU pipeline: intent payloads
+from buttons and bare destinations or countries rewritten by the fast path.
+The messages are the NLU training examples, or the lines of `--messages`,
+e.g. user texts exported from the tracker store. Also checks that the
+destination buttons now send payloads Rasa can read entities from:
+
+    python -m benchmarks.bench_fast_path --messages user_messages.txt
+"""
+import argparse
+import json
+import re
+import time
+from typing import List, Optional, Text
+
+import yaml
+
+from actions.matching import NLU_DATA_PATH, INTENT_MESSAGE_PREFIX, intent_payload
+from addons.fast_path import FastPath
+
+# How Rasa's RegexInterpreter splits `/intent{...}` payloads.
+PAYLOAD = re.compile(r"^/([^{@]+)(@[0-9.]+)?([{].+)?")
+ANNOTATION = re.compile(r"\[([^\]]+)\]\([^)]+\)|\[([^\]]+)\]\{[^}]+\}")
+
+
+def training_messages(path: Text = NLU_DATA_PATH) -> List[Text]:
+    with open(path, encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    messages = []
+    for item in data["nlu"]:
+        if "intent" in item:
+            for line in item["examples"].splitlines():
+                line = line.strip().lstrip("-").strip()
+                if line:
+                    messages.append(ANNOTATION.sub(lambda m: m.group(1) or m.group(2), line))
+    return messages
+
+
+def payload_entities(payload: Text) -> Optional[dict]:
+    match = PAYLOAD.match(payload)
+    if not match or not match.group(3):
+        return None
+    try:
+        return json.loads(match.group(3))
+    except ValueError:
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", help="file with one user message per line")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.messages:
+        with open(args.messages, encoding="utf-8") as f:
+            messages = [line.strip() for line in f if line.strip()]
+    else:
+        messages = training_messages()
+    fast_path = FastPath.from_nlu_data()
+
+    payloads = sum(m.startswith(INTENT_MESSAGE_PREFIX) for m in messages)
+    rewritten = sum(fast_path.rewrite(m) is not None for m in messages)
+    print(f"{len(messages)} messages: {payloads} intent payloads ({payloads / len(messages):.1%}), "
+          f"{rewritten} rewritten by the fast path ({rewritten / len(messages):.1%}), "
+          f"{(payloads + rewritten) / len(messages):.1%} skip the NLU pipeline")
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for message in messages:
+            fast_path.rewrite(message)
+    per_message = (time.perf_counter() - start) / (args.rounds * len(messages))
+    print(f"fast path check: {per_message * 1e6:.2f} us per message")
+
+    destinations = sorted({value for entity, value in fast_path.values.values() if entity == "destination"})
+    old = sum(payload_entities(f"/inform{{destination: {d}}}") is not None for d in destinations)
+    new = sum(payload_entities(intent_payload("inform", destination=d)) is not None for d in destinations)
+    print(f"destination buttons with readable entities: {old}/{len(destinations)} before, "
+          f"{new}/{len(destinations)} now")
+
+
+if __name__ == "__main__":
+    main()
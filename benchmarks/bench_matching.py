@@ -0,0 +1,71 @@
+"""Accuracy and lookup latency of destination/country matching over a misspelling corpus.
+
+    python -m benchmarks.bench_matching --variants 20
+"""
+import argparse
+import random
+import string
+import time
+from typing import List, Text, Tuple
+
+from actions.catalog import SEED_COUNTRIES, SEED_DESTINATIONS
+from actions.matching import FuzzyMatcher, load_synonyms
+
+
+def misspell(name: Text, rng: random.Random) -> Text:
+    chars = list(name)
+    i = rng.randrange(1, len(chars) - 1)
+    edit = rng.choice(["delete", "insert", "substitute", "transpose", "case"])
+    if edit == "delete":
+        del chars[i]
+    elif edit == "insert":
+        chars.insert(i, rng.choice(string.ascii_lowercase))
+    elif edit == "substitute":
+        chars[i] = rng.choice(string.ascii_lowercase)
+    elif edit == "transpose":
+        chars[i - 1], chars[i] = chars[i], chars[i - 1]
+    else:
+        return name.swapcase()
+    return "".join(chars)
+
+
+def corpus(names: List[Text], variants: int, seed: int) -> List[Tuple[Text, Text]]:
+    rng = random.Random(seed)
+    return [(misspell(name, rng), name) for name in names for _ in range(variants)]
+
+
+def evaluate(label: Text, matcher: FuzzyMatcher, cases: List[Tuple[Text, Text]]) -> None:
+    correct = wrong = 0
+    start = time.perf_counter()
+    for query, expected in cases:
+        resolved = matcher.resolve(query)
+        if resolved == expected:
+            correct += 1
+        elif resolved is not None:
+            wrong += 1
+    elapsed = time.perf_counter() - start
+    old_style = sum(query.title() in matcher.names for query, _ in cases)
+    print(f"{label:>12}: {len(cases)} queries, resolved {correct / len(cases):6.1%}, "
+          f"wrong {wrong / len(cases):5.1%}, old .title() check {old_style / len(cases):6.1%}, "
+          f"{elapsed / len(cases) * 1e6:6.1f} us/lookup")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--variants", type=int, default=20, help="misspellings generated per name")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    aliases = load_synonyms()
+    for label, names in (("destinations", SEED_DESTINATIONS), ("countries", SEED_COUNTRIES)):
+        start = time.perf_counter()
+        matcher = FuzzyMatcher(names, aliases)
+        built = time.perf_counter() - start
+        print(f"{label:>12}: index built in {built * 1e3:.2f} ms")
+        evaluate(label, matcher, corpus(names, args.variants, args.seed))
+    alias_cases = [(alias, name) for alias, name in aliases.items() if name in SEED_DESTINATIONS]
+    evaluate("aliases", FuzzyMatcher(SEED_DESTINATIONS, aliases), alias_cases)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Per-call overhead of the action and backend instrumentation.
+
+    python -m benchmarks.bench_metrics --calls 200000
+"""
+import argparse
+import asyncio
+import time
+
+from actions.metrics import instrument, record_backend_call, registry
+
+
+class PlainAction:
+    def name(self) -> str:
+        return "action_bench"
+
+    async def run(self, dispatcher, tracker, domain):
+        return []
+
+
+@instrument
+class InstrumentedAction(PlainAction):
+    pass
+
+
+async def per_call(action, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        await action.run(None, None, {})
+    return (time.perf_counter() - start) / calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    plain = asyncio.run(per_call(PlainAction(), args.calls))
+    instrumented = asyncio.run(per_call(InstrumentedAction(), args.calls))
+    registry.trace_enabled = True
+    traced = asyncio.run(per_call(InstrumentedAction(), args.calls))
+    registry.trace_enabled = False
+
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        record_backend_call("GET", "/package/popular", 200, 0.01)
+    backend_call = (time.perf_counter() - start) / args.calls
+
+    print(f"bare action run:           {plain * 1e9:8.0f} ns")
+    print(f"instrumented action run:   {instrumented * 1e9:8.0f} ns  (+{(instrumented - plain) * 1e9:.0f} ns)")
+    print(f"with trace log enabled:    {traced * 1e9:8.0f} ns  (+{(traced - plain) * 1e9:.0f} ns)")
+    print(f"record_backend_call:       {backend_call * 1e9:8.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Latency, memory and accuracy of the Rasa model trained from each config.
+
+For every config a model is trained on 80% of data/nlu.yml plus the stories
+and rules, and `rasa test nlu` scores intents and entities on the held-out
+20%. Then, in a fresh process per model so they do not share memory, the
+model is loaded and every pipeline component is timed over the held-out
+messages, and every policy over the turns of tests/test_stories.yml
+(data/stories.yml while that file has no stories), which also gives the
+action accuracy. Needs Rasa installed; run from the repository root:
+
+    python -m benchmarks.bench_nlu --configs config.yml config-light.yml
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Text
+
+import yaml
+
+TEST_STORIES = "tests/test_stories.yml"
+TRAIN_STORIES = "data/stories.yml"
+
+
+def rasa(*args: Text) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "rasa", *args], check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(samples: List[float], q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))] if samples else 0.0
+
+
+def has_stories(path: Text) -> bool:
+    with open(path, encoding="utf-8") as f:
+        return bool((yaml.safe_load(f) or {}).get("stories"))
+
+
+def labelled(items: List[Any]) -> List[Text]:
+    return [f"{i}_{type(item).__name__}" for i, item in enumerate(items)]
+
+
+def size_on_disk(directory: Text, prefix: Text) -> float:
+    """MB of the files a component or policy persisted, e.g. `component_4_DIETClassifier.*`."""
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.relpath(path, directory).startswith(prefix):
+                total += os.path.getsize(path)
+    return total / 2 ** 20
+
+
+def profile(model: Text, texts: Text, stories: Text, rounds: int) -> Dict[Text, Any]:
+    """Runs in the child process; loads one model and times its components and policies."""
+    import rasa.core.training
+    import rasa.model
+    from rasa.core.agent import Agent
+    from rasa.nlu.model import Interpreter
+    from rasa.shared.core.events import ActionExecuted
+    from rasa.shared.nlu.interpreter import RegexInterpreter
+    from rasa.shared.nlu.training_data.loading import load_data
+    from rasa.shared.nlu.training_data.message import Message
+
+    rss_start = rss_mb()
+    start = time.perf_counter()
+    agent = Agent.load(model)
+    load_seconds = time.perf_counter() - start
+    core_dir, nlu_dir = rasa.model.get_model_subdirectories(rasa.model.get_model(model))
+
+    interpreter = agent.interpreter.interpreter
+    components = labelled(interpreter.pipeline)
+    component_times: Dict[Text, List[float]] = {label: [] for label in components}
+    parse_times = []
+    examples = [m.get("text") for m in load_data(texts).intent_examples]
+    for _ in range(rounds):
+        for text in examples:
+            data = Interpreter.default_output_attributes()
+            data["text"] = text
+            message = Message(data=data, time=int(time.time()))
+            parse_start = time.perf_counter()
+            for label, component in zip(components, interpreter.pipeline):
+                component_start = time.perf_counter()
+                component.process(message, **interpreter.context)
+                component_times[label].append(time.perf_counter() - component_start)
+            parse_times.append(time.perf_counter() - parse_start)
+
+    ensemble, domain = agent.policy_ensemble, agent.domain
+    policies = labelled(ensemble.policies)
+    policy_times: Dict[Text, List[float]] = {label: [] for label in policies}
+    predict_times = []
+    correct = total = 0
+    regex = RegexInterpreter()
+    trackers = asyncio.run(rasa.core.training.load_data(stories, domain, augmentation_factor=0))
+    for tracker in trackers:
+        expected = [e.action_name or e.action_text for e in tracker.applied_events() if isinstance(e, ActionExecuted)]
+        for prior, action in zip(tracker.generate_all_prior_trackers(), expected):
+            for label, policy in zip(policies, ensemble.policies):
+                policy_start = time.perf_counter()
+                policy.predict_action_probabilities(prior, domain, regex)
+                policy_times[label].append(time.perf_counter() - policy_start)
+            predict_start = time.perf_counter()
+            prediction = ensemble.probabilities_using_best_policy(prior, domain, regex)
+            predict_times.append(time.perf_counter() - predict_start)
+            probabilities = prediction.probabilities
+            best = max(range(len(probabilities)), key=probabilities.__getitem__)
+            correct += domain.action_names_or_texts[best] == action
+            total += 1
+
+    return {
+        "load_seconds": load_seconds,
+        "rss_mb": rss_mb() - rss_start,
+        "parse_ms": [percentile(parse_times, 0.5) * 1e3, percentile(parse_times, 0.95) * 1e3],
+        "components": {label: {"p50_ms": percentile(times, 0.5) * 1e3, "p95_ms": percentile(times, 0.95) * 1e3,
+                               "disk_mb": size_on_disk(nlu_dir, f"component_{label}")}
+                       for label, times in component_times.items()},
+        "predict_ms": [percentile(predict_times, 0.5) * 1e3, percentile(predict_times, 0.95) * 1e3],
+        "policies": {label: {"p50_ms": percentile(times, 0.5) * 1e3, "p95_ms": percentile(times, 0.95) * 1e3,
+                             "disk_mb": size_on_disk(core_dir, f"policy_{label}")}
+                     for label, times in policy_times.items()},
+        "action_accuracy": correct / total if total else None,
+        "turns": total,
+    }
+
+
+def read_report(path: Text, key: Text) -> Optional[float]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    if key == "accuracy":
+        return report.get("accuracy", report.get("micro avg", {}).get("f1-score"))
+    return report.get(key, {}).get("f1-score")
+
+
+def evaluate(config: Text, split: Text, out: Text, stories: Text, rounds: int) -> Dict[Text, Any]:
+    name = os.path.splitext(os.path.basename(config))[0]
+    model = os.path.join(out, f"{name}.tar.gz")
+    results = os.path.join(out, f"{name}-results")
+    train_seconds = rasa("train", "--config", config, "--domain", "domain.yml",
+                         "--data", os.path.join(split, "training_data.yml"), "data/stories.yml", "data/rules.yml",
+                         "--out", out, "--fixed-model-name", name)
+    rasa("test", "nlu", "--model", model, "--nlu", os.path.join(split, "test_data.yml"), "--out", results)
+    child = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_nlu", "--profile", model,
+         "--texts", os.path.join(split, "test_data.yml"), "--stories", stories, "--rounds", str(rounds)],
+        check=True, stdout=subprocess.PIPE, text=True,
+    )
+    result = json.loads(child.stdout.strip().splitlines()[-1])
+    result.update(
+        config=config,
+        train_seconds=train_seconds,
+        intent_accuracy=read_report(os.path.join(results, "intent_report.json"), "accuracy"),
+        entity_f1=read_report(os.path.join(results, "DIETClassifier_report.json"), "weighted avg"),
+    )
+    return result
+
+
+def report(result: Dict[Text, Any], stories: Text) -> None:
+    def fmt(value: Optional[float]) -> Text:
+        return "n/a" if value is None else f"{value:.3f}"
+
+    print(f"\n{result['config']}: trained in {result['train_seconds']:.0f} s, loaded in "
+          f"{result['load_seconds']:.1f} s, +{result['rss_mb']:.0f} MB RSS")
+    print(f"  parse p50 {result['parse_ms'][0]:.2f} ms  p95 {result['parse_ms'][1]:.2f} ms  "
+          f"intent accuracy {fmt(result['intent_accuracy'])}  entity F1 {fmt(result['entity_f1'])}")
+    for label, timing in result["components"].items():
+        print(f"    {label:<36} p50 {timing['p50_ms']:7.3f} ms  p95 {timing['p95_ms']:7.3f} ms  "
+              f"{timing['disk_mb']:6.1f} MB on disk")
+    print(f"  policy ensemble p50 {result['predict_ms'][0]:.2f} ms  p95 {result['predict_ms'][1]:.2f} ms  "
+          f"action accuracy on {stories} ({result['turns']} turns) {fmt(result['action_accuracy'])}")
+    for label, timing in result["policies"].items():
+        print(f"    {label:<36} p50 {timing['p50_ms']:7.3f} ms  p95 {timing['p95_ms']:7.3f} ms  "
+              f"{timing['disk_mb']:6.1f} MB on disk")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--configs", nargs="+", default=["config.yml", "config-light.yml"])
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the held-out messages")
+    parser.add_argument("--out", help="directory for models and reports (default: a temporary one)")
+    parser.add_argument("--profile", help=argparse.SUPPRESS)
+    parser.add_argument("--texts", help=argparse.SUPPRESS)
+    parser.add_argument("--stories", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(profile(args.profile, args.texts, args.stories, args.rounds)))
+        return
+
+    out = args.out or tempfile.mkdtemp(prefix="trippy-nlu-")
+    split = os.path.join(out, "split")
+    rasa("data", "split", "nlu", "--nlu", "data/nlu.yml", "--training-fraction", "0.8",
+         "--random-seed", "42", "--out", split)
+    stories = TEST_STORIES if has_stories(TEST_STORIES) else TRAIN_STORIES
+    for config in args.configs:
+        report(evaluate(config, split, out, stories, args.rounds), stories)
+    print(f"\nModels and reports are in {out}")
+
+
+if __name__ == "__main__":
+    main()
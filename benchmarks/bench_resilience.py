@@ -0,0 +1,80 @@
+"""Backend client behaviour against a fault-injecting DB API stub.
+
+Runs the same reads through a bare client (single attempt, no hedging, no
+circuit breaker) and the default resilient client under four faults:
+flaky 503s, a slow tail, an outage after the cache was warmed (the bare
+client reads uncached) and an outage with nothing to fall back on.
+
+    python -m benchmarks.bench_resilience --calls 200
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+from actions.backend import BackendClient, BackendError
+from actions.resilience import CircuitBreaker, RetryPolicy
+from benchmarks.stub_db_api import start_stub
+
+
+def bare_client(base_url: str) -> BackendClient:
+    return BackendClient(base_url, retry=RetryPolicy(attempts=1), hedge_delays={},
+                         breaker_factory=lambda: CircuitBreaker(failure_threshold=10 ** 9))
+
+
+async def drive(client: BackendClient, route: str, calls: int, concurrency: int = 10, cached: bool = False):
+    latencies: List[float] = []
+    ok = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    fetch = client.get_cached if cached else client.get
+
+    async def one() -> None:
+        nonlocal ok
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                r = await fetch(route, {"batch": 4} if route == "/package/popular" else None)
+                ok += r.status_code == 200
+            except BackendError:
+                pass
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(calls)))
+    latencies.sort()
+    return ok / calls, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def report(scenario: str, label: str, result) -> None:
+    success, p50, p99 = result
+    print(f"{scenario:>10} {label:>10}: success {success:6.1%}  p50 {p50 * 1e3:7.1f} ms  p99 {p99 * 1e3:7.1f} ms")
+
+
+async def scenario(name: str, calls: int, route: str, cached: bool = False, go_down: bool = False, **faults) -> None:
+    for label, make in (("bare", bare_client), ("resilient", BackendClient)):
+        stub, runner, base_url = await start_stub(0.005, **faults)
+        client = make(base_url)
+        try:
+            if go_down:
+                # Warm the cache, then let the entry expire so every read has to try the API.
+                client.cache_ttls[route] = (0.0, 0.0)
+                await client.get_cached(route)
+                stub.down = True
+            report(name, label, await drive(client, route, calls, cached=cached and label == "resilient"))
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    await scenario("flaky", args.calls, "/package/popular", error_rate=0.2)
+    await scenario("slow tail", args.calls, "/package/popular", slow_rate=0.05, slow_latency=1.0)
+    await scenario("cached", args.calls, "/info/company", cached=True, go_down=True)
+    await scenario("outage", args.calls, "/user/orders", down=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,156 @@
+"""Per-turn tracker load/save cost of the stock and the compact tracker format.
+
+Simulates conversations the way Rasa stores them: every turn the tracker is
+loaded, the turn's events are appended and it is saved again. The
+conversations span several sessions (`--sessions`, an hour apart, longer than
+the domain's session expiration) of `--turns` turns a minute apart, with
+events shaped like Rasa 2.8's. With `--redis redis://localhost:6379/15` the
+saves and loads also go through that Redis database:
+
+    python -m benchmarks.bench_tracker_store --sessions 3 --turns 40
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Text, Tuple
+
+import yaml
+
+from addons import event_codec
+
+SESSION_GAP = 3600.0
+TURN_GAP = 60.0
+
+
+def load_domain() -> Dict[Text, Any]:
+    with open("domain.yml", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+def user_event(rng: random.Random, intents: List[Text], ts: float) -> Dict[Text, Any]:
+    ranking = [{"id": rng.getrandbits(63), "name": name, "confidence": rng.random()}
+               for name in rng.sample(intents, 10)]
+    ranking.sort(key=lambda r: -r["confidence"])
+    text = " ".join(rng.choice(["I", "want", "to", "book", "a", "trip", "to", "Kobe", "please", "show"])
+                    for _ in range(rng.randint(3, 9)))
+    message_id = uuid.UUID(int=rng.getrandbits(128)).hex
+    return {
+        "event": "user", "timestamp": ts, "metadata": {}, "text": text,
+        "parse_data": {
+            "intent": ranking[0], "entities": [
+                {"entity": "destination", "start": 0, "end": 4, "confidence_entity": 0.99, "value": "Kobe",
+                 "extractor": "DIETClassifier", "processors": ["EntitySynonymMapper"]}
+            ] if rng.random() < 0.3 else [],
+            "text": text, "message_id": message_id, "metadata": {}, "intent_ranking": ranking,
+            "response_selector": {"all_retrieval_intents": [], "default": {
+                "response": {"id": None, "responses": None, "response_templates": None, "confidence": 0.0,
+                             "intent_response_key": None, "utter_action": "utter_None",
+                             "template_name": "utter_None"},
+                "ranking": []}},
+        },
+        "input_channel": "rest", "message_id": message_id,
+    }
+
+
+def action_event(name: Text, ts: float) -> Dict[Text, Any]:
+    return {"event": "action", "timestamp": ts, "metadata": {"model_id": "f3a1c0de"}, "name": name,
+            "policy": "policy_3_TEDPolicy", "confidence": 0.97, "action_text": None, "hide_rule_turn": False}
+
+
+def turn_events(rng: random.Random, domain: Dict[Text, Any], ts: float) -> List[Dict[Text, Any]]:
+    action = rng.choice(domain["actions"])
+    events = [
+        user_event(rng, domain["intents"], ts),
+        {"event": "user_featurization", "timestamp": ts, "use_text_for_featurization": False},
+        action_event(action, ts + 0.1),
+        {"event": "bot", "timestamp": ts + 0.1, "metadata": {"utter_action": action},
+         "text": "Here are the most popular packages right now: Kobe, Osaka, Kyoto and Nara.",
+         "data": {"elements": None, "quick_replies": None, "buttons": None, "attachment": None, "image": None,
+                  "custom": None}},
+    ]
+    for name in rng.sample(["orders", "rejected_hotel_ids", "popular_packages_cursor", "destination",
+                            "offered_hotel_id", "last_intent"], 3):
+        value = [{"id": rng.randint(1, 999), "destination": "Kobe", "price": 1299}] * 3 if name == "orders" \
+            else uuid.uuid4().hex[:10]
+        events.append({"event": "slot", "timestamp": ts + 0.1, "name": name, "value": value})
+    events.append(action_event("action_listen", ts + 0.2))
+    return events
+
+
+def session_start(slots: Dict[Text, Any], ts: float) -> List[Dict[Text, Any]]:
+    return [action_event("action_session_start", ts), {"event": "session_started", "timestamp": ts}] + [
+        {"event": "slot", "timestamp": ts, "name": name, "value": value} for name, value in slots.items()
+    ] + [action_event("action_listen", ts)]
+
+
+def stock_save(events: List[Dict], now: float) -> bytes:
+    return json.dumps({"name": "bench", "events": events}).encode("utf-8")
+
+
+def stock_load(stored: bytes) -> List[Dict]:
+    return json.loads(stored)["events"]
+
+
+def compact_save(max_age: float, keep_turns: int) -> Callable[[List[Dict], float], bytes]:
+    def save(events: List[Dict], now: float) -> bytes:
+        events = [event_codec.trim_parse_data(e, 3) for e in events]
+        return event_codec.encode(event_codec.truncate(events, max_age, keep_turns, now)[0])
+    return save
+
+
+def run(domain: Dict, sessions: int, turns: int, save, load, redis=None) -> Tuple[float, int, int]:
+    """Seconds per turn spent loading and saving, bytes of the last save, events stored at the end."""
+    rng = random.Random(7)
+    stored: Optional[bytes] = None
+    spent = 0.0
+    ts = 1_600_000_000.0
+    for session in range(sessions):
+        for turn in range(turns):
+            start = time.perf_counter()
+            if redis is not None:
+                stored = redis.get("tracker:bench")
+            events = load(stored) if stored is not None else []
+            spent += time.perf_counter() - start
+            slots = {e["name"]: e["value"] for e in events if e["event"] == "slot"}
+            new = (session_start(slots, ts) if turn == 0 else []) + turn_events(rng, domain, ts)
+            start = time.perf_counter()
+            stored = save(events + new, ts)
+            if redis is not None:
+                redis.set("tracker:bench", stored)
+            spent += time.perf_counter() - start
+            ts += TURN_GAP
+        ts += SESSION_GAP
+    return spent / (sessions * turns), len(stored), len(load(stored))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=40, help="turns per session")
+    parser.add_argument("--keep-turns", type=int, default=10)
+    parser.add_argument("--redis", help="Redis URL to save to and load from, e.g. redis://localhost:6379/15")
+    args = parser.parse_args()
+
+    domain = load_domain()
+    max_age = domain["session_config"]["session_expiration_time"] * 60
+    redis = None
+    if args.redis:
+        import redis as redis_py
+
+        redis = redis_py.Redis.from_url(args.redis)
+    print(f"{args.sessions} sessions of {args.turns} turns, session expiration {max_age / 60:.0f} min")
+    for label, save, load in (
+        ("stock", stock_save, stock_load),
+        ("compact", compact_save(max_age, args.keep_turns), event_codec.decode),
+    ):
+        per_turn, size, count = run(domain, args.sessions, args.turns, save, load, redis)
+        print(f"{label:>8}: {per_turn * 1e3:7.2f} ms load+save per turn, last save {size / 1024:8.1f} KiB, "
+              f"{count} events stored")
+    if redis is not None:
+        redis.delete("tracker:bench")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""False positive rate and throughput of the username filter, and DB API calls saved.
+
+Fills the filter with `--taken` random usernames, measures how many unseen
+names it wrongly reports as possibly taken and how fast it answers, then
+replays a burst of registration attempts through validate_username against
+a local DB API stub, with and without a synced filter:
+
+    python -m benchmarks.bench_usernames --taken 100000 --attempts 500 --latency 0.02
+"""
+import argparse
+import asyncio
+import random
+import string
+import time
+
+from rasa_sdk import Tracker
+from rasa_sdk.executor import CollectingDispatcher
+
+from actions.actions import ValidateRegisterForm
+from actions.backend import backend
+from actions.metrics import registry
+from actions.usernames import BloomFilter, usernames
+from benchmarks.stub_db_api import start_stub
+
+
+def random_names(count: int, rng: random.Random) -> list:
+    alphabet = string.ascii_lowercase + string.digits
+    return [rng.choice(string.ascii_letters) + "".join(rng.choices(alphabet, k=rng.randint(5, 11)))
+            for _ in range(count)]
+
+
+def filter_stats(taken: list, unseen: list) -> None:
+    bloom = BloomFilter(len(taken))
+    for name in taken:
+        bloom.add(name)
+    false_positives = sum(name in bloom for name in unseen)
+    start = time.perf_counter()
+    for name in unseen:
+        name in bloom
+    elapsed = time.perf_counter() - start
+    print(f"{len(taken)} names in {len(bloom.bits) / 1024:.0f} KiB, {bloom.hashes} hashes")
+    print(f"false positive rate: {false_positives / len(unseen):.3%} (target 1%)")
+    print(f"lookups: {len(unseen) / elapsed:,.0f}/s ({elapsed / len(unseen) * 1e9:.0f} ns each)")
+
+
+async def burst(names: list) -> float:
+    form = ValidateRegisterForm()
+    tracker = Tracker("bench", {}, {}, [], False, None, {}, "")
+    start = time.perf_counter()
+    await asyncio.gather(*(form.validate_username(name, CollectingDispatcher(), tracker, {}) for name in names))
+    return time.perf_counter() - start
+
+
+def checkname_calls() -> int:
+    series = registry.counters.get("trippy_backend_requests_total", {})
+    return int(sum(value for labels, value in series.items() if ("route", "/user/checkname") in labels))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--taken", type=int, default=100000)
+    parser.add_argument("--attempts", type=int, default=500)
+    parser.add_argument("--taken-share", type=float, default=0.2, help="share of attempts using a taken name")
+    parser.add_argument("--latency", type=float, default=0.02, help="stub latency per call in seconds")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    taken = random_names(args.taken, rng)
+    filter_stats(taken, random_names(100000, rng))
+
+    stub, runner, base_url = await start_stub(args.latency)
+    stub.users.update((name, "secret") for name in taken)
+    backend.base_url = base_url
+    attempts = [rng.choice(taken) if rng.random() < args.taken_share else name
+                for name in random_names(args.attempts, rng)]
+    try:
+        print(f"\n{args.attempts} validate_username calls, {args.taken_share:.0%} taken, "
+              f"{args.latency * 1000:.0f} ms stub latency")
+        for label, synced in (("checkname only", False), ("with synced filter", True)):
+            usernames.route = "/user/names" if synced else None
+            usernames.filter = None
+            await usernames.refresh()
+            before = checkname_calls()
+            elapsed = await burst(attempts)
+            print(f"{label:>20}: {checkname_calls() - before:5d} checkname calls, {elapsed * 1000:7.1f} ms")
+    finally:
+        await backend.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
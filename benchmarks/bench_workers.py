@@ -0,0 +1,169 @@
+"""Action server throughput by number of worker processes on one machine.
+
+Starts the action server against a local DB API stub, with a shared cache
+file, and replays short authenticated conversations (login, orders, popular
+packages, packages in a country) straight against its webhook. With
+`--mode processes` every worker is a separate single-worker server and
+requests are spread round-robin over them, like several containers behind
+a load balancer; consecutive calls of a conversation usually hit different
+workers, so sessions must come from the shared store:
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --conversations 500
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List, Text
+
+import aiohttp
+import yaml
+
+from benchmarks.stub_db_api import StubThread
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONVERSATION = [
+    ("action_login_user", {}),
+    ("action_query_user_orders", {}),
+    ("action_query_popular_packages", {}),
+    ("action_query_country_specific_packages", {"country": "Japan"}),
+]
+
+
+def action_call(action: Text, sender_id: Text, domain: Dict[Text, Any], entities: Dict[Text, Text]) -> Dict:
+    slots = {"username": f"user{sender_id[-6:]}", "password": "secret", "last_intent": "ask_user_orders"}
+    return {
+        "next_action": action,
+        "sender_id": sender_id,
+        "version": "2.8.2",
+        "domain": domain,
+        "tracker": {
+            "sender_id": sender_id,
+            "slots": slots,
+            "latest_message": {
+                "intent": {"name": "inform"},
+                "entities": [{"entity": k, "value": v} for k, v in entities.items()],
+                "text": "",
+                "message_id": uuid.uuid4().hex,
+            },
+            "events": [],
+            "paused": False,
+            "followup_action": None,
+            "active_loop": {},
+            "latest_action_name": None,
+        },
+    }
+
+
+def prepare_workdir(stub_url: Text) -> Text:
+    """A directory with the repo's actions and data and an `.env` pointing at the stub."""
+    workdir = tempfile.mkdtemp(prefix="trippy-workers-")
+    for name in ("actions", "data", "domain.yml"):
+        os.symlink(os.path.join(REPO, name), os.path.join(workdir, name))
+    with open(os.path.join(workdir, ".env"), "w") as f:
+        f.write(f"DB_API_ADDRESS={stub_url}\n")
+        f.write(f"SHARED_CACHE_PATH={os.path.join(workdir, 'shared.sqlite3')}\n")
+    return workdir
+
+
+async def wait_ready(session: aiohttp.ClientSession, urls: List[Text], timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    for url in urls:
+        while True:
+            try:
+                async with session.get(f"{url}/health") as resp:
+                    if resp.status == 200:
+                        break
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Action server at {url} did not start")
+            await asyncio.sleep(0.2)
+
+
+async def drive(urls: List[Text], domain: Dict, conversations: int, concurrency: int) -> Dict[Text, float]:
+    next_url = itertools.cycle(urls)
+    errors = 0
+    calls = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def conversation(session: aiohttp.ClientSession) -> None:
+        nonlocal errors, calls
+        sender_id = uuid.uuid4().hex
+        async with semaphore:
+            for action, entities in CONVERSATION:
+                calls += 1
+                try:
+                    async with session.post(f"{next(next_url)}/webhook",
+                                            json=action_call(action, sender_id, domain, entities)) as resp:
+                        body = await resp.json(content_type=None)
+                        expired = any("session has expired" in (m.get("text") or "")
+                                      for m in (body or {}).get("responses", []))
+                        errors += resp.status != 200 or expired
+                except aiohttp.ClientError:
+                    errors += 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await wait_ready(session, urls)
+        await asyncio.gather(*(conversation(session) for _ in range(min(conversations, 20))))  # warm-up
+        calls = errors = 0
+        start = time.perf_counter()
+        await asyncio.gather(*(conversation(session) for _ in range(conversations)))
+        elapsed = time.perf_counter() - start
+    return {"calls": calls, "errors": errors, "seconds": elapsed}
+
+
+def start_servers(command: Text, workdir: Text, workers: int, port: int, mode: Text) -> List[subprocess.Popen]:
+    if mode == "prefork":
+        commands = [command.format(port=port, workers=workers)]
+    else:
+        commands = [command.format(port=port + i, workers=1) for i in range(workers)]
+    return [subprocess.Popen(shlex.split(c), cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            for c in commands]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--mode", choices=["prefork", "processes"], default="prefork")
+    parser.add_argument("--conversations", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=5155)
+    parser.add_argument("--stub-latency", type=float, default=0.005)
+    parser.add_argument("--server-cmd", default=f"{sys.executable} -m actions.server --port {{port}} --workers {{workers}}",
+                        help="command starting one action server; {port} and {workers} are filled in")
+    args = parser.parse_args()
+
+    with open(os.path.join(REPO, "domain.yml"), encoding="utf-8") as f:
+        domain = yaml.safe_load(f)
+
+    with StubThread(args.stub_latency, open_accounts=True) as stub:
+        baseline = None
+        for workers in args.workers:
+            workdir = prepare_workdir(stub.base_url)
+            servers = start_servers(args.server_cmd, workdir, workers, args.port, args.mode)
+            urls = [f"http://127.0.0.1:{args.port}"] if args.mode == "prefork" else \
+                [f"http://127.0.0.1:{args.port + i}" for i in range(workers)]
+            try:
+                result = asyncio.run(drive(urls, domain, args.conversations, args.concurrency))
+            finally:
+                for server in servers:
+                    server.terminate()
+                for server in servers:
+                    server.wait()
+            throughput = result["calls"] / result["seconds"]
+            baseline = baseline or throughput
+            print(f"{workers} worker(s): {throughput:7.0f} action calls/s  x{throughput / baseline:.2f}  "
+                  f"errors {result['errors']}/{result['calls']}")
+
+
+if __name__ == "__main__":
+    main()
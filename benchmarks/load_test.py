@@ -0,0 +1,245 @@
+"""Replay the training and test stories as concurrent conversations against a running bot.
+
+Each story becomes a synthetic conversation: intent steps are sent as
+`/intent{"entity": "value"}` payloads (or their `user:` text in test
+stories) and slots a form asks for are answered with an `/inform` payload
+carrying the value the story sets. Turns go through the REST channel, and
+after each conversation its tracker is fetched from the HTTP API to check
+which of the story's actions actually ran.
+
+Start the bot with the API enabled and the action server pointed at the
+stub (`DB_API_ADDRESS=http://127.0.0.1:8082` in `.env`), then:
+
+    python -m benchmarks.load_test --concurrency 20 --rounds 3 --stub-port 8082
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Text
+
+import aiohttp
+import yaml
+
+from actions.matching import intent_payload
+from benchmarks.stub_db_api import StubThread
+
+STORY_FILES = ["data/stories.yml", "tests/test_stories.yml"]
+DOMAIN_FILE = "domain.yml"
+
+
+class Turn(NamedTuple):
+    message: Text
+    actions: List[Text]
+
+
+class Conversation(NamedTuple):
+    name: Text
+    turns: List[Turn]
+
+
+def story_entities(entities: Iterable[Any]) -> Dict[Text, Any]:
+    """Entity values of a story step; entities listed by name only carry no value."""
+    values = {}
+    for entity in entities:
+        if isinstance(entity, dict):
+            values.update(entity)
+    return values
+
+
+def form_slot_entities(domain_path: Text = DOMAIN_FILE) -> Dict[Text, Text]:
+    """Entity each form slot is filled from, e.g. target_destination -> destination."""
+    with open(domain_path, encoding="utf-8") as f:
+        domain = yaml.safe_load(f)
+    mapping = {}
+    for form in (domain.get("forms") or {}).values():
+        for slot, extractors in (form.get("required_slots") or {}).items():
+            entity = next((e["entity"] for e in extractors or [] if e.get("type") == "from_entity"), slot)
+            mapping[slot] = entity
+    return mapping
+
+
+def story_to_conversation(story: Dict[Text, Any], slot_entities: Dict[Text, Text]) -> Conversation:
+    turns: List[Turn] = []
+    requested_slot = None
+
+    def add_turn(message: Text) -> None:
+        turns.append(Turn(message, []))
+
+    for step in story.get("steps") or []:
+        if "or" in step:
+            step = step["or"][0]
+        if "intent" in step:
+            text = (step.get("user") or "").strip()
+            add_turn(text or intent_payload(step["intent"], **story_entities(step.get("entities") or [])))
+            requested_slot = None
+        elif "action" in step:
+            if turns:
+                turns[-1].actions.append(step["action"])
+        elif "slot_was_set" in step:
+            for slot_set in step["slot_was_set"] or []:
+                if not isinstance(slot_set, dict):
+                    continue
+                for slot, value in slot_set.items():
+                    if slot == "requested_slot":
+                        requested_slot = value
+                    elif requested_slot is not None and value is not None \
+                            and slot_entities.get(requested_slot) == slot_entities.get(slot, slot):
+                        add_turn(intent_payload("inform", **{slot_entities.get(requested_slot, slot): value}))
+                        requested_slot = None
+    return Conversation(story.get("story", "story"), turns)
+
+
+def load_conversations(paths: Iterable[Text] = STORY_FILES) -> List[Conversation]:
+    slot_entities = form_slot_entities()
+    conversations = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        for story in data.get("stories") or []:
+            conversation = story_to_conversation(story, slot_entities)
+            if conversation.turns:
+                conversations.append(conversation)
+    return conversations
+
+
+class Results:
+    def __init__(self) -> None:
+        self.turn_latencies: List[float] = []
+        self.action_latencies: Dict[Text, List[float]] = defaultdict(list)
+        self.turn_errors = 0
+        self.expected_actions: Counter = Counter()
+        self.missing_actions: Counter = Counter()
+        self.conversations = 0
+
+    def record_turn(self, turn: Turn, seconds: float, ok: bool) -> None:
+        self.turn_latencies.append(seconds)
+        self.action_latencies[turn.actions[0] if turn.actions else "(none)"].append(seconds)
+        self.turn_errors += not ok
+
+    def record_actions(self, conversation: Conversation, executed: Optional[List[Text]]) -> None:
+        self.conversations += 1
+        expected = Counter(action for turn in conversation.turns for action in turn.actions)
+        self.expected_actions.update(expected)
+        if executed is None:
+            self.missing_actions.update(expected)
+            return
+        ran = Counter(executed)
+        for action, count in expected.items():
+            self.missing_actions[action] += max(0, count - ran[action])
+
+
+def percentiles(samples: List[float]) -> Dict[Text, float]:
+    samples = sorted(samples)
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+async def play(session: aiohttp.ClientSession, rasa_url: Text, conversation: Conversation, results: Results) -> None:
+    sender = f"load-{uuid.uuid4().hex[:12]}"
+    for turn in conversation.turns:
+        start = time.perf_counter()
+        ok = True
+        try:
+            async with session.post(f"{rasa_url}/webhooks/rest/webhook",
+                                    json={"sender": sender, "message": turn.message}) as resp:
+                await resp.read()
+                ok = resp.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ok = False
+        results.record_turn(turn, time.perf_counter() - start, ok)
+    executed = None
+    try:
+        async with session.get(f"{rasa_url}/conversations/{sender}/tracker") as resp:
+            if resp.status == 200:
+                events = (await resp.json()).get("events", [])
+                executed = [e["name"] for e in events if e.get("event") == "action"]
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        pass
+    results.record_actions(conversation, executed)
+
+
+async def run_load(rasa_url: Text, conversations: List[Conversation], concurrency: int, rounds: int,
+                   timeout: float) -> Dict[Text, Any]:
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(rounds):
+        for conversation in conversations:
+            queue.put_nowait(conversation)
+    results = Results()
+
+    async def worker(session: aiohttp.ClientSession) -> None:
+        while not queue.empty():
+            await play(session, rasa_url, queue.get_nowait(), results)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    turns = len(results.turn_latencies)
+    return {
+        "concurrency": concurrency,
+        "conversations": results.conversations,
+        "turns": turns,
+        "seconds": elapsed,
+        "turns_per_second": turns / elapsed if elapsed else 0.0,
+        "turn_error_rate": results.turn_errors / turns if turns else 0.0,
+        "turn_latency_ms": percentiles(results.turn_latencies),
+        "actions": {
+            action: {
+                **percentiles(results.action_latencies.get(action, [])),
+                "expected": expected,
+                "missing": results.missing_actions[action],
+                "error_rate": results.missing_actions[action] / expected,
+            }
+            for action, expected in sorted(results.expected_actions.items())
+        },
+    }
+
+
+def print_report(report: Dict[Text, Any]) -> None:
+    latency = report["turn_latency_ms"]
+    print(f"{report['conversations']} conversations, {report['turns']} turns in {report['seconds']:.1f} s "
+          f"at concurrency {report['concurrency']}: {report['turns_per_second']:.1f} turns/s, "
+          f"turn errors {report['turn_error_rate']:.1%}")
+    print(f"turn latency: p50 {latency['p50']:.0f} ms  p95 {latency['p95']:.0f} ms  p99 {latency['p99']:.0f} ms")
+    print(f"{'action':<45}{'p50':>8}{'p95':>8}{'p99':>8}{'runs':>8}{'missed':>8}")
+    for action, row in report["actions"].items():
+        print(f"{action:<45}{row['p50']:8.0f}{row['p95']:8.0f}{row['p99']:8.0f}"
+              f"{row['expected']:8d}{row['error_rate']:8.1%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rasa-url", default="http://localhost:5005")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=1, help="times every story is replayed")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds allowed per HTTP request")
+    parser.add_argument("--stories", nargs="+", default=STORY_FILES)
+    parser.add_argument("--stub-port", type=int, help="also serve the DB API stub on this port")
+    parser.add_argument("--stub-latency", type=float, default=0.0)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    conversations = load_conversations(args.stories)
+    stub = StubThread(args.stub_latency, args.stub_port, open_accounts=True) if args.stub_port else None
+    if stub is not None:
+        stub.__enter__()
+    try:
+        report = asyncio.run(run_load(args.rasa_url, conversations, args.concurrency, args.rounds, args.timeout))
+    finally:
+        if stub is not None:
+            stub.__exit__(None, None, None)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Runs every custom action and form validator against a local DB API stub.
+
+Each round is one conversation with a new account: it registers, browses
+and books a package, then changes and cancels one of its orders. The slots
+an action sets are carried into the next step, as Rasa would. Every step
+checks the slots it must set and that no fallback or session-expired
+message was sent, and the run reports latency, DB API calls and messages
+per step. It exits with status 1 if any step failed, so it also works as a
+smoke test:
+
+    python -m benchmarks.run_actions --rounds 50 --latency 0.02
+    python -m benchmarks.run_actions --fixtures recorded.json --error-rate 0.05
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, NamedTuple, Optional, Text
+
+from rasa_sdk import Tracker
+from rasa_sdk.executor import CollectingDispatcher
+
+from actions import actions
+from actions.backend import FALLBACK_MESSAGE, backend
+from actions.sessions import SESSION_EXPIRED_MESSAGE
+from benchmarks.stub_db_api import start_stub
+
+# Any value but None.
+SET = object()
+
+
+class Step(NamedTuple):
+    action: Any
+    # `validate_<slot>` of a form validator, called with `value`; None runs the action.
+    validate: Optional[Text] = None
+    value: Any = None
+    slots: Dict[Text, Any] = {}
+    entities: Dict[Text, Text] = {}
+    intent: Text = "inform"
+    expect: Dict[Text, Any] = {}
+
+    @property
+    def label(self) -> Text:
+        name = self.action.name()
+        return f"{name}.validate_{self.validate}" if self.validate else name
+
+
+CONVERSATION = [
+    Step(actions.LoginOrRegister(), intent="book_package", expect={"last_intent": "book_package"}),
+    Step(actions.ValidateRegisterForm(), "username", "{username}", expect={"username": SET}),
+    Step(actions.ValidateRegisterForm(), "password", "secret", expect={"password": SET}),
+    Step(actions.RegisterUser(), expect={"password": None}),
+    Step(actions.LoginUser(), slots={"password": "secret"}, expect={"password": None}),
+    Step(actions.ActionQueryCompanyInfo()),
+    Step(actions.ActionQueryCompanyContact()),
+    Step(actions.QueryPopularPackages(), expect={"popular_packages_cursor": SET}),
+    Step(actions.QueryPopularPackages(), expect={"popular_packages_cursor": SET}),
+    Step(actions.QueryCountrySpecificPackages(), entities={"country": "Japan"}),
+    Step(actions.ValidateBookPackageForm(), "destination", "kobe", expect={"destination": "Kobe"}),
+    Step(actions.CreateUserOrder(), expect={"destination": None, "has_orders": True}),
+    Step(actions.QueryUserOrders(), expect={"has_orders": True, "orders": SET}),
+    Step(actions.ValidateTargetDestinationForm(), "target_destination", "madrid",
+         expect={"target_destination": "Madrid"}),
+    Step(actions.QueryAvailableFlight(), expect={"offered_flight_id": SET}),
+    Step(actions.QueryAvailableFlight(), expect={"offered_flight_id": SET}),
+    Step(actions.ChangeFlight(), expect={"offered_flight_id": None, "target_destination": None}),
+    Step(actions.FindNewRoom(), entities={"destination": "Madrid"}, expect={"offered_hotel_id": SET}),
+    Step(actions.ChangeNewRoom(), slots={"target_destination": "Madrid"},
+         expect={"offered_hotel_id": None, "target_destination": None}),
+    Step(actions.ChangeGuide(), slots={"target_destination": "Madrid"}, expect={"target_destination": None}),
+    Step(actions.OfferCoupon(), entities={"destination": "Madrid"}),
+    Step(actions.CancelUserTrip(), slots={"target_destination": "Kobe"}, expect={"target_destination": None}),
+]
+
+
+def tracker_for(sender_id: Text, slots: Dict[Text, Any], step: Step) -> Tracker:
+    latest_message = {
+        "intent": {"name": step.intent, "confidence": 1.0},
+        "intent_ranking": [{"name": step.intent, "confidence": 1.0}],
+        "entities": [{"entity": k, "value": v} for k, v in step.entities.items()],
+        "text": "",
+    }
+    return Tracker(sender_id, dict(slots), latest_message, [], False, None, {}, "")
+
+
+def check(step: Step, messages: List[Dict[Text, Any]], slots: Dict[Text, Any]) -> Optional[Text]:
+    texts = [m.get("text") for m in messages]
+    for failure in (FALLBACK_MESSAGE, SESSION_EXPIRED_MESSAGE):
+        if failure in texts:
+            return failure
+    for slot, expected in step.expect.items():
+        value = slots.get(slot)
+        if (value is None) if expected is SET else value != expected:
+            return f"slot {slot} is {value!r}"
+    return None
+
+
+async def run_step(step: Step, sender_id: Text, slots: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    dispatcher = CollectingDispatcher()
+    slots.update(step.slots)
+    tracker = tracker_for(sender_id, slots, step)
+    if step.validate:
+        value = step.value.format(**slots) if isinstance(step.value, str) else step.value
+        slots.update(await getattr(step.action, f"validate_{step.validate}")(value, dispatcher, tracker, {}))
+    else:
+        for event in await step.action.run(dispatcher, tracker, {}):
+            if event.get("event") == "slot":
+                slots[event["name"]] = event["value"]
+    return dispatcher.messages
+
+
+async def conversation(stub, results: Dict[Text, Dict[Text, List]]) -> None:
+    sender_id = uuid.uuid4().hex
+    slots: Dict[Text, Any] = {"username": f"user{sender_id[:8]}"}
+    for step in CONVERSATION:
+        result = results.setdefault(step.label, {"seconds": [], "calls": [], "messages": [], "failures": []})
+        requests = len(stub.requests)
+        start = time.perf_counter()
+        try:
+            messages = await run_step(step, sender_id, slots)
+            failure = check(step, messages, slots)
+        except Exception as e:
+            messages, failure = [], f"{type(e).__name__}: {e}"
+        result["seconds"].append(time.perf_counter() - start)
+        result["calls"].append(len(stub.requests) - requests)
+        result["messages"].append(len(messages))
+        if failure:
+            result["failures"].append(failure)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))] if samples else 0.0
+
+
+def report(results: Dict[Text, Dict[Text, List]]) -> int:
+    failed = 0
+    print(f"{'step':<56} {'p50 ms':>8} {'p95 ms':>8} {'calls':>6} {'msgs':>5} {'failed':>7}")
+    for label, result in results.items():
+        runs = len(result["seconds"])
+        failed += len(result["failures"])
+        print(f"{label:<56} {percentile(result['seconds'], 0.5) * 1e3:8.2f} "
+              f"{percentile(result['seconds'], 0.95) * 1e3:8.2f} {sum(result['calls']) / runs:6.2f} "
+              f"{sum(result['messages']) / runs:5.1f} {len(result['failures']):>3}/{runs:<3}")
+        for failure in sorted(set(result["failures"])):
+            print(f"    {failure}")
+    return failed
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20, help="conversations to run")
+    parser.add_argument("--latency", type=float, default=0.0, help="stub latency per call in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub calls answered with 503")
+    parser.add_argument("--fixtures", help="fixtures file for the stub (see benchmarks.stub_db_api)")
+    args = parser.parse_args()
+
+    stub, runner, base_url = await start_stub(args.latency, open_accounts=True, error_rate=args.error_rate,
+                                              fixtures=args.fixtures, log_requests=True)
+    backend.base_url = base_url
+    try:
+        await conversation(stub, {})  # warm-up: loads the catalog and opens connections
+        results: Dict[Text, Dict[Text, List]] = {}
+        for _ in range(args.rounds):
+            await conversation(stub, results)
+    finally:
+        await backend.close()
+        await runner.cleanup()
+    print(f"{args.rounds} conversations, {args.latency * 1000:.0f} ms stub latency, "
+          f"{args.error_rate:.0%} injected errors")
+    failed = report(results)
+    print(f"{failed} failed step(s)" if failed else "All steps passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
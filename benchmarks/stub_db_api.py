@@ -0,0 +1,367 @@
+"""Local stand-in for the Trippy DB API used by the benchmarks.
+
+Run it directly to point a local action server at it:
+
+    python -m benchmarks.stub_db_api --port 8082 --latency 0.05
+
+Its data can come from a fixtures file (`--fixtures`, see `--dump-fixtures`
+for the format). With `--record-from` it forwards requests it has no
+recorded response for to a real DB API and adds the answers to the fixtures
+file, and replays them from there afterwards.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Text
+from urllib.parse import urlencode
+
+import aiohttp
+from aiohttp import web
+
+PACKAGE_DESTINATIONS = {
+    "Czech Republic": ["Praha", "Kalovy Vary"],
+    "Spain": ["Fuengirola", "Madrid"],
+    "France": ["Versailles Palace", "Mont Saint-Michel"],
+    "Italy": ["Venice", "Pompeii"],
+    "Thailand": ["Chiangmai", "Bangkok"],
+    "South Korea": ["Seoul", "Busan"],
+    "Switzerland": ["Lucerne", "Zurich"],
+    "Japan": ["Hokkaido", "Kobe"],
+}
+
+
+def make_packages() -> List[Dict[Text, Any]]:
+    packages = []
+    for country, destinations in PACKAGE_DESTINATIONS.items():
+        for destination in destinations:
+            i = len(packages) + 1
+            packages.append({
+                "id": i,
+                "title": f"Discover {destination}",
+                "country": country,
+                "destination": destination,
+                "description": f"A guided tour through the highlights of {destination}.",
+                "duration": 5 + i % 5,
+                "price": 800 + 50 * i,
+                "pic_url": f"https://example.com/packages/{i}.jpg",
+                "popularity": (i * 7) % 17,
+                "guide": {"name": f"Guide {i}", "phone_number": f"+45 1000{i:04d}",
+                          "email": f"guide{i}@trippy.social"},
+                "hotel": {"name": f"Hotel {destination}", "price": 90 + i},
+                "car_rental": {"name": f"Cars {destination}", "price": 40 + i},
+            })
+    return packages
+
+
+class StubDBAPI:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 1.0,
+        down: bool = False,
+        open_accounts: bool = False,
+        seed: int = 0,
+        fixtures: Optional[Text] = None,
+        record_from: Optional[Text] = None,
+        log_requests: bool = False,
+    ) -> None:
+        self.latency = latency
+        # Accept any login or registration and give unknown users two orders,
+        # so replayed stories with arbitrary credentials stay on their path.
+        self.open_accounts = open_accounts
+        # Fault injection: answer 503 with probability `error_rate`, add
+        # `slow_latency` with probability `slow_rate`, or refuse everything
+        # with 503 while `down` is set.
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.down = down
+        self.rng = random.Random(seed)
+        self.packages = make_packages()
+        self.users = {"alice": "secret"}
+        self.orders = {"alice": {1}}
+        self.hotels = [{"id": i, "name": f"Hotel #{i}", "address": f"Street {i}",
+                        "telephone": f"+45 2000{i:04d}", "price": 100 + i} for i in range(1, 6)]
+        self.flights = [{"id": i, "airline": f"Air {i}", "departure_time": i,
+                         "departure_port": i} for i in range(1, 6)]
+        self.info = "Trippy is a travel agency offering guided packages."
+        self.contact = "customer.service@trippy.social"
+        # Recorded answers by `response_key`, served as they are.
+        self.responses: Dict[Text, Dict[Text, Any]] = {}
+        self.fixtures = fixtures
+        if fixtures:
+            self.load_fixtures(fixtures)
+        self.record_from = record_from.rstrip("/") if record_from else None
+        self.request_count = 0
+        # With `log_requests`, one {method, path, query, body, status, ms} dict per request served.
+        self.requests: Optional[List[Dict[Text, Any]]] = [] if log_requests else None
+
+    def load_fixtures(self, path: Text) -> None:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.packages = data.get("packages", self.packages)
+        self.users = data.get("users", self.users)
+        self.orders = {user: set(ids) for user, ids in data["orders"].items()} if "orders" in data else self.orders
+        self.hotels = data.get("hotels", self.hotels)
+        self.flights = data.get("flights", self.flights)
+        self.info = data.get("info", self.info)
+        self.contact = data.get("contact", self.contact)
+        self.responses = data.get("responses", {})
+
+    def dump_fixtures(self, path: Text) -> None:
+        data = {
+            "packages": self.packages, "users": self.users,
+            "orders": {user: sorted(ids) for user, ids in self.orders.items()},
+            "hotels": self.hotels, "flights": self.flights, "info": self.info, "contact": self.contact,
+            "responses": self.responses,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+
+    @staticmethod
+    def response_key(method: Text, path: Text, query: Any, body: bytes) -> Text:
+        key = f"{method} {path}"
+        if query:
+            key += "?" + urlencode(sorted(query.items()))
+        if body:
+            key += " " + body.decode("utf-8", "replace")
+        return key
+
+    @web.middleware
+    async def log(self, request: web.Request, handler):
+        if self.requests is None:
+            return await handler(request)
+        start = time.perf_counter()
+        body = await request.read()
+        response = await handler(request)
+        self.requests.append({
+            "method": request.method, "path": request.path, "query": request.query_string,
+            "body": body.decode("utf-8", "replace") or None, "status": response.status,
+            "ms": round((time.perf_counter() - start) * 1000, 2),
+        })
+        return response
+
+    @web.middleware
+    async def replay(self, request: web.Request, handler):
+        """Serve recorded answers, and record new ones from `record_from`."""
+        if not self.responses and not self.record_from:
+            return await handler(request)
+        body = await request.read()
+        key = self.response_key(request.method, request.path, request.query, body)
+        if key in self.responses:
+            recorded = self.responses[key]
+            return web.json_response(recorded["body"], status=recorded["status"])
+        if self.record_from:
+            return await self.forward(request, key, body)
+        return await handler(request)
+
+    async def forward(self, request: web.Request, key: Text, body: bytes) -> web.Response:
+        async with aiohttp.ClientSession() as session:
+            async with session.request(request.method, self.record_from + request.path_qs, data=body or None,
+                                       headers={"Content-Type": request.content_type}) as upstream:
+                payload = await upstream.json(content_type=None)
+                self.responses[key] = {"status": upstream.status, "body": payload}
+        if self.fixtures:
+            self.dump_fixtures(self.fixtures)
+        return web.json_response(payload, status=upstream.status)
+
+    def package_by_destination(self, destination: Text) -> List[Dict[Text, Any]]:
+        return [p for p in self.packages if p["destination"] == destination]
+
+    @web.middleware
+    async def delay(self, request: web.Request, handler):
+        self.request_count += 1
+        latency = self.latency
+        if self.slow_rate and self.rng.random() < self.slow_rate:
+            latency += self.slow_latency
+        if latency:
+            await asyncio.sleep(latency)
+        if self.down or (self.error_rate and self.rng.random() < self.error_rate):
+            return web.json_response({"message": "unavailable"}, status=503)
+        return await handler(request)
+
+    def orders_of(self, username: Text) -> set:
+        if self.open_accounts:
+            return self.orders.setdefault(username, {2, 4})
+        return self.orders.get(username, set())
+
+    async def checkname(self, request: web.Request) -> web.Response:
+        return web.json_response({"result": self.open_accounts or request.query.get("username") not in self.users})
+
+    async def usernames(self, request: web.Request) -> web.Response:
+        return web.json_response({"usernames": list(self.users)})
+
+    async def login(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if self.open_accounts or self.users.get(body.get("username")) == body.get("password"):
+            return web.json_response({"message": "ok"})
+        return web.json_response({"message": "invalid"}, status=401)
+
+    async def register(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if body.get("username") in self.users and not self.open_accounts:
+            return web.json_response({"message": "taken"}, status=400)
+        self.users[body["username"]] = body.get("password")
+        return web.json_response({"message": "created"}, status=201)
+
+    async def user_orders(self, request: web.Request) -> web.Response:
+        ids = self.orders_of(request.query.get("username"))
+        return web.json_response({"packages": [p for p in self.packages if p["id"] in ids]})
+
+    async def create_order(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        orders = self.orders_of(body.get("username")) if self.open_accounts else \
+            self.orders.setdefault(body.get("username"), set())
+        if body.get("package_id") in orders and not self.open_accounts:
+            return web.json_response({"message": "exists"}, status=400)
+        orders.add(body.get("package_id"))
+        return web.json_response({"message": "created"}, status=201)
+
+    def _find_order(self, request: web.Request):
+        orders = self.orders_of(request.query.get("username"))
+        for package in self.package_by_destination(request.query.get("destination")):
+            if package["id"] in orders:
+                return orders, package
+        return orders, None
+
+    async def cancel_order(self, request: web.Request) -> web.Response:
+        orders, package = self._find_order(request)
+        if package is None:
+            return web.json_response({"message": "not found"}, status=404)
+        orders.discard(package["id"])
+        return web.json_response({"message": "canceled"})
+
+    async def change_order(self, request: web.Request) -> web.Response:
+        _, package = self._find_order(request)
+        if package is None:
+            return web.json_response({"message": "not found"}, status=404)
+        return web.json_response({"message": "changed"})
+
+    async def change_guide(self, request: web.Request) -> web.Response:
+        return web.json_response({"new_guide": {"name": "Backup Guide", "phone_number": "+45 30000000",
+                                                "email": "backup@trippy.social"}})
+
+    async def available_flight(self, request: web.Request) -> web.Response:
+        undesired = {int(i) for i in request.query.getall("undesired_flight_ids", [])}
+        flight = next((f for f in self.flights if f["id"] not in undesired), None)
+        return web.json_response({"new_flight": flight})
+
+    async def available_hotel(self, request: web.Request) -> web.Response:
+        undesired = {int(i) for i in request.query.getall("undesired_hotel_ids", [])}
+        hotel = next((h for h in self.hotels if h["id"] not in undesired), None)
+        return web.json_response({"new_hotel": hotel})
+
+    async def available_restaurant(self, request: web.Request) -> web.Response:
+        return web.json_response({"new_restaurant": {"name": f"Bistro {request.query.get('destination')}"}})
+
+    async def company_info(self, request: web.Request) -> web.Response:
+        return web.json_response({"info": self.info})
+
+    async def company_contact(self, request: web.Request) -> web.Response:
+        return web.json_response({"contact": self.contact})
+
+    async def packages_by_country(self, request: web.Request) -> web.Response:
+        country = request.query.get("country")
+        return web.json_response({"packages": [p for p in self.packages if p["country"] == country]})
+
+    async def packages_by_destination(self, request: web.Request) -> web.Response:
+        return web.json_response({"package": self.package_by_destination(request.query.get("destination"))})
+
+    async def popular_packages(self, request: web.Request) -> web.Response:
+        batch = int(request.query.get("batch", 4))
+        showed = {int(i) for i in request.query.getall("showed_package_ids", [])}
+        ranked = sorted(self.packages, key=lambda p: -p["popularity"])
+        return web.json_response({"packages": [p for p in ranked if p["id"] not in showed][:batch]})
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.log, self.delay, self.replay])
+        app.add_routes([
+            web.get("/user/checkname", self.checkname),
+            web.get("/user/names", self.usernames),
+            web.post("/user/login", self.login),
+            web.post("/user/register", self.register),
+            web.get("/user/orders", self.user_orders),
+            web.post("/order", self.create_order),
+            web.delete("/order/cancel", self.cancel_order),
+            web.put("/user/order/flight", self.change_order),
+            web.put("/user/order/hotel", self.change_order),
+            web.put("/user/order/guide", self.change_guide),
+            web.get("/flight/available", self.available_flight),
+            web.get("/hotel/available", self.available_hotel),
+            web.get("/restaurant/available", self.available_restaurant),
+            web.get("/info/company", self.company_info),
+            web.get("/info/contact", self.company_contact),
+            web.get("/package/country", self.packages_by_country),
+            web.get("/package/destination", self.packages_by_destination),
+            web.get("/package/popular", self.popular_packages),
+        ])
+        return app
+
+
+async def start_stub(latency: float = 0.0, port: int = 0, **options: Any):
+    """Start a stub in the running loop; returns (stub, runner, base_url)."""
+    stub = StubDBAPI(latency, **options)
+    runner = web.AppRunner(stub.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return stub, runner, f"http://127.0.0.1:{bound_port}"
+
+
+class StubThread:
+    """Serve a stub from a background thread so blocking clients can be measured too."""
+
+    def __init__(self, latency: float = 0.0, port: int = 0, **options: Any) -> None:
+        self.latency = latency
+        self.port = port
+        self.options = options
+        self.base_url = None
+        self.stub = None
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def _serve(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self.stub, self._runner, self.base_url = self._loop.run_until_complete(
+            start_stub(self.latency, self.port, **self.options))
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+
+    def __enter__(self) -> "StubThread":
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stub of the Trippy DB API.")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests delayed further")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="extra seconds for slow requests")
+    parser.add_argument("--open-accounts", action="store_true", help="accept any credentials")
+    parser.add_argument("--fixtures", help="JSON file with the data to serve and recorded responses")
+    parser.add_argument("--record-from", help="real DB API to forward unrecorded requests to")
+    parser.add_argument("--dump-fixtures", help="write the built-in data as a fixtures file and exit")
+    args = parser.parse_args()
+    stub = StubDBAPI(args.latency, error_rate=args.error_rate, slow_rate=args.slow_rate,
+                     slow_latency=args.slow_latency, open_accounts=args.open_accounts,
+                     fixtures=args.fixtures, record_from=args.record_from)
+    if args.dump_fixtures:
+        stub.dump_fixtures(args.dump_fixtures)
+        raise SystemExit
+    web.run_app(stub.create_app(), host="127.0.0.1", port=args.port)
@@ -9,5 +9,17 @@ echo "[2/2] deploy new app"
 sudo docker-compose build
 sudo docker-compose up -d
 
+echo "waiting for the action server and Rasa to be ready"
+for url in http://localhost:5055/ready http://localhost:5005/; do
+    for i in $(seq 1 ${READY_TIMEOUT:-120}); do
+        curl -sf "$url" > /dev/null && break
+        if [ "$i" = "${READY_TIMEOUT:-120}" ]; then
+            echo "$url not ready after ${READY_TIMEOUT:-120}s"
+            exit 1
+        fi
+        sleep 1
+    done
+done
+
 echo "[3/3] remove dangling images"
 printf "y" | sudo docker image prune
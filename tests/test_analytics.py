@@ -0,0 +1,49 @@
+import numpy as np
+
+from addons.event_columns import COLUMNS, to_row
+from tools import analytics
+
+
+def user(sender_id, intent, ts):
+    return {"event": "user", "sender_id": sender_id, "timestamp": 1000.0 + ts,
+            "parse_data": {"intent": {"name": intent, "confidence": 0.9}}}
+
+
+def action(sender_id, name, ts):
+    return {"event": "action", "sender_id": sender_id, "timestamp": 1000.0 + ts, "name": name}
+
+
+def columns(events):
+    rows = [to_row(event) for event in events]
+    return analytics.sort_events({column: np.asarray([row[column] for row in rows], dtype=dtype)
+                                  for column, dtype in COLUMNS.items()})
+
+
+BOOKINGS = columns([
+    # Logged in: straight through the booking form.
+    user("a", "book_package", 0), action("a", "book_package_form", 1), action("a", "action_create_user_order", 5),
+    # Logged out: the login, then the confirmation.
+    user("b", "book_package", 0), action("b", "action_login_or_register", 1), action("b", "login_form", 2),
+    action("b", "utter_confirm_book_package", 8), action("b", "action_create_user_order", 10),
+    # Dropped off at the login.
+    user("c", "book_package", 0), action("c", "action_login_or_register", 1),
+    # Never asked to book.
+    user("d", "greet", 0), action("d", "action_create_user_order", 1),
+])
+
+
+def test_default_funnel_counts_bookings_with_and_without_a_login():
+    steps = analytics.funnel(BOOKINGS, analytics.BOOKING_FUNNEL)
+    assert [(step, reached) for step, reached, _ in steps] == [
+        ("user:book_package", 3),
+        ("action:action_login_or_register?", 2),
+        ("action:book_package_form?", 1),
+        ("action:action_create_user_order", 2),
+    ]
+    assert steps[-1][2] == 7.5
+
+
+def test_required_steps_must_be_reached_in_order():
+    steps = analytics.funnel(BOOKINGS, ["user:book_package", "action:action_login_or_register",
+                                        "action:action_create_user_order"])
+    assert [reached for _, reached, _ in steps] == [3, 2, 1]
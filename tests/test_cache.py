@@ -0,0 +1,138 @@
+import asyncio
+
+from actions.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Fetcher:
+    def __init__(self, *values) -> None:
+        self.values = list(values)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0)
+        value = self.values.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_fresh_entries_are_served_without_fetching():
+    async def scenario():
+        clock = FakeClock()
+        cache = TTLCache(clock=clock)
+        fetch = Fetcher("v1")
+        assert await cache.get_or_fetch("k", fetch, ttl=10) == "v1"
+        clock.now = 9
+        assert await cache.get_or_fetch("k", fetch, ttl=10) == "v1"
+        assert fetch.calls == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    run(scenario())
+
+
+def test_stale_entries_are_served_while_one_refresh_runs():
+    async def scenario():
+        clock = FakeClock()
+        cache = TTLCache(clock=clock)
+        fetch = Fetcher("v1", "v2")
+        await cache.get_or_fetch("k", fetch, ttl=10, stale_ttl=100)
+        clock.now = 50
+        assert await cache.get_or_fetch("k", fetch, ttl=10, stale_ttl=100) == "v1"
+        assert await cache.get_or_fetch("k", fetch, ttl=10, stale_ttl=100) == "v1"
+        await asyncio.gather(*cache._tasks)
+        assert fetch.calls == 2
+        assert cache.stale_hits == 2 and cache.refreshes == 1
+        assert await cache.get_or_fetch("k", fetch, ttl=10, stale_ttl=100) == "v2"
+        assert cache.hits == 1
+
+    run(scenario())
+
+
+def test_a_failed_refresh_keeps_the_stale_entry():
+    async def scenario():
+        clock = FakeClock()
+        cache = TTLCache(clock=clock)
+        fetch = Fetcher("v1", ConnectionError("down"), "v2")
+        await cache.get_or_fetch("k", fetch, ttl=10, stale_ttl=100)
+        clock.now = 20
+        assert await cache.get_or_fetch("k", fetch, ttl=10, stale_ttl=100) == "v1"
+        await asyncio.gather(*cache._tasks)
+        assert cache.get("k") == "v1"
+        assert await cache.get_or_fetch("k", fetch, ttl=10, stale_ttl=100) == "v1"
+        await asyncio.gather(*cache._tasks)
+        assert cache.get("k") == "v2"
+
+    run(scenario())
+
+
+def test_entries_past_the_stale_window_are_fetched_again():
+    async def scenario():
+        clock = FakeClock()
+        cache = TTLCache(clock=clock)
+        fetch = Fetcher("v1", "v2")
+        await cache.get_or_fetch("k", fetch, ttl=10, stale_ttl=5)
+        clock.now = 15
+        assert "k" not in cache
+        assert await cache.get_or_fetch("k", fetch, ttl=10, stale_ttl=5) == "v2"
+        assert cache.misses == 2
+
+    run(scenario())
+
+
+def test_uncacheable_values_are_returned_but_not_stored():
+    async def scenario():
+        cache = TTLCache(clock=FakeClock())
+        fetch = Fetcher(None, "v1")
+        assert await cache.get_or_fetch("k", fetch, ttl=10, cacheable=lambda v: v is not None) is None
+        assert "k" not in cache
+        assert await cache.get_or_fetch("k", fetch, ttl=10, cacheable=lambda v: v is not None) == "v1"
+
+    run(scenario())
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = TTLCache(max_size=2, clock=FakeClock())
+    cache.set("a", 1, ttl=10)
+    cache.set("b", 2, ttl=10)
+    assert cache.get("a") == 1
+    cache.set("c", 3, ttl=10)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_invalidation_wins_over_a_refresh_in_flight():
+    async def scenario():
+        clock = FakeClock()
+        cache = TTLCache(clock=clock)
+        fetch = Fetcher("v1", "v2")
+        await cache.get_or_fetch("k", fetch, ttl=10, stale_ttl=100)
+        clock.now = 20
+        await cache.get_or_fetch("k", fetch, ttl=10, stale_ttl=100)
+        cache.invalidate("k")
+        await asyncio.gather(*cache._tasks)
+        assert "k" not in cache
+        assert cache.peek("k") is None
+
+    run(scenario())
+
+
+def test_invalidate_where():
+    cache = TTLCache(clock=FakeClock())
+    for key in [("/package/country", "Japan"), ("/package/country", "Spain"), ("/info/company",)]:
+        cache.set(key, "value", ttl=10)
+    assert cache.invalidate_where(lambda key: key[0] == "/package/country") == 2
+    assert len(cache) == 1
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from rasa_sdk import Tracker
+from rasa_sdk.events import SlotSet
+
+from actions.backend import BackendResponse
+from actions.candidates import MAX_EXCLUDED, CandidateIterator, decode_ids, encode_ids
+
+
+def test_dense_ids_are_a_hex_bitset():
+    ids = set(range(1, 11))
+    assert encode_ids(ids) == "b7fe"
+    assert decode_ids(encode_ids(ids)) == ids
+
+
+def test_sparse_ids_round_trip():
+    ids = {3, 70, 4000}
+    assert encode_ids(ids).startswith("l")
+    assert decode_ids(encode_ids(ids)) == ids
+
+
+def test_large_ids_take_the_base36_path():
+    assert encode_ids([10 ** 9]) == "lgjdgxs"
+    assert decode_ids(encode_ids([10 ** 9, 7])) == {7, 10 ** 9}
+
+
+def test_empty_and_unreadable_values():
+    assert encode_ids([]) is None
+    assert decode_ids(None) == decode_ids("") == decode_ids("x12") == decode_ids("bzz") == set()
+
+
+@pytest.mark.parametrize("ids", [[-1], [1, 2.5], ["3"], [True]])
+def test_only_non_negative_integers_are_encoded(ids):
+    with pytest.raises(ValueError):
+        encode_ids(ids)
+
+
+class FakeClient:
+    def __init__(self, offer) -> None:
+        self.offer = offer
+        self.params = None
+
+    async def get(self, route, params=None):
+        self.params = params
+        return BackendResponse(200, {"new_hotel": self.offer})
+
+
+def rooms(client=None, initial_excluded=()):
+    return CandidateIterator("/hotel/available", "new_hotel", "undesired_hotel_ids",
+                             "new_hotel_id", "undesired_hotel_ids", initial_excluded, client=client)
+
+
+def tracker(**slots):
+    return Tracker("sender", slots, {}, [], False, None, {}, "")
+
+
+def test_the_current_offer_is_excluded():
+    iterator = rooms(initial_excluded=[1])
+    assert iterator.excluded(tracker(new_hotel_id=5)) == {1, 5}
+    assert iterator.excluded(tracker(new_hotel_id=5, undesired_hotel_ids=encode_ids([2, 3]))) == {2, 3, 5}
+
+
+def test_excluded_ids_reset_at_max_excluded():
+    iterator = rooms(initial_excluded=[1])
+    full = encode_ids(range(2, 2 + MAX_EXCLUDED))
+    assert iterator.excluded(tracker(new_hotel_id=99, undesired_hotel_ids=full)) == {1, 99}
+    below = encode_ids(range(2, 1 + MAX_EXCLUDED))
+    assert len(iterator.excluded(tracker(undesired_hotel_ids=below))) == MAX_EXCLUDED - 1
+
+
+def test_next_asks_for_an_offer_outside_the_excluded_ids():
+    client = FakeClient({"id": 7})
+    offer, events = asyncio.run(rooms(client).next(tracker(new_hotel_id=5, undesired_hotel_ids=encode_ids([2])),
+                                                   params={"order_id": 1}))
+    assert offer == {"id": 7}
+    assert client.params == {"order_id": 1, "undesired_hotel_ids": [2, 5]}
+    assert events == [SlotSet("undesired_hotel_ids", encode_ids([2, 5])), SlotSet("new_hotel_id", 7)]
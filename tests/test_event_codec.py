@@ -0,0 +1,109 @@
+import json
+
+from addons.event_codec import decode, encode, stored_count, trim_parse_data, truncate
+
+
+def session(start=1000.0):
+    return [
+        {"event": "action", "name": "action_session_start", "timestamp": start},
+        {"event": "session_started", "timestamp": start},
+        {"event": "action", "name": "action_listen", "timestamp": start},
+    ]
+
+
+def turn(text, at, *extra):
+    """A user message at `at`, the given events, then the bot listening again."""
+    return ([{"event": "user", "text": text, "timestamp": at}] + list(extra)
+            + [{"event": "action", "name": "action_listen", "timestamp": at + 1}])
+
+
+def slot(name, value, at):
+    return {"event": "slot", "name": name, "value": value, "timestamp": at}
+
+
+def texts(events):
+    return [event["text"] for event in events if event["event"] == "user"]
+
+
+def test_encode_decode_round_trip():
+    events = session() + turn("hej, København", 1001.0, slot("destination", "Kobe", 1001.5))
+    stored = encode(events)
+    assert decode(stored) == events
+    assert stored_count(stored[:16]) == len(events)
+
+
+def test_decode_reads_plain_rasa_json():
+    events = session()
+    assert decode(json.dumps({"sender_id": "s", "events": events}).encode()) == events
+    assert stored_count(b'{"sender_id": "s"') is None
+
+
+def test_trim_parse_data():
+    ranking = [{"name": f"intent_{i}", "confidence": 0.1} for i in range(5)]
+    event = {"event": "user", "parse_data": {"intent_ranking": ranking}}
+    assert trim_parse_data(event, 2)["parse_data"]["intent_ranking"] == ranking[:2]
+    assert trim_parse_data(event, None) is event
+
+
+def test_earlier_sessions_are_dropped():
+    events = session(0.0) + turn("old", 1.0) + session(100.0) + turn("new", 101.0)
+    kept, dropped = truncate(events, max_age=0, keep_turns=1, now=200.0)
+    assert texts(kept) == ["new"]
+    assert dropped == len(session()) + 2
+
+
+def test_old_turns_are_cut_down_to_keep_turns():
+    events = session(0.0) + turn("one", 1.0) + turn("two", 2.0) + turn("three", 3.0) + turn("four", 300.0)
+    kept, _ = truncate(events, max_age=100, keep_turns=2, now=310.0)
+    assert texts(kept) == ["three", "four"]
+    kept, _ = truncate(events, max_age=100, keep_turns=10, now=310.0)
+    assert texts(kept) == ["one", "two", "three", "four"]
+
+
+def test_recent_turns_are_kept():
+    events = session(0.0) + turn("one", 1.0) + turn("two", 250.0) + turn("three", 260.0)
+    kept, _ = truncate(events, max_age=100, keep_turns=1, now=270.0)
+    assert texts(kept) == ["two", "three"]
+
+
+def test_no_cut_inside_an_active_loop():
+    events = (session(0.0) + turn("hi", 1.0)
+              + turn("book", 2.0, {"event": "active_loop", "name": "book_package_form", "timestamp": 2.5})
+              + turn("Kobe", 3.0) + turn("alice", 4.0))
+    kept, _ = truncate(events, max_age=100, keep_turns=1, now=300.0)
+    assert texts(kept) == ["book", "Kobe", "alice"]
+    closed = events + turn("done", 5.0, {"event": "active_loop", "name": None, "timestamp": 5.5}) + turn("bye", 6.0)
+    kept, _ = truncate(closed, max_age=100, keep_turns=1, now=300.0)
+    assert texts(kept) == ["bye"]
+
+
+def test_no_cut_while_the_conversation_is_paused():
+    events = (session(0.0) + turn("hi", 1.0)
+              + turn("agent please", 2.0, {"event": "pause", "timestamp": 2.5})
+              + turn("hello?", 3.0) + turn("anyone?", 4.0))
+    kept, _ = truncate(events, max_age=100, keep_turns=1, now=300.0)
+    assert texts(kept) == ["agent please", "hello?", "anyone?"]
+    resumed = events + turn("back", 5.0, {"event": "resume", "timestamp": 5.5}) + turn("bye", 6.0)
+    kept, _ = truncate(resumed, max_age=100, keep_turns=1, now=300.0)
+    assert texts(kept) == ["bye"]
+
+
+def test_slots_before_the_cut_are_kept_as_a_snapshot():
+    events = (session(0.0)
+              + turn("Kobe", 1.0, slot("destination", "Kobe", 1.5), slot("username", "alice", 1.5))
+              + turn("logout", 2.0, slot("username", None, 2.5))
+              + turn("thanks", 300.0))
+    kept, dropped = truncate(events, max_age=100, keep_turns=1, now=310.0)
+    snapshot = {event["name"]: event["value"] for event in kept if event["event"] == "slot"}
+    assert snapshot == {"destination": "Kobe", "username": None}
+    assert texts(kept) == ["thanks"]
+    assert dropped == len(events) - len(kept) + len(snapshot)
+
+
+def test_the_stored_count_matches_the_reloaded_events():
+    events = (session(0.0)
+              + turn("Kobe", 1.0, slot("destination", "Kobe", 1.5))
+              + turn("two", 2.0) + turn("three", 300.0))
+    kept, _ = truncate(events, max_age=100, keep_turns=1, now=310.0)
+    stored = encode(kept)
+    assert stored_count(stored[:32]) == len(decode(stored)) == len(kept)
@@ -0,0 +1,30 @@
+from actions.routing import load_domain
+from addons.fast_path import FastPath, form_slot_entities
+
+fast_path = FastPath.from_nlu_data(domain=load_domain())
+
+
+def test_form_slot_entities():
+    slots = form_slot_entities(load_domain())
+    assert slots["target_destination"] == "destination"
+    assert slots["username"] == "username"
+
+
+def test_bare_lookup_values_are_rewritten_outside_forms():
+    assert fast_path.rewrite("Kobe") == '/inform{"destination": "Kobe"}'
+    assert fast_path.rewrite("  japan ") == '/ask_for_package_by_country{"country": "Japan"}'
+    assert fast_path.rewrite("I want to go to Kobe") is None
+    assert fast_path.rewrite('/inform{"destination": "Kobe"}') is None
+
+
+def test_values_for_the_requested_slot_are_rewritten():
+    assert fast_path.rewrite("Kobe", "book_package_form", "destination") == '/inform{"destination": "Kobe"}'
+    assert fast_path.rewrite("Kobe", "target_destination_form", "target_destination") is not None
+
+
+def test_forms_asking_for_something_else_get_the_message_as_typed():
+    for name in ("Kobe", "Jordan", "Georgia"):
+        assert fast_path.rewrite(name, "login_form", "username") is None
+        assert fast_path.rewrite(name, "register_form", "username") is None
+    assert fast_path.rewrite("Japan", "book_package_form", "destination") is None
+    assert fast_path.rewrite("Kobe", "book_package_form", None) is None
@@ -0,0 +1,61 @@
+from actions.matching import FuzzyMatcher, edit_distance, intent_payload, match_key
+
+DESTINATIONS = ["Praha", "Kalovy Vary", "Mont Saint-Michel", "Zurich", "Kobe", "Seoul", "Busan"]
+
+
+def test_match_key_ignores_case_accents_spaces_and_punctuation():
+    assert match_key("Mont Saint-Michel") == match_key("mont saint michel") == "montsaintmichel"
+    assert match_key("Zürich") == "zurich"
+
+
+def test_edit_distance_counts_transpositions_once():
+    assert edit_distance("zurich", "zurich", 2) == 0
+    assert edit_distance("zurich", "zuirch", 2) == 1
+    assert edit_distance("kalovyvary", "karlovyvary", 2) == 1
+
+
+def test_edit_distance_gives_up_past_the_limit():
+    assert edit_distance("praha", "seoul", 1) == 2
+    assert edit_distance("a", "abcdef", 2) == 3
+
+
+def test_exact_names_and_aliases_resolve():
+    matcher = FuzzyMatcher(DESTINATIONS, {"Prague": "Praha", "Unknown alias": "Atlantis"})
+    assert matcher.resolve("praha") == "Praha"
+    assert matcher.resolve("PRAGUE") == "Praha"
+    assert matcher.resolve("Atlantis") is None
+
+
+def test_near_misses_resolve_within_the_allowed_distance():
+    matcher = FuzzyMatcher(DESTINATIONS)
+    assert matcher.resolve("Zuirch") == "Zurich"
+    assert matcher.resolve("Karlovy Vary") == "Kalovy Vary"
+    assert matcher.resolve("Mont Saint Michell") == "Mont Saint-Michel"
+    assert matcher.resolve("Zrh") is None
+
+
+def test_short_names_only_resolve_exactly():
+    matcher = FuzzyMatcher(DESTINATIONS)
+    assert matcher.resolve("Kobe") == "Kobe"
+    assert matcher.resolve("Kob") is None
+    assert matcher.suggest("Kob")[0].name == "Kobe"
+
+
+def test_ambiguous_queries_do_not_resolve():
+    matcher = FuzzyMatcher(["Busan", "Busam"])
+    assert matcher.resolve("Busaz") is None
+    assert {match.name for match in matcher.suggest("Busaz")} == {"Busan", "Busam"}
+
+
+def test_suggest_ranks_best_first_with_one_match_per_name():
+    matcher = FuzzyMatcher(DESTINATIONS, {"Seoul City": "Seoul"})
+    matches = matcher.suggest("Seoull")
+    assert [match.name for match in matches] == ["Seoul"]
+    assert matches[0].distance == 1
+    assert matcher.suggest("") == []
+    assert matcher.suggest(None) == []
+
+
+def test_intent_payload():
+    assert intent_payload("greet") == "/greet"
+    assert intent_payload("inform", destination="Kobe") == '/inform{"destination": "Kobe"}'
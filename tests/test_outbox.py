@@ -0,0 +1,125 @@
+import asyncio
+import random
+
+import pytest
+
+import actions.outbox
+from actions.backend import BackendError, BackendResponse, CircuitOpenError, ConnectError
+from actions.outbox import DONE, FAILED, PENDING, REJECTED, WriteBehindQueue
+from actions.resilience import RetryPolicy
+
+
+class FakeClient:
+    """Answers each request with the next outcome: a BackendResponse, or an error to raise."""
+
+    def __init__(self, *outcomes) -> None:
+        self.outcomes = list(outcomes)
+        self.sent = []
+
+    async def request(self, method, route, params=None, json=None, headers=None):
+        self.sent.append({"method": method, "route": route, "params": params, "json": json, "headers": headers})
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    def make(*outcomes, **options):
+        options.setdefault("retry", RetryPolicy(base_delay=0, max_delay=0))
+        client = FakeClient(*outcomes)
+        return WriteBehindQueue(str(tmp_path / "queue.sqlite3"), client, **options), client
+
+    return make
+
+
+def enqueue(queue, key="k1", kind="create_order", destination="Kobe"):
+    return queue.enqueue(key, kind, "POST", "/order", username="alice", destination=destination,
+                         body={"username": "alice", "destination": destination})
+
+
+def row(queue, key="k1"):
+    return queue.db.execute("SELECT * FROM writes WHERE key = ?", (key,)).fetchone()
+
+
+def drain(queue):
+    return asyncio.run(queue.drain_once())
+
+
+def test_a_successful_write_is_done(make_queue):
+    queue, client = make_queue(BackendResponse(201, {"message": "created"}))
+    assert enqueue(queue)
+    assert not enqueue(queue)
+    assert drain(queue) == 1
+    write = row(queue)
+    assert (write["status"], write["attempts"], write["response_status"]) == (DONE, 1, 201)
+    assert client.sent[0]["headers"] == {"Idempotency-Key": "k1"}
+    assert client.sent[0]["json"] == {"username": "alice", "destination": "Kobe"}
+    assert drain(queue) == 0
+
+
+def test_a_4xx_answer_is_final(make_queue):
+    queue, client = make_queue(BackendResponse(404, {"message": "no such package"}))
+    enqueue(queue)
+    drain(queue)
+    assert row(queue)["status"] == REJECTED
+    assert drain(queue) == 0 and len(client.sent) == 1
+
+
+@pytest.mark.parametrize("outcome", [BackendResponse(503, None), BackendError("POST /order failed: timeout")])
+def test_ambiguous_failures_are_not_resent(make_queue, outcome):
+    queue, client = make_queue(outcome)
+    enqueue(queue)
+    drain(queue)
+    write = row(queue)
+    assert write["status"] == FAILED
+    assert write["last_error"].startswith("outcome unknown, not resent")
+    assert drain(queue) == 0 and len(client.sent) == 1
+
+
+@pytest.mark.parametrize("error", [ConnectError("not sent"), CircuitOpenError("circuit open")])
+def test_unsent_writes_are_retried(make_queue, error):
+    queue, client = make_queue(error, BackendResponse(201, {}))
+    enqueue(queue)
+    drain(queue)
+    assert (row(queue)["status"], row(queue)["attempts"]) == (PENDING, 1)
+    drain(queue)
+    assert (row(queue)["status"], row(queue)["attempts"]) == (DONE, 2)
+    assert len(client.sent) == 2
+
+
+def test_unsent_writes_give_up_after_max_attempts(make_queue):
+    queue, client = make_queue(ConnectError("not sent"), ConnectError("not sent"), max_attempts=2)
+    enqueue(queue)
+    drain(queue)
+    drain(queue)
+    write = row(queue)
+    assert (write["status"], write["attempts"]) == (FAILED, 2)
+    assert write["last_error"] == "not sent"
+    assert drain(queue) == 0
+
+
+def test_a_write_waiting_for_a_retry_holds_back_later_ones(make_queue):
+    queue, client = make_queue(ConnectError("not sent"), BackendResponse(201, {}),
+                               retry=RetryPolicy(base_delay=60, max_delay=60, rng=random.Random(0)))
+    enqueue(queue, "k1")
+    enqueue(queue, "k2")
+    enqueue(queue, "k3", destination="Seoul")
+    drain(queue)
+    assert [call["json"]["destination"] for call in client.sent] == ["Kobe", "Seoul"]
+    waiting = row(queue, "k1")
+    assert waiting["status"] == PENDING and waiting["next_attempt_at"] > waiting["updated_at"]
+    assert row(queue, "k2")["status"] == PENDING and row(queue, "k2")["attempts"] == 0
+    assert row(queue, "k3")["status"] == DONE
+    assert drain(queue) == 0
+
+
+def test_package_changes_are_forgotten_once_done(make_queue, monkeypatch):
+    forgotten = []
+    monkeypatch.setattr(actions.outbox.catalog_loader, "forget_package", forgotten.append)
+    queue, _ = make_queue(BackendResponse(200, {}), BackendResponse(503, None))
+    enqueue(queue, "k1", kind="change_guide")
+    enqueue(queue, "k2", kind="change_hotel", destination="Seoul")
+    drain(queue)
+    assert forgotten == ["Kobe"]
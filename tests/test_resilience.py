@@ -0,0 +1,228 @@
+import asyncio
+import random
+import time
+
+import pytest
+from aiohttp import web
+
+from rasa_sdk import Tracker
+from rasa_sdk.executor import CollectingDispatcher
+
+from actions.actions import ActionQueryCompanyInfo
+from actions.backend import FALLBACK_MESSAGE, BackendClient, BackendError, CircuitOpenError, ServerError, backend
+from actions.cache import TTLCache
+from actions.resilience import CircuitBreaker, RetryPolicy, hedged
+from benchmarks.stub_db_api import start_stub
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_breaker_opens_after_consecutive_failures():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_half_opens_after_the_reset_timeout():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 9.9
+    assert not breaker.allow()
+    clock.now = 10
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+
+def test_backoff_stays_within_the_exponential_bound():
+    policy = RetryPolicy(base_delay=0.1, max_delay=0.5, rng=random.Random(0))
+    for attempt in range(1, 8):
+        assert 0 <= policy.backoff(attempt) <= min(0.5, 0.1 * 2 ** (attempt - 1))
+
+
+def delayed(delays, results):
+    """A call whose n-th invocation waits delays[n] and returns (or raises) results[n]."""
+    calls = []
+
+    async def call():
+        n = len(calls)
+        calls.append(n)
+        await asyncio.sleep(delays[n])
+        if isinstance(results[n], Exception):
+            raise results[n]
+        return results[n]
+
+    return call, calls
+
+
+def test_fast_calls_are_not_hedged():
+    call, calls = delayed([0.0], ["first"])
+    hedges = []
+    assert asyncio.run(hedged(call, 0.1, lambda: hedges.append(1))) == "first"
+    assert calls == [0] and hedges == []
+
+
+def test_slow_calls_are_hedged_and_the_first_answer_wins():
+    call, calls = delayed([1.0, 0.0], ["slow", "hedge"])
+    hedges = []
+    start = time.perf_counter()
+    assert asyncio.run(hedged(call, 0.05, lambda: hedges.append(1))) == "hedge"
+    assert time.perf_counter() - start < 0.5
+    assert calls == [0, 1] and hedges == [1]
+
+
+def test_a_failed_call_falls_back_to_the_other_one():
+    call, _ = delayed([0.1, 0.2], [BackendError("first"), "second"])
+    assert asyncio.run(hedged(call, 0.05)) == "second"
+
+
+def test_hedged_raises_the_last_error_when_both_calls_fail():
+    call, _ = delayed([0.1, 0.2], [BackendError("first"), BackendError("second")])
+    with pytest.raises(BackendError, match="second"):
+        asyncio.run(hedged(call, 0.05))
+
+
+class SlowAPI:
+    """Answers GET /slow after `delays[n]` seconds for the n-th request, and GET /broken with a 503."""
+
+    def __init__(self, delays) -> None:
+        self.delays = list(delays)
+        self.requests = 0
+
+    async def slow(self, request: web.Request) -> web.Response:
+        delay = self.delays[min(self.requests, len(self.delays) - 1)]
+        self.requests += 1
+        await asyncio.sleep(delay)
+        return web.json_response({"ok": True})
+
+    async def broken(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        return web.json_response({}, status=503)
+
+
+async def serve(api: SlowAPI):
+    app = web.Application()
+    app.add_routes([web.get("/slow", api.slow), web.get("/broken", api.broken)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def client_for(base_url, **options) -> BackendClient:
+    options.setdefault("retry", RetryPolicy(attempts=1))
+    options.setdefault("cache_ttls", {})
+    return BackendClient(base_url, cache=TTLCache(), **options)
+
+
+def test_client_hedges_slow_reads():
+    async def scenario():
+        api = SlowAPI([1.0, 0.0])
+        runner, base_url = await serve(api)
+        client = client_for(base_url, hedge_delays={"/slow": 0.05})
+        try:
+            start = time.perf_counter()
+            r = await client.get("/slow", timeout=2.0)
+            assert r.status_code == 200
+            assert time.perf_counter() - start < 0.5
+            assert api.requests == 2 and client.counters["hedged"] == 1
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+def test_hedged_request_keeps_to_the_callers_deadline():
+    async def scenario():
+        api = SlowAPI([1.0])
+        runner, base_url = await serve(api)
+        client = client_for(base_url, hedge_delays={"/slow": 0.2})
+        try:
+            start = time.perf_counter()
+            with pytest.raises(BackendError):
+                await client.get("/slow", timeout=0.4)
+            # The hedge is sent 0.2 s in with the remaining 0.2 s, not a fresh 0.4 s.
+            assert time.perf_counter() - start < 0.55
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+def test_client_short_circuits_while_the_breaker_is_open():
+    async def scenario():
+        api = SlowAPI([0.0])
+        runner, base_url = await serve(api)
+        client = client_for(base_url, breaker_factory=lambda: CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        try:
+            for _ in range(2):
+                with pytest.raises(ServerError) as raised:
+                    await client.get("/broken")
+                assert raised.value.status_code == 503
+            with pytest.raises(CircuitOpenError):
+                await client.get("/broken")
+            assert api.requests == 2
+            assert client.counters["short_circuited"] == 1
+            assert (await client.get("/slow")).status_code == 200
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+def test_cached_reads_raise_server_errors_with_nothing_to_fall_back_on():
+    async def scenario():
+        api = SlowAPI([0.0])
+        runner, base_url = await serve(api)
+        client = client_for(base_url, cache_ttls={"/broken": (60.0, 60.0)})
+        try:
+            with pytest.raises(ServerError):
+                await client.get_cached("/broken")
+            assert client.counters["fallbacks"] == 0
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+def test_actions_apologise_while_the_db_api_answers_503(monkeypatch):
+    async def scenario():
+        stub, runner, base_url = await start_stub(down=True)
+        monkeypatch.setattr(backend, "base_url", base_url)
+        monkeypatch.setattr(backend, "retry", RetryPolicy(attempts=2, base_delay=0.0))
+        backend.cache.clear()
+        dispatcher = CollectingDispatcher()
+        try:
+            tracker = Tracker("sender", {}, {}, [], False, None, {}, "")
+            assert await ActionQueryCompanyInfo().run(dispatcher, tracker, {}) == []
+        finally:
+            await backend.close()
+            await runner.cleanup()
+        assert [message.get("text") for message in dispatcher.messages] == [FALLBACK_MESSAGE]
+
+    asyncio.run(scenario())
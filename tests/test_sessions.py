@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import pytest
+from rasa_sdk import Tracker
+from rasa_sdk.events import FollowupAction, SlotSet
+from rasa_sdk.executor import CollectingDispatcher
+
+import actions.sessions
+from actions.actions import CancelUserTrip, ChangeFlight, ChangeGuide, ChangeNewRoom
+from actions.routing import RESUME_SLOT
+from actions.sessions import (
+    LOGIN_FORM,
+    SESSION_EXPIRED_MESSAGE,
+    SessionStore,
+    domain_session_ttl,
+    requires_session,
+)
+from actions.store import SharedStore
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SharedStore(str(tmp_path / "sessions.sqlite3"))
+
+
+def test_a_session_is_only_valid_for_its_username():
+    store = SessionStore(ttl=60)
+    session = store.open("sender", "alice")
+    assert store.get("sender", "alice") is session
+    assert store.get("sender", "bob") is None
+    assert store.get("sender", None) is None
+    assert store.get("other sender", "alice") is None
+
+
+def test_non_ascii_usernames():
+    store = SessionStore(ttl=60)
+    store.open("sender", "José")
+    assert store.get("sender", "José") is not None
+    assert store.get("sender", "Jose") is None
+    assert store.get("sender", "Zoë") is None
+
+
+def test_sessions_expire_after_the_ttl_since_their_last_use():
+    store = SessionStore(ttl=0.2)
+    store.open("sender", "alice")
+    time.sleep(0.12)
+    assert store.get("sender", "alice") is not None
+    time.sleep(0.12)
+    assert store.get("sender", "alice") is not None
+    time.sleep(0.25)
+    assert store.get("sender", "alice") is None
+
+
+def test_sessions_are_shared_through_the_store(shared):
+    first, second = SessionStore(ttl=60, shared=shared), SessionStore(ttl=60, shared=shared)
+    session = first.open("sender", "José")
+    restored = second.get("sender", "José")
+    assert restored is not None and restored.token == session.token
+    assert second.get("sender", "alice") is None
+
+
+def test_shared_sessions_expire_too(shared):
+    first, second = SessionStore(ttl=0.05, shared=shared), SessionStore(ttl=0.05, shared=shared)
+    first.open("sender", "alice")
+    time.sleep(0.1)
+    assert second.get("sender", "alice") is None
+
+
+def test_domain_session_ttl():
+    assert domain_session_ttl({"session_config": {"session_expiration_time": 30}}) == 1800
+    assert domain_session_ttl({}) == 3600
+    assert domain_session_ttl(None) == 3600
+
+
+class ListOrders:
+    def name(self):
+        return "action_query_user_orders"
+
+    @requires_session
+    async def run(self, dispatcher, tracker, domain):
+        return [SlotSet("has_orders", True)]
+
+
+def run_action(sender_id, username):
+    tracker = Tracker(sender_id, {"username": username}, {}, [], False, None, {}, "")
+    dispatcher = CollectingDispatcher()
+    events = asyncio.run(ListOrders().run(dispatcher, tracker, {}))
+    return events, [message.get("text") for message in dispatcher.messages]
+
+
+def test_requires_session_runs_the_action_with_a_session(monkeypatch):
+    monkeypatch.setattr(actions.sessions, "sessions", SessionStore(ttl=60))
+    actions.sessions.sessions.open("sender", "alice")
+    assert run_action("sender", "alice") == ([SlotSet("has_orders", True)], [])
+
+
+def test_requires_session_sends_the_user_to_the_login_form(monkeypatch):
+    monkeypatch.setattr(actions.sessions, "sessions", SessionStore(ttl=60))
+    actions.sessions.sessions.open("sender", "bob")
+    events, messages = run_action("sender", "alice")
+    assert messages == [SESSION_EXPIRED_MESSAGE]
+    assert events == [
+        SlotSet("is_authenticated", False),
+        SlotSet("password", None),
+        SlotSet(RESUME_SLOT, "action_query_user_orders"),
+        FollowupAction(name=LOGIN_FORM),
+    ]
+
+
+@pytest.mark.parametrize("action", [ChangeFlight, ChangeNewRoom, ChangeGuide, CancelUserTrip])
+def test_order_changes_need_a_session(monkeypatch, action):
+    monkeypatch.setattr(actions.sessions, "sessions", SessionStore(ttl=60))
+    tracker = Tracker("sender", {"username": "alice", "destination": "Kobe"}, {}, [], False, None, {}, "")
+    dispatcher = CollectingDispatcher()
+    events = asyncio.run(action().run(dispatcher, tracker, {}))
+    assert [message.get("text") for message in dispatcher.messages] == [SESSION_EXPIRED_MESSAGE]
+    assert events[-1] == FollowupAction(name=LOGIN_FORM)
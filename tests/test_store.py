@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from actions.backend import BackendClient
+from actions.cache import TTLCache
+from actions.catalog import CatalogIndex, CatalogLoader
+from actions.resilience import RetryPolicy
+from actions.store import InvalidationLog, SharedStore
+from benchmarks.stub_db_api import start_stub
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SharedStore(str(tmp_path / "shared.sqlite3"))
+
+
+def test_increment_counts_from_one(shared):
+    assert [shared.increment("counters", "c", ttl=60) for _ in range(3)] == [1, 2, 3]
+    assert shared.get("counters", "c") == 3
+
+
+def test_each_log_replays_what_the_others_published(shared):
+    first, second = InvalidationLog(shared, "log"), InvalidationLog(shared, "log")
+    assert second.unseen() == []
+    first.publish("Kobe")
+    first.publish(["/package/country", None])
+    assert second.unseen() == ["Kobe", ["/package/country", None]]
+    assert second.unseen() == []
+
+
+def test_a_log_that_cannot_be_replayed_returns_none(shared):
+    first, second = InvalidationLog(shared, "log"), InvalidationLog(shared, "log")
+    second.unseen()
+    first.publish("Kobe")
+    shared.delete("log", "1")
+    assert second.unseen() is None
+    assert second.unseen() == []
+
+
+def test_skip_marks_everything_as_seen(shared):
+    first, second = InvalidationLog(shared, "log"), InvalidationLog(shared, "log")
+    first.publish("Kobe")
+    second.skip()
+    assert second.unseen() == []
+
+
+def make_worker(base_url, shared):
+    client = BackendClient(base_url, cache=TTLCache(), retry=RetryPolicy(attempts=1), shared=shared,
+                           cache_ttls={"/package/destination": (60.0, 60.0), "/package/country": (60.0, 60.0)})
+    return CatalogLoader(CatalogIndex(), client, shared=shared)
+
+
+def test_packages_forgotten_by_one_worker_are_forgotten_by_the_others(shared):
+    async def scenario():
+        stub, runner, base_url = await start_stub()
+        first, second = make_worker(base_url, shared), make_worker(base_url, shared)
+        try:
+            for worker in (first, second):
+                await worker.refresh()
+                r = await worker.client.get_cached('/package/destination', params={"destination": "Kobe"})
+                assert r.json()["package"][0]["price"] == 1600
+            assert shared.get("catalog", "packages") is not None
+            assert second.index.package_for("Kobe") is not None
+
+            next(p for p in stub.packages if p["destination"] == "Kobe")["price"] = 1000
+            first.forget_package("Kobe")
+            assert shared.get("catalog", "packages") is None
+
+            await second.ensure_loaded()
+            assert second.index.package_for("Kobe") is None
+            assert second.index.package_for("Seoul") is not None
+            r = await second.client.get_cached('/package/destination', params={"destination": "Kobe"})
+            assert r.json()["package"][0]["price"] == 1000
+        finally:
+            await first.client.close()
+            await second.client.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
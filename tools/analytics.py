@@ -0,0 +1,160 @@
+"""Timing, drop-off and fallback report over the conversation events the event broker stored.
+
+Reads the columnar event log written by `addons.event_broker` and reports:
+
+- per action, the time from the previous user message or action to the
+  action, so slow custom actions and forms stand out;
+- per intent, the time from the user message to the bot listening again;
+- how many conversations reach every step of a funnel (by default from
+  asking to book a package to the order being created, through the login
+  or the booking form) and how long they take to get there;
+- fallback rates: NLU fallbacks, Core fallbacks and DB API apologies.
+
+    python -m tools.analytics --path analytics/events --since 24
+"""
+import argparse
+import time
+from typing import Dict, List, Optional, Sequence, Text, Tuple
+
+import numpy as np
+
+from addons import event_columns
+
+# Users who are not logged in go through the login, logged-in users through
+# the booking form, so both steps are optional.
+BOOKING_FUNNEL = ("user:book_package", "action:action_login_or_register?", "action:book_package_form?",
+                  "action:action_create_user_order")
+
+
+def sort_events(data: Dict[Text, np.ndarray]) -> Dict[Text, np.ndarray]:
+    """Events grouped by conversation, in time order within each one."""
+    order = np.lexsort((data["timestamp"], data["sender_id"]))
+    return {column: values[order] for column, values in data.items()}
+
+
+def grouped_stats(keys: np.ndarray, values: np.ndarray) -> List[Tuple[Text, int, float, float, float]]:
+    """(key, count, mean, p50, p95) of `values` per key, slowest p95 first."""
+    if not len(keys):
+        return []
+    names, groups = np.unique(keys, return_inverse=True)
+    counts = np.bincount(groups)
+    means = np.bincount(groups, weights=values) / counts
+    order = np.lexsort((values, groups))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    def percentile(q: float) -> np.ndarray:
+        return values[order][starts + np.floor((counts - 1) * q).astype(int)]
+
+    p50, p95 = percentile(0.5), percentile(0.95)
+    return sorted(zip(names.tolist(), counts.tolist(), means.tolist(), p50.tolist(), p95.tolist()),
+                  key=lambda row: -row[4])
+
+
+def action_timings(data: Dict[Text, np.ndarray]) -> List[Tuple[Text, int, float, float, float]]:
+    turn_events = np.isin(data["event"], ["user", "action"])
+    sender, kind = data["sender_id"][turn_events], data["event"][turn_events]
+    name, ts = data["name"][turn_events], data["timestamp"][turn_events]
+    timed = np.zeros(len(ts), dtype=bool)
+    timed[1:] = (kind[1:] == "action") & (sender[1:] == sender[:-1]) & (name[1:] != "action_listen")
+    elapsed = np.zeros(len(ts))
+    elapsed[1:] = ts[1:] - ts[:-1]
+    return grouped_stats(name[timed], elapsed[timed])
+
+
+def intent_timings(data: Dict[Text, np.ndarray]) -> List[Tuple[Text, int, float, float, float]]:
+    sender, kind, name, ts = data["sender_id"], data["event"], data["name"], data["timestamp"]
+    is_user = kind == "user"
+    new_conversation = np.ones(len(ts), dtype=bool)
+    new_conversation[1:] = sender[1:] != sender[:-1]
+    # A turn runs from a user message, or the start of a conversation, to the next one.
+    turn = np.cumsum(is_user | new_conversation) - 1
+    listened = np.full(turn[-1] + 1 if len(turn) else 0, np.nan)
+    listens = (kind == "action") & (name == "action_listen")
+    np.fmax.at(listened, turn[listens], ts[listens])
+    elapsed = listened[turn[is_user]] - ts[is_user]
+    answered = ~np.isnan(elapsed)
+    return grouped_stats(name[is_user][answered], elapsed[answered])
+
+
+def funnel(data: Dict[Text, np.ndarray], steps: Sequence[Text]) -> List[Tuple[Text, int, Optional[float]]]:
+    """(step, conversations reaching it after the previous steps, median seconds since the first step).
+
+    A step ending in `?` is optional: conversations that skip it still count
+    for the steps after it.
+    """
+    conversations, conversation = np.unique(data["sender_id"], return_inverse=True)
+    reached = np.zeros(len(conversations))
+    first = None
+    result = []
+    for step in steps:
+        kind, _, name = step.rstrip("?").partition(":")
+        rows = (data["event"] == kind) & (data["name"] == name)
+        rows &= data["timestamp"] >= reached[conversation]
+        at = np.full(len(conversations), np.inf)
+        np.minimum.at(at, conversation[rows], data["timestamp"][rows])
+        done = np.isfinite(at)
+        reached = np.where(done, at, reached) if step.endswith("?") and first is not None else at
+        if first is None:
+            first = reached
+        median = float(np.median(at[done] - first[done])) if done.any() else None
+        result.append((step, int(done.sum()), median))
+    return result
+
+
+def fallback_rates(data: Dict[Text, np.ndarray]) -> Dict[Text, Tuple[int, int]]:
+    """(fallbacks, opportunities) for NLU fallbacks, Core fallbacks, DB API apologies and conversations."""
+    kind, fallback = data["event"], data["fallback"]
+    conversations, conversation = np.unique(data["sender_id"], return_inverse=True)
+    affected = np.bincount(conversation[fallback], minlength=len(conversations)) > 0
+    actions = (kind == "action") & (data["name"] != "action_listen")
+    return {
+        "NLU fallback per user message": (int((fallback & (kind == "user")).sum()), int((kind == "user").sum())),
+        "Core fallback per action": (int((fallback & actions).sum()), int(actions.sum())),
+        "DB API apology per user message": (int((fallback & (kind == "bot")).sum()), int((kind == "user").sum())),
+        "conversations with any fallback": (int(affected.sum()), len(conversations)),
+    }
+
+
+def print_timings(title: Text, rows: List[Tuple[Text, int, float, float, float]], limit: int) -> None:
+    print(f"\n{title}")
+    for name, count, mean, p50, p95 in rows[:limit]:
+        print(f"  {name:<44} {count:7d}  mean {mean * 1e3:8.0f} ms  p50 {p50 * 1e3:8.0f} ms  p95 {p95 * 1e3:8.0f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="analytics/events", help="event log directory")
+    parser.add_argument("--since", type=float, help="only events of the last SINCE hours")
+    parser.add_argument("--funnel", nargs="+", default=BOOKING_FUNNEL, help="steps as user:<intent> or action:<name>, with a trailing ? if optional")
+    parser.add_argument("--top", type=int, default=15, help="rows per timing table")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    since = time.time() - args.since * 3600 if args.since else None
+    data = sort_events(event_columns.load(args.path, since=since))
+    loaded = time.perf_counter() - start
+    if not len(data["event"]):
+        print(f"No events in {args.path}")
+        return
+    print(f"{len(data['event'])} events of {len(np.unique(data['sender_id']))} conversations, loaded in "
+          f"{loaded * 1e3:.0f} ms")
+
+    print_timings("Time to each action (slowest p95 first)", action_timings(data), args.top)
+    print_timings("Time from user message to listening again, per intent", intent_timings(data), args.top)
+
+    print("\nFunnel")
+    steps = funnel(data, args.funnel)
+    entered = steps[0][1]
+    for step, reached, median in steps:
+        share = f"{reached / entered:6.1%}" if entered else "   n/a"
+        after = "" if median is None else f"  median {median:7.1f} s after the first step"
+        print(f"  {step:<44} {reached:7d}  {share}{after}")
+
+    print("\nFallbacks")
+    for label, (count, total) in fallback_rates(data).items():
+        print(f"  {label:<44} {count:7d} / {total:<7d} {count / total if total else 0:6.1%}")
+    print(f"\nReport computed in {(time.perf_counter() - start) * 1e3:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Incremental Rasa training: only the parts of the model whose inputs changed are retrained.
+
+The NLU part depends on data/nlu.yml and the language and pipeline of the
+config; the Core part on the stories, the rules, the domain without its
+responses and the policies. Each part is trained with `rasa train nlu` or
+`rasa train core` into a cache keyed by a fingerprint of its inputs. Parts
+that changed are trained concurrently, splitting the CPU cores between
+them, and the two parts are packaged as one model in models/. Changed
+responses alone only update the domain inside the model:
+
+    python -m tools.train --config config.yml
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Text
+
+import yaml
+
+CACHE_DIR = ".train_cache"
+DATA_DIR = "data"
+DOMAIN = "domain.yml"
+PARTS: Dict[Text, Dict[Text, Any]] = {
+    "nlu": {"files": ["data/nlu.yml"], "config": ("language", "pipeline"), "domain": False},
+    "core": {"files": ["data/stories.yml", "data/rules.yml"], "config": ("policies",), "domain": True},
+}
+# Domain sections that do not change what Core learns.
+NLG_DOMAIN_KEYS = ("responses",)
+
+
+def rasa_version() -> Text:
+    try:
+        from importlib.metadata import version
+
+        return version("rasa")
+    except Exception:
+        return "unknown"
+
+
+def read_yaml(path: Text) -> Dict[Text, Any]:
+    with open(path, encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def file_digest(path: Text) -> Text:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def fingerprint(part: Text, config: Dict[Text, Any], domain: Dict[Text, Any]) -> Text:
+    spec = PARTS[part]
+    inputs = {
+        "rasa": rasa_version(),
+        "files": {path: file_digest(path) for path in spec["files"]},
+        "config": {key: config.get(key) for key in spec["config"]},
+        "domain": {k: v for k, v in domain.items() if k not in NLG_DOMAIN_KEYS} if spec["domain"] else None,
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def train_part(part: Text, config_path: Text, target: Text, threads: int) -> float:
+    """Train one part with the Rasa CLI and store the model archive at `target`."""
+    out = tempfile.mkdtemp(prefix=f"trippy-{part}-")
+    args = [sys.executable, "-m", "rasa", "train", part, "--config", config_path, "--domain", DOMAIN,
+            "--out", out, "--fixed-model-name", part]
+    args += ["--nlu", PARTS["nlu"]["files"][0]] if part == "nlu" else ["--stories", DATA_DIR]
+    env = dict(os.environ, TF_INTER_OP_PARALLELISM_THREADS=str(threads),
+               TF_INTRA_OP_PARALLELISM_THREADS=str(threads))
+    start = time.perf_counter()
+    subprocess.run(args, check=True, env=env)
+    shutil.move(os.path.join(out, f"{part}.tar.gz"), target)
+    shutil.rmtree(out, ignore_errors=True)
+    return time.perf_counter() - start
+
+
+def extract_part(archive: Text, part: Text, directory: Text) -> None:
+    with tarfile.open(archive) as tar:
+        tar.extractall(directory, members=[m for m in tar.getmembers()
+                                           if m.name == part or m.name.startswith(part + "/")])
+
+
+async def package(directory: Text, config_path: Text, out: Text, name: Optional[Text]) -> Text:
+    import rasa.model
+    from rasa.shared.importers.importer import TrainingDataImporter
+
+    importer = TrainingDataImporter.load_from_config(config_path, DOMAIN, [DATA_DIR])
+    # The cached Core part may predate a change to the responses.
+    await rasa.model.update_model_with_new_domain(importer, directory)
+    return rasa.model.package_model(
+        fingerprint=await rasa.model.model_fingerprint(importer),
+        output_directory=out,
+        train_path=directory,
+        fixed_model_name=name,
+    )
+
+
+def prune(keep: int) -> None:
+    """Keep the `keep` most recent cached archives of each part."""
+    for part in PARTS:
+        archives = sorted((os.path.join(CACHE_DIR, f) for f in os.listdir(CACHE_DIR) if f.startswith(part + "-")),
+                          key=os.path.getmtime, reverse=True)
+        for archive in archives[keep:]:
+            os.remove(archive)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", default="config.yml")
+    parser.add_argument("--out", default="models")
+    parser.add_argument("--fixed-model-name")
+    parser.add_argument("--force", action="store_true", help="retrain every part")
+    parser.add_argument("--keep", type=int, default=3, help="cached archives to keep per part")
+    args = parser.parse_args()
+
+    timings: Dict[Text, float] = {}
+    start = time.perf_counter()
+    config, domain = read_yaml(args.config), read_yaml(DOMAIN)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    archives = {part: os.path.join(CACHE_DIR, f"{part}-{fingerprint(part, config, domain)}.tar.gz")
+                for part in PARTS}
+    stale: List[Text] = [part for part, archive in archives.items() if args.force or not os.path.exists(archive)]
+    timings["fingerprint"] = time.perf_counter() - start
+
+    trained: Dict[Text, float] = {}
+    if stale:
+        threads = max(1, (os.cpu_count() or 1) // len(stale))
+        with ThreadPoolExecutor(len(stale)) as pool:
+            futures = {part: pool.submit(train_part, part, args.config, archives[part], threads) for part in stale}
+            trained = {part: future.result() for part, future in futures.items()}
+    for part in PARTS:
+        timings[f"train {part}"] = trained.get(part, 0.0)
+        if part not in stale:
+            os.utime(archives[part])
+
+    stage = time.perf_counter()
+    directory = tempfile.mkdtemp(prefix="trippy-model-")
+    for part, archive in archives.items():
+        extract_part(archive, part, directory)
+    model = asyncio.run(package(directory, args.config, args.out, args.fixed_model_name))
+    timings["package"] = time.perf_counter() - stage
+    prune(args.keep)
+    timings["total"] = time.perf_counter() - start
+
+    for part in PARTS:
+        print(f"{part:>5}: {'trained' if part in stale else 'reused'} {archives[part]}")
+    for name, seconds in timings.items():
+        print(f"{name:>12}: {seconds:8.1f} s")
+    print(f"Model: {model}")
+
+
+if __name__ == "__main__":
+    main()